@@ -1,20 +1,51 @@
-from fastapi import FastAPI, HTTPException
+import hashlib
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Literal
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel, Field
 
-from backend.modules.auth import AuthService
+from backend.modules import config, metrics, tracing
+from backend.modules.auth import AuthService, PasswordPoolBusyError
+from backend.modules.ingest import IngestQueueFullError, ledger_service
+from backend.modules.sessions import session_manager
 from backend.modules.wallet import (
-    calculate_balance,
+    HISTORY_PAGE_SIZE,
     deposit,
+    get_balance,
+    get_monthly_summary,
+    get_transaction_count,
     get_transaction_history,
+    get_transaction_page,
+    iter_transaction_history,
+    load_indexes,
+    reconcile_ledger,
     transfer,
+    transfer_many,
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup: load the ledger indexes before serving any request.
+    Shutdown: commit the deposits and transfers still in the writer queue"""
+    load_indexes()
+    yield
+    await ledger_service.drain()
+
+
 # App configuration
 app = FastAPI(
     title="Proggy Wallet API",
     description="API for the Proggy Wallet application",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 
@@ -26,6 +57,10 @@ app.add_middleware(
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers
 )
+# Spans and sampled stacks of the traced requests (PROGGY_TRACE_SAMPLE_RATE / X-Proggy-Trace)
+app.add_middleware(tracing.TracingMiddleware)
+# Latency, status and in-flight count of every request (outermost, so it includes CORS)
+app.add_middleware(metrics.MetricsMiddleware)
 
 
 # Data Models
@@ -51,6 +86,72 @@ class TransferRequest(BaseModel):
     amount: float = Field(..., gt=0, example=80.0)
 
 
+class BatchTransferRequest(BaseModel):
+    """Schema for making many transfers at once (e.g. payouts)"""
+
+    transfers: list[TransferRequest] = Field(..., min_length=1, max_length=1000)
+
+
+# Authentication (session tokens issued by /auth/login)
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+async def current_user(credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme)) -> str:
+    """Dependency that returns the username of the session token (HMAC check, no bcrypt)"""
+    username = session_manager.verify(credentials.credentials) if credentials else None
+    if username is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid or expired session",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return username
+
+
+def ensure_same_user(session_user: str, username: str) -> None:
+    """Users can only read and move the money of their own wallet"""
+    if session_user != username:
+        raise HTTPException(status_code=403, detail="Not allowed to access the wallet of another user")
+
+
+async def admin_user(session_user: str = Depends(current_user)) -> str:
+    """Dependency for the admin routes: the session user must be listed in PROGGY_ADMIN_USERS"""
+    if session_user not in config.ADMIN_USERS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return session_user
+
+
+# Conditional GET of the wallet routes (ETag / If-None-Match)
+# private: the responses belong to one user; no-cache: the browser revalidates them every time
+WALLET_CACHE_CONTROL = "private, no-cache"
+
+
+def wallet_etag(username: str) -> str:
+    """ETag of the wallet of a user: the transaction count of the user (its ledger version, O(1)) and a
+    digest of the users version (opening balances). Neither reads the ledger. It must be taken before
+    reading the wallet, so a concurrent write can only make the ETag older than the response (never a
+    stale 304)"""
+    digest = hashlib.blake2b(repr((username, AuthService.users_version())).encode("utf-8"), digest_size=6)
+    return f'"{get_transaction_count(username)}-{digest.hexdigest()}"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """Check if the If-None-Match header of the request matches the ETag (weak comparison)"""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag in tags
+
+
+def local_time(value: datetime | None) -> datetime | None:
+    """Convert a date of the query with a UTC offset (e.g. "...Z") to the naive local time
+    the ledger dates are stored in; naive dates are already local and are kept as they are"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
 # Routes (endpoints)
 @app.get("/")
 async def root():
@@ -68,11 +169,20 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Route to scrape the metrics of the process (Prometheus text format)"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/auth/login")
 async def login(credentials: LoginRequest):
     """Route to validate user credentials"""
-    # Usamos el nuevo servicio
-    user_entity = AuthService.authenticate(credentials.username, credentials.password)
+    # bcrypt runs in the password pool, so the event loop is not blocked
+    try:
+        user_entity = await AuthService.authenticate_async(credentials.username, credentials.password)
+    except PasswordPoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
     if not user_entity:
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -85,39 +195,77 @@ async def login(credentials: LoginRequest):
             "email": user_entity.email,
             "balance": user_entity.account.balance, # Acceso a través de la entidad
         },
+        # Token to send as 'Authorization: Bearer <token>' in the wallet routes
+        "token": session_manager.issue(user_entity.username),
+        "token_type": "bearer",
+        "expires_in": session_manager.ttl,
     }
 
 
+@app.post("/auth/logout")
+async def logout(credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme)):
+    """Route to end the session of the token"""
+    if credentials:
+        session_manager.revoke(credentials.credentials)
+    return {"status": "success", "message": "Logged out"}
+
+
 @app.get("/wallet/status/{username}")
-async def get_wallet_status(username: str):
-    """Route to get the wallet status for a user"""
+async def get_wallet_status(
+    username: str, request: Request, response: Response, session_user: str = Depends(current_user)
+):
+    """Route to get the wallet status for a user (304 if the If-None-Match ETag is still current)"""
+    ensure_same_user(session_user, username)
+    headers = {"ETag": wallet_etag(username), "Cache-Control": WALLET_CACHE_CONTROL}
+    if not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
     user_entity = AuthService.get_user_entity(username)
     if not user_entity:
         raise HTTPException(status_code=404, detail="User not found")
 
-    history = get_transaction_history(username)
-    current_balance = calculate_balance(history, user_entity.account.balance, username)
+    current_balance = get_balance(username, user_entity.account.balance)
 
     return {
         "status": "success",
         "username": username,
         "balance": current_balance,
-        "history_count": len(history),
+        "history_count": get_transaction_count(username),
     }
 
 
+@app.get("/wallet/summary/{username}")
+async def get_wallet_summary(
+    username: str,
+    months: int | None = Query(None, gt=0, le=120),
+    session_user: str = Depends(current_user),
+):
+    """Route to get the monthly totals of a user (deposits, transfers in and out, net), oldest first"""
+    ensure_same_user(session_user, username)
+    return {"status": "success", "username": username, "months": get_monthly_summary(username, months)}
+
+
 @app.post("/wallet/deposit")
-async def make_deposit(data: DepositRequest):
+async def make_deposit(data: DepositRequest, session_user: str = Depends(current_user)):
     """Route to make a deposit for a user"""
+    ensure_same_user(session_user, data.username)
     try:
-        # deposit() handles the update of the CSV and the calculation of the balance
-        transaction = deposit(data.username, data.amount)
+        if config.INGEST_QUEUE:
+            # The single ledger writer applies it in order and commits it with the queued commands
+            transaction = await ledger_service.deposit(data.username, data.amount)
+        else:
+            # deposit() handles the update of the CSV and the calculation of the balance.
+            # It runs in the threadpool: deposits on different accounts run in parallel
+            transaction = await run_in_threadpool(deposit, data.username, data.amount)
 
         return {
             "status": "success",
             "message": f"Deposit of ${data.amount} successful",
             "transaction": transaction,
         }
+    except IngestQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except ValueError as e:
@@ -127,17 +275,24 @@ async def make_deposit(data: DepositRequest):
 
 
 @app.post("/wallet/transfer")
-async def make_transfer(data: TransferRequest):
+async def make_transfer(data: TransferRequest, session_user: str = Depends(current_user)):
     """Route to make a transfer between two users"""
+    ensure_same_user(session_user, data.from_user)
     try:
-        # transfer() validates the insufficient balance and the existence of the users
-        transaction = transfer(data.from_user, data.to_user, data.amount)
+        if config.INGEST_QUEUE:
+            # The single ledger writer applies it in order and commits it with the queued commands
+            transaction = await ledger_service.transfer(data.from_user, data.to_user, data.amount)
+        else:
+            # transfer() validates the insufficient balance and the existence of the users
+            transaction = await run_in_threadpool(transfer, data.from_user, data.to_user, data.amount)
 
         return {
             "status": "success",
             "message": f"Transfer of ${data.amount} to {data.to_user} successful",
             "transaction": transaction,
         }
+    except IngestQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except FileNotFoundError as e:
         # If one of the users does not exist
         raise HTTPException(status_code=404, detail=str(e))
@@ -150,13 +305,97 @@ async def make_transfer(data: TransferRequest):
         )
 
 
-@app.get("/wallet/history/{username}")
-async def get_history(username: str):
-    """Route to get the real history of transactions from the CSV file"""
+@app.post("/wallet/transfers/batch")
+async def make_batch_transfer(data: BatchTransferRequest, session_user: str = Depends(current_user)):
+    """Route to make many transfers in order, persisted in a single write"""
+    for item in data.transfers:
+        ensure_same_user(session_user, item.from_user)
+
     try:
-        # get the history of transactions from the CSV file
-        history = get_transaction_history(username)
+        results = await run_in_threadpool(transfer_many, [item.model_dump() for item in data.transfers])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal error processing the transfers: {str(e)}")
+
+    failed = sum(1 for result in results if result["status"] == "failed")
+    return {
+        "status": "success" if failed == 0 else "partial",
+        "message": f"{len(results) - failed} of {len(results)} transfers successful",
+        "results": results,
+    }
+
 
-        return {"status": "success", "username": username, "transactions": history}
+@app.get("/wallet/history/{username}")
+async def get_history(
+    username: str,
+    limit: int | None = Query(None, gt=0, le=500),
+    cursor: str | None = None,
+    format: Literal["json", "ndjson"] = "json",
+    date_from: datetime | None = Query(None, alias="from"),
+    date_to: datetime | None = Query(None, alias="to"),
+    type: list[Literal["deposit", "transfer_in", "transfer_out"]] | None = Query(None),
+    order: Literal["asc", "desc"] | None = None,
+    *,
+    request: Request,
+    response: Response,
+    session_user: str = Depends(current_user),
+):
+    """Route to get the real history of transactions from the CSV file.
+    - With limit/cursor: one page, newest first, plus the cursor of the next page.
+    - With format=ndjson: the whole history streamed newest first, one JSON object per line.
+    - Without parameters: the whole history in one JSON document (oldest first).
+    Filters (applied by the storage indexes, before reading any row):
+    - from/to: only transactions dated in [from, to) (local time, unless they have a UTC offset).
+    - type: only transactions of these types (repeat the parameter for several types).
+    - order: asc (oldest first) or desc (newest first), instead of the defaults above.
+    Answers 304 without reading the ledger if the If-None-Match ETag is still current.
+    """
+    ensure_same_user(session_user, username)
+    headers = {"ETag": wallet_etag(username), "Cache-Control": WALLET_CACHE_CONTROL}
+    if not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    filters = {"start": local_time(date_from), "end": local_time(date_to), "types": type}
+    try:
+        if format == "ndjson":
+            transactions = iter_transaction_history(username, cursor, **filters, order=order or "desc")
+            lines = (json.dumps(transaction) + "\n" for transaction in transactions)
+            return StreamingResponse(lines, media_type="application/x-ndjson", headers=headers)
+
+        if limit is None and cursor is None:
+            # get the history of transactions from the CSV file
+            history = get_transaction_history(username, **filters, order=order or "asc")
+            return {"status": "success", "username": username, "transactions": history}
+
+        page, next_cursor = get_transaction_page(
+            username, limit or HISTORY_PAGE_SIZE, cursor, **filters, order=order or "desc"
+        )
+        return {
+            "status": "success",
+            "username": username,
+            "transactions": page,
+            "next_cursor": next_cursor,
+        }
+    except ValueError as e:
+        # If the cursor is invalid
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting the history: {str(e)}")
+
+
+@app.get("/admin/reconcile")
+async def get_reconciliation(
+    max_issues: int = Query(100, ge=0, le=10000),
+    window: int = Query(10000, gt=0),
+    admin: str = Depends(admin_user),
+):
+    """Route to reconcile the whole ledger: stored balances and transfer pairs, with throughput"""
+    initial_balances = {username: user.balance for username, user in AuthService.directory().all().items()}
+    try:
+        report = await run_in_threadpool(
+            reconcile_ledger, initial_balances, match_window=window, max_issues=max_issues
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reconciling the ledger: {str(e)}")
+
+    return {"status": "success", "report": report.as_dict()}
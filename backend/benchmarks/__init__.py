@@ -0,0 +1,10 @@
+"""
+Benchmark suite of the wallet operations on synthetic data.
+
+- generator: deterministic users and ledgers of any size, with a configurable user skew.
+- runner: times the wallet operations on generated datasets and writes the results as JSON.
+
+Usage:
+    python -m backend.benchmarks.runner --sizes 10k,100k --output results.json
+    python -m backend.benchmarks.runner --sizes 10k --compare results.json
+"""
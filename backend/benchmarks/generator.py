@@ -0,0 +1,265 @@
+"""
+Deterministic generator of synthetic wallet data: a users file and a ledger.
+
+The same parameters (and seed) always give the same users and rows. Owners are
+drawn with a Zipf-like skew: the user of rank r is picked with a weight of
+1 / r**skew, so skew=0 spreads the rows evenly and higher values concentrate them
+on a few hot users. Rows are consistent with the wallet rules: every row carries
+the running balance of its owner, transfers are written as a transfer_out and
+transfer_in pair, and a transfer the sender can't afford becomes a deposit.
+
+Usage:
+    python -m backend.benchmarks.generator DIRECTORY --rows 1M [--users N] [--skew S] [--seed N]
+        [--bcrypt-rounds N]
+
+This module contains the following:
+- parse_size
+- usernames
+- generate_users
+- generate_rows
+- write_dataset
+"""
+
+import argparse
+import bisect
+import itertools
+import json
+import logging
+import random
+import sys
+import time
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import bcrypt
+
+from backend.modules import config, repository
+
+# Opening balance of every generated user
+INITIAL_BALANCE = 1000.0
+# Password of every generated user (hashed once for all of them)
+PASSWORD = "bench_pass"
+# bcrypt cost of the password hash (the cheapest by default: logins are not what most benchmarks time)
+BCRYPT_ROUNDS = 4
+# Share of the rows that start a transfer (the others are deposits)
+TRANSFER_RATIO = 0.7
+# Rows handed to the ledger in a single append
+CHUNK_SIZE = 10000
+
+_SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_size(text: str) -> int:
+    """Parse a row count like "10k", "1M" or "2500"."""
+    text = text.strip().lower()
+    multiplier = _SIZE_SUFFIXES.get(text[-1:], 1)
+    number = text[:-1] if multiplier > 1 else text
+    try:
+        size = int(float(number) * multiplier)
+    except ValueError:
+        raise ValueError(f"Invalid size: {text}") from None
+    if size <= 0:
+        raise ValueError(f"Invalid size: {text}")
+    return size
+
+
+def usernames(users: int) -> list[str]:
+    """Return the usernames of the generated users, hottest first."""
+    return [f"user{index:06d}" for index in range(users)]
+
+
+def _cumulative_weights(users: int, skew: float) -> list[float]:
+    """Cumulative pick weights of the users: the user of rank r gets 1 / r**skew."""
+    return list(itertools.accumulate(1 / rank**skew for rank in range(1, users + 1)))
+
+
+def generate_users(users: int, rounds: int = BCRYPT_ROUNDS) -> list[dict[str, Any]]:
+    """Return the user records (same keys as the entries of the JSON users file).
+
+    Args:
+        users: Number of users.
+        rounds: bcrypt cost of the password hash shared by every user.
+    """
+    password = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+    return [
+        {
+            "id": index + 1,
+            "username": username,
+            "email": f"{username}@example.com",
+            "full_name": None,
+            "password": password,
+            "balance": INITIAL_BALANCE,
+        }
+        for index, username in enumerate(usernames(users))
+    ]
+
+
+def generate_rows(
+    rows: int,
+    users: int,
+    skew: float = 1.0,
+    seed: int = 0,
+    start: datetime = datetime(2025, 1, 1),
+    days: int = 365,
+) -> Iterator[list[dict[str, Any]]]:
+    """Generate the ledger rows, in chunks of CHUNK_SIZE rows (in date order).
+
+    Args:
+        rows: Number of rows to generate.
+        users: Number of users the rows are spread over.
+        skew: Zipf exponent of the owner distribution (0 for uniform).
+        seed: Seed of the random generator.
+        start: Date of the first row.
+        days: Days covered by the rows, evenly spaced from start.
+
+    Yields:
+        Lists of ledger rows (dictionaries with the ledger columns).
+    """
+    rng = random.Random(seed)
+    names = usernames(users)
+    cumulative = _cumulative_weights(users, skew)
+    total_weight = cumulative[-1]
+    balances = [INITIAL_BALANCE] * users
+    step = days * 86400 / rows
+
+    def pick() -> int:
+        return min(bisect.bisect(cumulative, rng.random() * total_weight), users - 1)
+
+    chunk: list[dict[str, Any]] = []
+    written = 0
+    while written < rows:
+        date = str(start + timedelta(seconds=int(written * step)))
+        owner = pick()
+        amount = round(rng.uniform(1, 100), 2)
+        receiver = pick()
+        if receiver == owner:
+            receiver = (owner + 1) % users
+
+        is_transfer = rng.random() < TRANSFER_RATIO and users > 1 and written + 2 <= rows
+        if is_transfer and balances[owner] >= amount:
+            balances[owner] = round(balances[owner] - amount, 2)
+            balances[receiver] = round(balances[receiver] + amount, 2)
+            sender, target = names[owner], names[receiver]
+            description = f"Transfer of {amount} from {sender} to {target}"
+            chunk.append(
+                {
+                    "date": date,
+                    "owner": sender,
+                    "type": "transfer_out",
+                    "from_user": sender,
+                    "to_user": target,
+                    "amount": amount,
+                    "balance": balances[owner],
+                    "description": description,
+                }
+            )
+            chunk.append(
+                {
+                    "date": date,
+                    "owner": target,
+                    "type": "transfer_in",
+                    "from_user": sender,
+                    "to_user": target,
+                    "amount": amount,
+                    "balance": balances[receiver],
+                    "description": description,
+                }
+            )
+            written += 2
+        else:
+            balances[owner] = round(balances[owner] + amount, 2)
+            chunk.append(
+                {
+                    "date": date,
+                    "owner": names[owner],
+                    "type": "deposit",
+                    "from_user": "external",
+                    "to_user": names[owner],
+                    "amount": amount,
+                    "balance": balances[owner],
+                    "description": f"Deposit of {amount} from external",
+                }
+            )
+            written += 1
+
+        if len(chunk) >= CHUNK_SIZE:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def write_dataset(
+    directory: str,
+    rows: int,
+    users: int,
+    skew: float = 1.0,
+    seed: int = 0,
+    rounds: int = BCRYPT_ROUNDS,
+) -> dict[str, Any]:
+    """Write the users and the ledger of a dataset to a directory, with the configured storage backend.
+    The directory gets users.json and transactions.csv (csv backend) or wallet.db (sqlite backend),
+    plus dataset.json describing the parameters.
+
+    Returns:
+        The description of the dataset (also saved as dataset.json).
+    """
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    backend = config.STORAGE_BACKEND
+    started = time.perf_counter()
+
+    users_data = generate_users(users, rounds)
+    if backend == "sqlite":
+        database = repository.SqliteDatabase(str(path / "wallet.db"))
+        repository.SqliteUserRepository(database).add_users(users_data)
+        book: repository.LedgerRepository = repository.SqliteLedgerRepository(database)
+    else:
+        with open(path / "users.json", "w", encoding="utf-8") as file:
+            json.dump({"users": users_data}, file)
+        book = repository.get_ledger_repository(str(path / "transactions.csv"))
+
+    for chunk in generate_rows(rows, users, skew, seed):
+        book.append(chunk)
+    book.checkpoint()
+
+    dataset = {
+        "rows": rows,
+        "users": users,
+        "skew": skew,
+        "seed": seed,
+        "bcrypt_rounds": rounds,
+        "storage_backend": backend,
+        "ledger_partition": config.LEDGER_PARTITION,
+        "generated_seconds": round(time.perf_counter() - started, 3),
+    }
+    with open(path / "dataset.json", "w", encoding="utf-8") as file:
+        json.dump(dataset, file, indent=2)
+    return dataset
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.benchmarks.generator", description=__doc__.splitlines()[1]
+    )
+    parser.add_argument("directory", help="Directory of the dataset (created if missing)")
+    parser.add_argument("--rows", type=parse_size, default=parse_size("10k"), help="Ledger rows (e.g. 1M)")
+    parser.add_argument("--users", type=int, default=1000, help="Number of users")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of the owners (0 is uniform)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator")
+    parser.add_argument(
+        "--bcrypt-rounds", type=int, default=BCRYPT_ROUNDS, help="bcrypt cost of the passwords"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    dataset = write_dataset(args.directory, args.rows, args.users, args.skew, args.seed, args.bcrypt_rounds)
+    logging.info(f"Generated {dataset['rows']} rows in {dataset['generated_seconds']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
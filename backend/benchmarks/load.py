@@ -0,0 +1,355 @@
+"""
+Load harness for the HTTP API: mixed traffic from concurrent clients.
+
+Every client logs in as one of the dataset users (clients beyond the number of
+users share accounts), then sends requests back to back, each one drawn from the
+traffic mix (weights per route). The report gives, per route and in total, the
+throughput, p50/p95/p99 latency and the errors by status code.
+
+Targets:
+- In-process (default): the FastAPI app is driven through httpx's ASGI
+  transport on a generated dataset (see runner.prepare_dataset). No network or
+  server process is involved, so it measures the app itself.
+- --url: a running server (e.g. uvicorn). It must serve the users of a dataset
+  made by the generator (same usernames and password), e.g. a SQLite dataset:
+  PROGGY_STORAGE_BACKEND=sqlite PROGGY_SQLITE_PATH=<dataset>/wallet.db uvicorn backend.app:app
+
+Logins check a bcrypt hash: their latency depends on --bcrypt-rounds (4 by
+default; the production cost is 12).
+
+Usage:
+    python -m backend.benchmarks.load [--concurrency N] [--requests N | --duration S]
+        [--mix login=1,deposit=3,transfer=3,status=5,history=2] [--rows N] [--users N]
+        [--url URL] [--output FILE] [--compare FILE] [--tolerance T]
+
+This module contains the following:
+- ROUTES
+- DEFAULT_MIX
+- parse_mix
+- LoadReport
+- run_load
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from backend.app import app
+from backend.benchmarks import generator, runner
+
+# Route of every traffic type (as reported)
+ROUTES = {
+    "login": "POST /auth/login",
+    "deposit": "POST /wallet/deposit",
+    "transfer": "POST /wallet/transfer",
+    "status": "GET /wallet/status/{username}",
+    "history": "GET /wallet/history/{username}",
+}
+
+# Relative weight of every traffic type
+DEFAULT_MIX = {"login": 1, "deposit": 3, "transfer": 3, "status": 5, "history": 2}
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    """Parse a traffic mix like "deposit=3,status=5" (types not listed get no traffic)."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise ValueError(f"Unknown traffic type: {name} (expected one of {', '.join(ROUTES)})")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid weight for {name}: {weight!r}") from None
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("The traffic mix needs at least one positive weight")
+    return mix
+
+
+class LoadReport:
+    """Latencies and errors of every route during a load run."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {name: [] for name in ROUTES}
+        self.errors: dict[str, Counter] = {name: Counter() for name in ROUTES}
+        self.elapsed = 0.0
+
+    def record(self, name: str, seconds: float, error: str | None = None) -> None:
+        self.latencies[name].append(seconds)
+        if error is not None:
+            self.errors[name][error] += 1
+
+    def _summary(self, rows: int, route: str, durations: list[float], errors: Counter) -> dict[str, Any]:
+        samples = sorted(durations)
+        return {
+            "rows": rows,
+            "operation": route,
+            "requests": len(samples),
+            "requests_per_second": round(len(samples) / self.elapsed, 1) if self.elapsed > 0 else 0.0,
+            "p50_ms": round(runner.percentile(samples, 0.50) * 1000, 3),
+            "p95_ms": round(runner.percentile(samples, 0.95) * 1000, 3),
+            "p99_ms": round(runner.percentile(samples, 0.99) * 1000, 3),
+            "max_ms": round(samples[-1] * 1000, 3) if samples else 0.0,
+            "errors": sum(errors.values()),
+            "errors_by_status": dict(errors),
+        }
+
+    def results(self, rows: int) -> list[dict[str, Any]]:
+        """Return one summary per route with traffic, and the total of every route (operation "all")."""
+        results = [
+            self._summary(rows, ROUTES[name], self.latencies[name], self.errors[name])
+            for name in ROUTES
+            if self.latencies[name]
+        ]
+        every_latency = [seconds for latencies in self.latencies.values() for seconds in latencies]
+        results.append(self._summary(rows, "all", every_latency, sum(self.errors.values(), Counter())))
+        return results
+
+
+async def _login(client: httpx.AsyncClient, username: str, report: LoadReport) -> str | None:
+    started = time.perf_counter()
+    try:
+        response = await client.post(
+            "/auth/login", json={"username": username, "password": generator.PASSWORD}
+        )
+    except httpx.HTTPError as e:
+        report.record("login", time.perf_counter() - started, type(e).__name__)
+        return None
+    failed = response.status_code >= 400
+    report.record("login", time.perf_counter() - started, str(response.status_code) if failed else None)
+    return None if failed else response.json()["token"]
+
+
+async def _client(
+    client: httpx.AsyncClient,
+    username: str,
+    names: list[str],
+    mix: dict[str, float],
+    rng: random.Random,
+    report: LoadReport,
+    keep_going: Callable[[], bool],
+) -> None:
+    """Send requests of the mix, one after the other, as one user."""
+    kinds = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in kinds]
+    token = await _login(client, username, report)
+
+    while keep_going():
+        kind = rng.choices(kinds, weights=weights)[0]
+        if kind == "login" or token is None:
+            token = await _login(client, username, report) or token
+            continue
+
+        headers = {"Authorization": f"Bearer {token}"}
+        if kind == "deposit":
+            request = client.post(
+                "/wallet/deposit", json={"username": username, "amount": 1.0}, headers=headers
+            )
+        elif kind == "transfer":
+            receiver = rng.choice(names)
+            if receiver == username:
+                receiver = names[(names.index(receiver) + 1) % len(names)]
+            transfer = {"from_user": username, "to_user": receiver, "amount": 0.01}
+            request = client.post("/wallet/transfer", json=transfer, headers=headers)
+        elif kind == "status":
+            request = client.get(f"/wallet/status/{username}", headers=headers)
+        else:
+            request = client.get(f"/wallet/history/{username}", params={"limit": 50}, headers=headers)
+
+        started = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError as e:
+            report.record(kind, time.perf_counter() - started, type(e).__name__)
+            continue
+        error = str(response.status_code) if response.status_code >= 400 else None
+        report.record(kind, time.perf_counter() - started, error)
+
+
+async def _drive(
+    client: httpx.AsyncClient,
+    users: int,
+    concurrency: int,
+    mix: dict[str, float],
+    requests: int | None,
+    duration: float | None,
+    seed: int,
+) -> LoadReport:
+    report = LoadReport()
+    names = generator.usernames(users)
+    remaining = [requests]
+    deadline = time.perf_counter() + duration if duration else None
+
+    def keep_going() -> bool:
+        if deadline is not None and time.perf_counter() >= deadline:
+            return False
+        if remaining[0] is not None:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+        return True
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _client(client, names[index % users], names, mix, random.Random(seed + index), report, keep_going)
+            for index in range(concurrency)
+        )
+    )
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+async def run_load(
+    concurrency: int = 16,
+    requests: int | None = 2000,
+    duration: float | None = None,
+    mix: dict[str, float] | None = None,
+    rows: int = 10000,
+    users: int = 100,
+    skew: float = 1.0,
+    seed: int = 0,
+    rounds: int = generator.BCRYPT_ROUNDS,
+    url: str | None = None,
+    data_dir: str | None = None,
+) -> dict[str, Any]:
+    """Drive the API with concurrent clients and return the report.
+
+    Args:
+        concurrency: Number of clients sending requests at the same time.
+        requests: Total requests of the mix to send (None to only stop at the duration).
+        duration: Seconds to run (None to only stop after the requests).
+        mix: Weight of every traffic type (DEFAULT_MIX if None).
+        rows, users, skew, seed, rounds: Parameters of the generated dataset. With url, only
+            users is used (the server must serve a dataset with at least that many users).
+        url: Base URL of a running server (None drives the app in-process).
+        data_dir: Directory where the datasets are kept between runs (None for a temporary one).
+
+    Returns:
+        Dictionary with the parameters of the run ("meta") and one result per route, plus "all".
+    """
+    mix = mix or DEFAULT_MIX
+    # The storage settings of this process only apply to the in-process app
+    meta = {
+        **runner.environment(storage=url is None),
+        "target": url or "in-process",
+        "concurrency": concurrency,
+        "requests": requests,
+        "duration": duration,
+        "mix": mix,
+        "rows": rows,
+        "users": users,
+        "skew": skew,
+        "seed": seed,
+        "bcrypt_rounds": rounds,
+    }
+
+    if url is not None:
+        async with httpx.AsyncClient(base_url=url, timeout=30.0) as client:
+            report = await _drive(client, users, concurrency, mix, requests, duration, seed)
+        return {"meta": meta, "results": report.results(rows)}
+
+    with contextlib.ExitStack() as stack:
+        base = Path(data_dir) if data_dir else Path(stack.enter_context(tempfile.TemporaryDirectory()))
+        directory = runner.prepare_dataset(base, rows, users, skew, seed, rounds)
+        with runner.using_dataset(directory):
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://proggy.test") as client:
+                    report = await _drive(client, users, concurrency, mix, requests, duration, seed)
+
+    return {"meta": meta, "results": report.results(rows)}
+
+
+def _print_results(results: list[dict[str, Any]]) -> None:
+    header = (
+        f"{'route':<34}{'requests':>9}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    )
+    print(header)
+    for result in results:
+        print(
+            f"{result['operation']:<34}{result['requests']:>9}{result['requests_per_second']:>10.1f}"
+            f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['errors']:>8}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.benchmarks.load", description=__doc__.splitlines()[1]
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="Clients sending requests at the same time"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=2000, help="Total requests (0 to only use --duration)"
+    )
+    parser.add_argument("--duration", type=float, help="Seconds to run")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="Weights, e.g. deposit=3,status=5")
+    parser.add_argument("--rows", type=generator.parse_size, default=10000, help="Ledger rows of the dataset")
+    parser.add_argument("--users", type=int, default=100, help="Users of the dataset")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of the dataset owners")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the dataset and of the traffic")
+    parser.add_argument("--bcrypt-rounds", type=int, default=generator.BCRYPT_ROUNDS, help="bcrypt cost")
+    parser.add_argument("--url", help="Base URL of a running server (default: the app in-process)")
+    parser.add_argument("--data-dir", help="Keep the datasets in this directory and reuse them")
+    parser.add_argument("--output", default="load_results.json", help="File of the JSON results")
+    parser.add_argument("--compare", help="Results file of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p50 slowdown (0.2 is 20%%)")
+    args = parser.parse_args(argv)
+
+    if not args.requests and not args.duration:
+        parser.error("Give --requests or --duration")
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    # httpx logs every request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    report = asyncio.run(
+        run_load(
+            args.concurrency,
+            args.requests or None,
+            args.duration,
+            args.mix,
+            args.rows,
+            args.users,
+            args.skew,
+            args.seed,
+            args.bcrypt_rounds,
+            args.url,
+            args.data_dir,
+        )
+    )
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    _print_results(report["results"])
+    logging.info(f"Results written to {args.output}")
+
+    if not args.compare:
+        return 0
+
+    with open(args.compare, encoding="utf-8") as file:
+        comparison = runner.compare_results(json.load(file), report, args.tolerance)
+    for entry in comparison:
+        flag = "REGRESSION" if entry["regression"] else "ok"
+        logging.info(
+            f"{entry['operation']:<34} p50 {entry['baseline_p50_ms']:.2f} -> {entry['p50_ms']:.2f} ms "
+            f"(x{entry['ratio']}) {flag}"
+        )
+    return 1 if any(entry["regression"] for entry in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
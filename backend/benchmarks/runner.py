@@ -0,0 +1,306 @@
+"""
+Benchmark runner: times the wallet operations on generated datasets.
+
+For every ledger size, a dataset is generated (or reused from --data-dir) and
+each operation is called --ops times on users drawn with the same skew as the
+rows (hot users are picked more often). Every call is timed on its own, and the
+report gives the throughput (ops/sec) and latency percentiles of each operation
+and ledger size. load_indexes is timed once per dataset: the dataset is generated
+in another process, so it measures the startup cost of a cold ledger.
+
+The results are written as JSON, together with the environment of the run. Pass
+a previous results file with --compare to get the p50 ratio of every operation:
+the command fails when one got slower than --tolerance allows.
+
+Usage:
+    python -m backend.benchmarks.runner [--sizes 10k,100k,1M,10M] [--users N] [--skew S]
+        [--ops N] [--seed N] [--data-dir DIR] [--output FILE] [--compare FILE] [--tolerance T]
+
+This module contains the following:
+- OPERATIONS
+- percentile
+- summarize
+- using_dataset
+- prepare_dataset
+- run_benchmarks
+- environment
+- compare_results
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from backend.benchmarks import generator
+from backend.modules import auth, config, wallet
+from backend.modules.auth import AuthService
+
+# Operations timed on every dataset, in order
+OPERATIONS = [
+    "get_user_entity",
+    "calculate_balance",
+    "get_transaction_history",
+    "deposit",
+    "transfer",
+]
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    """Return the nearest-rank percentile of sorted samples (fraction between 0 and 1)."""
+    if not samples:
+        return 0.0
+    rank = max(1, round(fraction * len(samples)))
+    return samples[min(rank, len(samples)) - 1]
+
+
+def summarize(rows: int, operation: str, durations: list[float]) -> dict[str, Any]:
+    """Summarize the durations (seconds) of one operation: throughput and latency percentiles (ms)."""
+    samples = sorted(durations)
+    total = sum(samples)
+    return {
+        "rows": rows,
+        "operation": operation,
+        "samples": len(samples),
+        "ops_per_second": round(len(samples) / total, 1) if total > 0 else 0.0,
+        "mean_ms": round(total / len(samples) * 1000, 4) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 4),
+        "p90_ms": round(percentile(samples, 0.90) * 1000, 4),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 4),
+        "max_ms": round(samples[-1] * 1000, 4) if samples else 0.0,
+    }
+
+
+@contextlib.contextmanager
+def using_dataset(directory: Path) -> Iterator[None]:
+    """Point the wallet and the user directory to the files of a dataset, and back afterwards."""
+    saved = (wallet.TRANSACTIONS_FILE, auth.USERS_FILE, config.SQLITE_PATH)
+    wallet.TRANSACTIONS_FILE = str(directory / "transactions.csv")
+    auth.USERS_FILE = str(directory / "users.json")
+    config.SQLITE_PATH = str(directory / "wallet.db")
+    try:
+        yield
+    finally:
+        wallet.TRANSACTIONS_FILE, auth.USERS_FILE, config.SQLITE_PATH = saved
+
+
+def _timed(call: Callable[[], Any]) -> float:
+    started = time.perf_counter()
+    call()
+    return time.perf_counter() - started
+
+
+def prepare_dataset(
+    base: Path, rows: int, users: int, skew: float, seed: int, rounds: int = generator.BCRYPT_ROUNDS
+) -> Path:
+    """Return the directory of a dataset, generating it unless the same one is already there."""
+    name = f"{config.STORAGE_BACKEND}-{config.LEDGER_PARTITION}-{rows}-{users}-{skew}-{seed}"
+    directory = base / (name if rounds == generator.BCRYPT_ROUNDS else f"{name}-{rounds}")
+    if not (directory / "dataset.json").exists():
+        logging.info(f"Generating {rows} rows for {users} users (skew {skew})")
+        # In another process, so load_indexes starts cold like after a restart
+        command = [sys.executable, "-m", "backend.benchmarks.generator", str(directory), "--rows", str(rows)]
+        command += ["--users", str(users), "--skew", str(skew), "--seed", str(seed)]
+        command += ["--bcrypt-rounds", str(rounds)]
+        environment = {
+            **os.environ,
+            "PROGGY_STORAGE_BACKEND": config.STORAGE_BACKEND,
+            "PROGGY_LEDGER_PARTITION": config.LEDGER_PARTITION,
+            "PYTHONPATH": str(Path(__file__).resolve().parents[2]),
+        }
+        subprocess.run(command, check=True, env=environment)
+    return directory
+
+
+def _run_operations(rows: int, users: int, skew: float, ops: int, seed: int) -> list[dict[str, Any]]:
+    """Time every operation on the dataset in use."""
+    rng = random.Random(seed)
+    names = generator.usernames(users)
+    weights = [1 / rank**skew for rank in range(1, users + 1)]
+
+    def sample_users() -> list[str]:
+        return rng.choices(names, weights=weights, k=ops)
+
+    results = [summarize(rows, "load_indexes", [_timed(wallet.load_indexes)])]
+    calls: dict[str, list[Callable[[], Any]]] = {}
+
+    calls["get_user_entity"] = [
+        lambda user=user: AuthService.get_user_entity(user) for user in sample_users()
+    ]
+    histories = [(user, wallet.get_transaction_history(user)) for user in sample_users()]
+    calls["calculate_balance"] = [
+        lambda user=user, history=history: wallet.calculate_balance(history, generator.INITIAL_BALANCE, user)
+        for user, history in histories
+    ]
+    calls["get_transaction_history"] = [
+        lambda user=user: wallet.get_transaction_history(user) for user in sample_users()
+    ]
+    calls["deposit"] = [lambda user=user: wallet.deposit(user, 1.0) for user in sample_users()]
+    # Small amounts, so the senders (which receive deposits too) never run out of funds
+    transfers = []
+    for sender, receiver in zip(sample_users(), sample_users(), strict=True):
+        if receiver == sender:
+            receiver = names[(names.index(sender) + 1) % users]
+        transfers.append(lambda sender=sender, receiver=receiver: wallet.transfer(sender, receiver, 0.01))
+    calls["transfer"] = transfers
+
+    for operation in OPERATIONS:
+        durations = [_timed(call) for call in calls[operation]]
+        results.append(summarize(rows, operation, durations))
+    return results
+
+
+def run_benchmarks(
+    sizes: list[int],
+    users: int = 1000,
+    skew: float = 1.0,
+    ops: int = 200,
+    seed: int = 0,
+    data_dir: str | None = None,
+) -> dict[str, Any]:
+    """Generate (or reuse) a dataset for every size and time the operations on it.
+
+    Args:
+        sizes: Ledger sizes (rows) to benchmark.
+        users: Number of users of the datasets.
+        skew: Zipf exponent of the owners of the rows and of the benchmarked users.
+        ops: Calls timed per operation and size.
+        seed: Seed of the datasets and of the user sampling.
+        data_dir: Directory where the datasets are kept between runs (None for a temporary one).
+            A reused dataset also keeps the rows written by the deposit and transfer benchmarks.
+
+    Returns:
+        Dictionary with the environment of the run ("meta") and one result per size and operation.
+    """
+    results: list[dict[str, Any]] = []
+    with contextlib.ExitStack() as stack:
+        base = Path(data_dir) if data_dir else Path(stack.enter_context(tempfile.TemporaryDirectory()))
+        for rows in sizes:
+            directory = prepare_dataset(base, rows, users, skew, seed)
+            with using_dataset(directory):
+                logging.info(f"Running {ops} calls per operation on {rows} rows")
+                results.extend(_run_operations(rows, users, skew, ops, seed))
+
+    meta = {**environment(), "users": users, "skew": skew, "ops": ops, "seed": seed}
+    return {"meta": meta, "results": results}
+
+
+def _git_commit() -> str | None:
+    try:
+        found = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return found.stdout.strip() or None
+
+
+def environment(storage: bool = True) -> dict[str, Any]:
+    """Describe the environment of a run: date, commit, Python, platform and (optionally) storage settings."""
+    described = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    if storage:
+        described["storage_backend"] = config.STORAGE_BACKEND
+        described["ledger_partition"] = config.LEDGER_PARTITION
+        described["ledger_fsync"] = config.LEDGER_FSYNC
+    return described
+
+
+def compare_results(
+    baseline: dict[str, Any], current: dict[str, Any], tolerance: float = 0.2
+) -> list[dict[str, Any]]:
+    """Compare the p50 latency of every (size, operation) measured in both runs.
+
+    Args:
+        baseline: Results of the reference run.
+        current: Results of the new run.
+        tolerance: Allowed slowdown (0.2 lets the p50 grow by 20%).
+
+    Returns:
+        One entry per (rows, operation) in both runs, with the p50 of each run, their ratio
+        (current / baseline) and whether it is a regression.
+    """
+    reference = {(result["rows"], result["operation"]): result for result in baseline["results"]}
+    comparison = []
+    for result in current["results"]:
+        before = reference.get((result["rows"], result["operation"]))
+        if before is None:
+            continue
+        ratio = result["p50_ms"] / before["p50_ms"] if before["p50_ms"] > 0 else 1.0
+        comparison.append(
+            {
+                "rows": result["rows"],
+                "operation": result["operation"],
+                "baseline_p50_ms": before["p50_ms"],
+                "p50_ms": result["p50_ms"],
+                "ratio": round(ratio, 3),
+                "regression": ratio > 1 + tolerance,
+            }
+        )
+    return comparison
+
+
+def _print_results(results: list[dict[str, Any]]) -> None:
+    print(f"{'rows':>10}  {'operation':<24}{'ops/s':>12}{'p50 ms':>11}{'p90 ms':>11}{'p99 ms':>11}")
+    for result in results:
+        print(
+            f"{result['rows']:>10}  {result['operation']:<24}{result['ops_per_second']:>12.1f}"
+            f"{result['p50_ms']:>11.3f}{result['p90_ms']:>11.3f}{result['p99_ms']:>11.3f}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.benchmarks.runner", description=__doc__.splitlines()[1]
+    )
+    parser.add_argument(
+        "--sizes", default="10k,100k", help="Comma-separated ledger sizes (e.g. 10k,100k,1M,10M)"
+    )
+    parser.add_argument("--users", type=int, default=1000, help="Number of users of the datasets")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of the owners (0 is uniform)")
+    parser.add_argument("--ops", type=int, default=200, help="Calls timed per operation and size")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the datasets and of the sampling")
+    parser.add_argument("--data-dir", help="Keep the datasets in this directory and reuse them")
+    parser.add_argument("--output", default="benchmark_results.json", help="File of the JSON results")
+    parser.add_argument("--compare", help="Results file of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p50 slowdown (0.2 is 20%%)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    sizes = [generator.parse_size(size) for size in args.sizes.split(",")]
+    report = run_benchmarks(sizes, args.users, args.skew, args.ops, args.seed, args.data_dir)
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    _print_results(report["results"])
+    logging.info(f"Results written to {args.output}")
+
+    if not args.compare:
+        return 0
+
+    with open(args.compare, encoding="utf-8") as file:
+        comparison = compare_results(json.load(file), report, args.tolerance)
+    for entry in comparison:
+        flag = "REGRESSION" if entry["regression"] else "ok"
+        logging.info(
+            f"{entry['rows']:>10} {entry['operation']:<24} p50 {entry['baseline_p50_ms']:.3f} -> "
+            f"{entry['p50_ms']:.3f} ms (x{entry['ratio']}) {flag}"
+        )
+    return 1 if any(entry["regression"] for entry in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Command line tools to maintain the Proggy Wallet data files.
+
+Usage:
+    python -m backend.cli verify-balances
+    python -m backend.cli migrate-sqlite [--database PATH]
+    python -m backend.cli checkpoint {create,verify}
+    python -m backend.cli reconcile [--window N] [--max-issues N] [--json]
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+from backend.modules import auth, config, repository, wallet
+from backend.modules.auth import AuthService
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+
+
+def verify_balances(args: argparse.Namespace) -> int:
+    """Compare the persisted balance index of every user against a full history replay."""
+    initial_balances = {username: user.balance for username, user in AuthService.directory().all().items()}
+
+    # Never rebuild here: the index checked must be the one the wallet serves balances from
+    wallet.load_indexes()
+    mismatches = wallet.verify_balance_index(initial_balances)
+
+    for user, (indexed, replayed) in mismatches.items():
+        logging.error(f"Balance mismatch for [{user}]: index={indexed} replay={replayed}")
+
+    if mismatches:
+        return 1
+
+    logging.info(f"Balance index verified for {len(initial_balances)} users")
+    return 0
+
+
+def migrate_sqlite(args: argparse.Namespace) -> int:
+    """Copy the users file and the CSV ledger into an (empty) SQLite database."""
+    database = repository.get_database(args.database)
+    book = repository.SqliteLedgerRepository(database)
+    if not book.is_empty():
+        logging.error(f"The database {args.database} already has transactions")
+        return 1
+
+    users = repository.JsonUserRepository(auth.USERS_FILE).load_users()
+    repository.SqliteUserRepository(database).add_users(users)
+
+    # A single append, so the ledger is copied completely or not at all
+    rows = list(repository.CsvLedgerRepository(wallet.TRANSACTIONS_FILE).scan())
+    book.append(rows)
+
+    logging.info(f"Copied {len(users)} users and {len(rows)} transactions to {args.database}")
+    return 0
+
+
+def checkpoint(args: argparse.Namespace) -> int:
+    """Create a balance checkpoint, or verify the latest one against a full replay."""
+    if args.action == "create":
+        wallet.create_balance_checkpoint()
+        logging.info("Balance checkpoint created")
+        return 0
+
+    users = list(AuthService.directory().all())
+    mismatches = wallet.verify_balance_checkpoints(users)
+
+    for user, (from_checkpoint, replayed) in mismatches.items():
+        logging.error(f"Checkpoint mismatch for [{user}]: checkpoint={from_checkpoint} replay={replayed}")
+
+    if mismatches:
+        return 1
+
+    logging.info(f"Balance checkpoint verified for {len(users)} users")
+    return 0
+
+
+def reconcile(args: argparse.Namespace) -> int:
+    """Stream the ledger once and check its stored balances and transfer pairs."""
+    initial_balances = {username: user.balance for username, user in AuthService.directory().all().items()}
+    report = wallet.reconcile_ledger(initial_balances, match_window=args.window, max_issues=args.max_issues)
+
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2))
+    else:
+        for issue in report.issues:
+            logging.error(f"Row {issue['row']} [{issue['owner']}] {issue['kind']}: {issue['detail']}")
+        logging.info(
+            f"Reconciled {report.rows} rows of {report.owners} owners in {report.elapsed:.2f}s "
+            f"({report.rows_per_second:.0f} rows/s), issues: {report.issue_counts}"
+        )
+
+    return 0 if report.ok else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m backend.cli", description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    verify = commands.add_parser("verify-balances", help="Check the balance index against a replay")
+    verify.set_defaults(handler=verify_balances)
+
+    migrate = commands.add_parser("migrate-sqlite", help="Copy the CSV/JSON data into the SQLite database")
+    migrate.add_argument("--database", default=config.SQLITE_PATH, help="Path of the SQLite database")
+    migrate.set_defaults(handler=migrate_sqlite)
+
+    checkpoints = commands.add_parser("checkpoint", help="Create or verify the balance checkpoint")
+    checkpoints.add_argument("action", choices=["create", "verify"])
+    checkpoints.set_defaults(handler=checkpoint)
+
+    reconciliation = commands.add_parser("reconcile", help="Check stored balances and transfer pairs")
+    reconciliation.add_argument("--window", type=int, default=10000, help="Rows to find a transfer pair")
+    reconciliation.add_argument("--max-issues", type=int, default=100, help="Issues listed in the report")
+    reconciliation.add_argument("--json", action="store_true", help="Print the report as JSON")
+    reconciliation.set_defaults(handler=reconcile)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
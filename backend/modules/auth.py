@@ -1,42 +1,170 @@
 """
 User authentication service for credential validation and user management.
 This service is responsible for:
-- Loading user data from the JSON file
-- Validating credentials using the models
+- Loading user data from the user repository (JSON file or SQLite database)
+- Keeping an in-process directory of the users, indexed by username
+- Validating credentials using the models (bcrypt runs in a bounded worker pool)
 - Returning a UserEntity object
 """
-import json
 
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from collections.abc import Callable, Hashable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from pydantic import ValidationError
+
+from backend.modules import config, metrics, repository, tracing
 from backend.modules.entities import User as UserEntity
 from backend.modules.models import UserInDB
 
 # Archivo de persistencia
 USERS_FILE = "backend/data/users.json"
 
+
+class UserDirectory:
+    """
+    In-process copy of the users of a repository, indexed by username.
+    Users are validated with the UserInDB model once, when they are loaded.
+    They are loaded again only when the repository version changes (mtime or
+    size of the JSON file, users version of the database) or on reload().
+    """
+
+    def __init__(self, users: repository.UserRepository):
+        self.repository = users
+        self._users: dict[str, UserInDB] = {}
+        # Repository version when the users were loaded, None if never loaded
+        self._version: Hashable | None = None
+        self._lock = threading.Lock()
+
+    def _load(self, version: Hashable) -> None:
+        """Load and validate every user of the repository (lock must be held)."""
+        users = {}
+        with tracing.span("auth.load_users"):
+            for user_dict in AuthService._load_users_data():
+                try:
+                    user_model = UserInDB(**user_dict)
+                except ValidationError as e:
+                    logging.warning(f"Skipping invalid user {user_dict.get('username')!r}: {e}")
+                    continue
+                # Keep the first entry when a username is repeated
+                users.setdefault(user_model.username, user_model)
+
+        self._users = users
+        self._version = version
+        metrics.USER_RELOADS.inc()
+
+    def _ensure_fresh(self) -> None:
+        version = self.repository.version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._load(version)
+
+    def get(self, username: str) -> UserInDB | None:
+        """Return the validated model of a user, or None if it doesn't exist."""
+        self._ensure_fresh()
+        return self._users.get(username)
+
+    def all(self) -> dict[str, UserInDB]:
+        """Return the validated models of every user, by username."""
+        self._ensure_fresh()
+        return dict(self._users)
+
+    def reload(self) -> None:
+        """Force the users to be loaded again on the next lookup."""
+        with self._lock:
+            self._version = None
+
+
+class PasswordPoolBusyError(Exception):
+    """Raised when too many password checks are already waiting for a worker."""
+
+
+class PasswordPool:
+    """
+    Dedicated worker threads for password verification and hashing.
+    bcrypt releases the GIL, so the checks run in parallel on several cores
+    while the event loop keeps serving other requests. The number of checks
+    waiting for a worker is limited: past that, run() fails right away.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run func(*args) in the pool and wait for its result.
+
+        Raises:
+            PasswordPoolBusyError: If all the workers are busy and the queue is full.
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.queue_limit:
+                raise PasswordPoolBusyError("Too many password checks in progress")
+            self._pending += 1
+
+        try:
+            # The context goes along, so the spans of a traced request are recorded in the worker
+            call = functools.partial(contextvars.copy_context().run, func, *args)
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+password_pool = PasswordPool(config.PASSWORD_WORKERS, config.PASSWORD_QUEUE_LIMIT)
+
+
 class AuthService:
     """Service responsible for authentication logic and user management."""
 
+    _directory: UserDirectory | None = None
+    # Storage the directory was built for: (backend, users file, database file)
+    _directory_key: tuple[str, str, str] | None = None
+
     @staticmethod
     def _load_users_data() -> list[dict]:
-        """Private method to load raw data from the JSON file."""
-        try:
-            with open(USERS_FILE, encoding="utf-8") as f:
-                data = json.load(f)
-                return data.get("users", [])
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+        """Private method to load the raw user records from the user repository."""
+        return repository.get_user_repository(USERS_FILE).load_users()
+
+    @classmethod
+    def directory(cls) -> UserDirectory:
+        """Return the user directory of the configured storage (USERS_FILE or the database)."""
+        key = (config.STORAGE_BACKEND, USERS_FILE, config.SQLITE_PATH)
+        if cls._directory is None or cls._directory_key != key:
+            cls._directory = UserDirectory(repository.get_user_repository(USERS_FILE))
+            cls._directory_key = key
+        return cls._directory
+
+    @classmethod
+    def users_version(cls) -> Hashable:
+        """Return a value that changes whenever the users change (e.g. their opening balances)."""
+        return cls.directory().repository.version()
+
+    @classmethod
+    def reload_users(cls) -> None:
+        """Explicit hook to reload the users (e.g. after editing the users file)."""
+        cls.directory().reload()
 
     @classmethod
     def get_user_entity(cls, username: str) -> UserEntity | None:
         """Find a user and return it as a business entity (UserEntity)."""
-        users = cls._load_users_data()
-        for user_dict in users:
-            if user_dict.get("username") == username:
-                # Validate the dictionary with the Pydantic model
-                user_model = UserInDB(**user_dict)
-                # Return the business entity that wraps the model
-                return UserEntity(user_model)
-        return None
+        # The directory holds users already validated with the Pydantic model
+        with tracing.span("auth.get_user"):
+            user_model = cls.directory().get(username)
+        if user_model is None:
+            return None
+
+        # Return the business entity that wraps the model
+        return UserEntity(user_model)
 
     @classmethod
     def authenticate(cls, username: str, password: str) -> UserEntity | None:
@@ -51,3 +179,29 @@ class AuthService:
             return user_entity
 
         return None
+
+    @classmethod
+    async def authenticate_async(cls, username: str, password: str) -> UserEntity | None:
+        """Same as authenticate, without blocking the event loop: bcrypt runs in the password pool.
+
+        Raises:
+            PasswordPoolBusyError: If the password pool is saturated.
+        """
+        user_entity = cls.get_user_entity(username)
+
+        if not user_entity:
+            return None
+
+        if await password_pool.run(user_entity.check_password, password):
+            return user_entity
+
+        return None
+
+    @staticmethod
+    async def hash_password_async(password: str) -> str:
+        """Hash a password in the password pool.
+
+        Raises:
+            PasswordPoolBusyError: If the password pool is saturated.
+        """
+        return await password_pool.run(UserEntity.hash_password, password)
@@ -0,0 +1,115 @@
+"""
+Columnar in-memory copy of the ledger, for computations over every user at once.
+
+Each column is a compact typed buffer instead of a list of dicts:
+- owner_codes: index of the owner in `owners` (array of unsigned ints)
+- type_codes: index of the transaction type in TYPES (array of bytes)
+- amounts: amount of the row, parsed once (array of doubles)
+Grouped sums (e.g. the balance delta of every owner) are computed in one pass
+over the buffers: with NumPy when it is installed (np.bincount), or with a
+single loop over the arrays otherwise.
+
+This module contains the following:
+- TYPES
+- ColumnarLedger
+"""
+
+from array import array
+from collections.abc import Iterable
+from typing import Any
+
+from backend.modules.utils import LedgerRow
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: the array fallback gives the same results
+    np = None
+
+# Transaction types by code; any other type is stored with the last code
+TYPES = ["deposit", "transfer_in", "transfer_out", "other"]
+_TYPE_CODES = {name: code for code, name in enumerate(TYPES)}
+_OTHER = _TYPE_CODES["other"]
+
+# Sign of each type in a balance (same rules as wallet.calculate_balance)
+_SIGNS = (1.0, 1.0, -1.0, 0.0)
+
+
+class ColumnarLedger:
+    """Ledger rows stored column by column, with grouped-sum operations by owner."""
+
+    def __init__(self):
+        self.owners: list[str] = []
+        self._owner_codes_by_name: dict[str, int] = {}
+        self.owner_codes = array("I")
+        self.type_codes = array("B")
+        self.amounts = array("d")
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict[str, Any]]) -> "ColumnarLedger":
+        """Build the columns from ledger rows (e.g. LedgerRepository.scan())."""
+        columns = cls()
+        for row in rows:
+            columns.append(row["owner"], row.get("type", ""), float(row.get("amount", 0)))
+        return columns
+
+    @classmethod
+    def from_records(cls, records: Iterable[LedgerRow]) -> "ColumnarLedger":
+        """Build the columns from typed records (e.g. LedgerRepository.scan_records()), without parsing."""
+        columns = cls()
+        for record in records:
+            columns.append(record.owner, record.type, record.amount)
+        return columns
+
+    def append(self, owner: str, trans_type: str, amount: float) -> None:
+        """Add one row at the end of the columns."""
+        code = self._owner_codes_by_name.get(owner)
+        if code is None:
+            code = self._owner_codes_by_name[owner] = len(self.owners)
+            self.owners.append(owner)
+
+        self.owner_codes.append(code)
+        self.type_codes.append(_TYPE_CODES.get(trans_type, _OTHER))
+        self.amounts.append(amount)
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def _grouped_sum(self, weights_by_type: tuple[float, ...]) -> dict[str, float]:
+        """Sum amount * weight (weight given by the row type) of every owner, in one pass."""
+        if not self.owners:
+            return {}
+
+        if np is not None:
+            owner_codes = np.frombuffer(self.owner_codes, dtype=self.owner_codes.typecode)
+            type_codes = np.frombuffer(self.type_codes, dtype=self.type_codes.typecode)
+            amounts = np.frombuffer(self.amounts, dtype=self.amounts.typecode)
+            weights = np.asarray(weights_by_type)[type_codes] * amounts
+            sums = np.bincount(owner_codes, weights=weights, minlength=len(self.owners)).tolist()
+        else:
+            sums = [0.0] * len(self.owners)
+            for owner_code, type_code, amount in zip(self.owner_codes, self.type_codes, self.amounts):
+                sums[owner_code] += weights_by_type[type_code] * amount
+
+        return dict(zip(self.owners, sums, strict=True))
+
+    def balance_deltas(self) -> dict[str, float]:
+        """Return the net amount the ledger adds to the opening balance of every owner."""
+        return self._grouped_sum(_SIGNS)
+
+    def sum_by_owner(self, types: Iterable[str]) -> dict[str, float]:
+        """Return the total amount of the rows of the given types, for every owner.
+
+        Args:
+            types: Transaction types to add up (e.g. ["deposit"]).
+        """
+        selected = set(types)
+        return self._grouped_sum(tuple(1.0 if name in selected else 0.0 for name in TYPES))
+
+    def balances(self, initial_balances: dict[str, float]) -> dict[str, float]:
+        """Return the balance of every given user (opening balance plus its delta).
+
+        Args:
+            initial_balances: Opening balance of every user, by username.
+        """
+        deltas = self.balance_deltas()
+        return {user: initial + deltas.get(user, 0.0) for user, initial in initial_balances.items()}
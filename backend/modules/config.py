@@ -0,0 +1,74 @@
+"""
+Runtime configuration of the backend.
+Every setting can be overridden with an environment variable (PROGGY_<NAME>);
+the defaults are meant for local development.
+"""
+
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment."""
+    value = os.environ.get(f"PROGGY_{name}")
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a decimal setting from the environment."""
+    value = os.environ.get(f"PROGGY_{name}")
+    return float(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Read a boolean setting (1/0, true/false, yes/no) from the environment."""
+    value = os.environ.get(f"PROGGY_{name}")
+    return value.strip().lower() in ("1", "true", "yes") if value else default
+
+
+# Password hashing (bcrypt) worker pool
+PASSWORD_WORKERS = _env_int("PASSWORD_WORKERS", min(4, os.cpu_count() or 1))
+# Password checks allowed to wait for a worker before answering 503
+PASSWORD_QUEUE_LIMIT = _env_int("PASSWORD_QUEUE_LIMIT", 32)
+
+# Session tokens: HMAC secret (random at every start if empty), lifetime in seconds,
+# and maximum number of active sessions kept in memory
+SESSION_SECRET = os.environ.get("PROGGY_SESSION_SECRET", "")
+SESSION_TTL = _env_int("SESSION_TTL", 3600)
+SESSION_STORE_SIZE = _env_int("SESSION_STORE_SIZE", 10000)
+
+# Ledger group commit: fsync every batch of rows, how long (ms) the first writer
+# waits for others to join its batch, and the maximum number of rows per batch
+LEDGER_FSYNC = _env_bool("LEDGER_FSYNC", True)
+LEDGER_FLUSH_WINDOW_MS = _env_int("LEDGER_FLUSH_WINDOW_MS", 0)
+LEDGER_MAX_BATCH = _env_int("LEDGER_MAX_BATCH", 256)
+
+# Single-writer ingestion of the API deposits and transfers: whether the routes go through
+# the writer queue, how many commands may wait in it before answering 503, and the maximum
+# number of commands applied and written together
+INGEST_QUEUE = _env_bool("INGEST_QUEUE", True)
+INGEST_QUEUE_LIMIT = _env_int("INGEST_QUEUE_LIMIT", 1024)
+INGEST_MAX_BATCH = _env_int("INGEST_MAX_BATCH", 256)
+
+# Storage backend of users and transactions ("csv" or "sqlite") and the path of
+# the SQLite database file
+STORAGE_BACKEND = os.environ.get("PROGGY_STORAGE_BACKEND", "csv").strip().lower()
+SQLITE_PATH = os.environ.get("PROGGY_SQLITE_PATH", "backend/data/wallet.db")
+
+# Time partitions of the CSV ledger: one file per "day", "month" or "year" ("none" keeps a single file)
+LEDGER_PARTITION = os.environ.get("PROGGY_LEDGER_PARTITION", "none").strip().lower()
+
+# Balance checkpoints: ledger rows between two automatic checkpoints (0 disables them)
+CHECKPOINT_INTERVAL = _env_int("CHECKPOINT_INTERVAL", 10000)
+
+# Request tracing: fraction of the requests traced (0 to 1), whether the X-Proggy-Trace header
+# can ask for a trace, interval (ms) of the stack sampler of the traced requests (0 keeps
+# only the spans) and directory where the traces are written
+TRACE_SAMPLE_RATE = _env_float("TRACE_SAMPLE_RATE", 0.0)
+TRACE_HEADER = _env_bool("TRACE_HEADER", False)
+TRACE_PROFILE_INTERVAL_MS = _env_int("TRACE_PROFILE_INTERVAL_MS", 5)
+TRACE_DIR = os.environ.get("PROGGY_TRACE_DIR", "backend/data/traces")
+
+# Users allowed to call the admin routes (comma-separated usernames, none by default)
+ADMIN_USERS = frozenset(
+    name.strip() for name in os.environ.get("PROGGY_ADMIN_USERS", "").split(",") if name.strip()
+)
@@ -1,11 +1,22 @@
 """
 The entities contains the business logic for the system. They are
 Python classes that represent 'real' concepts (e.g. User, Account).
+
+This module contains the following:
+- Account
+- User
+- TransactionRecord
 """
 
+import time
+from collections.abc import KeysView
+from datetime import datetime
+from typing import Any, NamedTuple
+
 import bcrypt
 
-from backend.modules.models import UserInDB
+from backend.modules import metrics, tracing
+from backend.modules.models import Transaction, UserInDB
 
 
 class Account:
@@ -71,13 +82,17 @@ class User:
         Verifies the password using bcrypt.
         It automatically handles the salt and the hashing comparison.
         """
+        started = time.perf_counter()
         try:
-            return bcrypt.checkpw(
-                password.encode('utf-8'),
-                self.hashed_password.encode('utf-8')
-            )
+            with tracing.span("auth.check_password"):
+                return bcrypt.checkpw(
+                    password.encode('utf-8'),
+                    self.hashed_password.encode('utf-8')
+                )
         except Exception:
             return False
+        finally:
+            metrics.BCRYPT_VERIFY_SECONDS.observe(time.perf_counter() - started)
 
     @staticmethod
     def hash_password(password: str) -> str:
@@ -90,3 +105,48 @@ class User:
 
     def __repr__(self) -> str:
         return f"User(username='{self.username}', email='{self.email}')"
+
+
+class TransactionRecord(NamedTuple):
+    """
+    One ledger row, as used internally on the write path.
+    Compact and immutable (a tuple, no per-instance dict). It can also be read like a
+    transaction dictionary (record["owner"], record.get("balance"), keys()), so the
+    repositories and the CSV writer take it in place of one.
+    """
+
+    date: str | datetime
+    owner: str
+    type: str
+    from_user: str
+    to_user: str
+    amount: float
+    balance: float
+    description: str = ""
+
+    @classmethod
+    def from_model(cls, transaction: Transaction) -> "TransactionRecord":
+        """Create the record of a validated Transaction model (without model_dump)."""
+        return cls(*(getattr(transaction, field) for field in cls._fields))
+
+    def __getitem__(self, key):
+        # Column names read the field, integers and slices keep the tuple behavior
+        if isinstance(key, str):
+            if key not in _RECORD_FIELDS:
+                raise KeyError(key)
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in _RECORD_FIELDS else default
+
+    def keys(self) -> KeysView[str]:
+        return _RECORD_KEYS
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the record as a transaction dictionary (e.g. for an API response)."""
+        return dict(zip(self._fields, self, strict=True))
+
+
+_RECORD_FIELDS = frozenset(TransactionRecord._fields)
+_RECORD_KEYS = dict.fromkeys(TransactionRecord._fields).keys()
@@ -0,0 +1,146 @@
+"""
+Single-writer ingestion of the deposits and transfers of the API.
+
+Handlers submit commands to a bounded asyncio queue and await a future that
+resolves with the committed transaction. One writer task takes the waiting
+commands in order (up to INGEST_MAX_BATCH at a time) and applies them with
+wallet.apply_commands: against in-memory Account entities, so every command sees
+the balances left by the previous ones, and with a single ledger write (one fsync)
+for the whole batch. The write runs in a worker thread, so the event loop keeps
+serving requests; the commands submitted meanwhile form the next batch.
+When the queue is full, submit() fails right away instead of waiting (backpressure).
+The trace of a traced request travels with its command: the spans of the batch
+that applies it are recorded on the trace (see tracing.shared).
+
+This module contains the following:
+- IngestQueueFullError
+- LedgerService
+- ledger_service
+"""
+
+import asyncio
+import contextvars
+import logging
+from typing import Any
+
+from backend.modules import config, tracing, wallet
+
+
+class IngestQueueFullError(Exception):
+    """Raised when too many ledger commands are already waiting for the writer."""
+
+
+class LedgerService:
+    """
+    Bounded queue of ledger commands and the writer task that applies them.
+    The writer is started by the first submit() in a running event loop
+    (and again if the loop changes, e.g. between test clients).
+    """
+
+    def __init__(self, queue_limit: int, max_batch: int):
+        self.queue_limit = queue_limit
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue | None = None
+        self._writer: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _ensure_writer(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._writer is None or self._writer.done():
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.queue_limit)
+            # An empty context: the writer must not inherit the trace of the request that started it
+            # (the trace of every command is queued with the command)
+            self._writer = loop.create_task(
+                self._run(self._queue), name="ledger-writer", context=contextvars.Context()
+            )
+        return self._queue
+
+    @property
+    def pending(self) -> int:
+        """Number of commands waiting for the writer."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, command: dict[str, Any]) -> dict:
+        """Queue a command (see wallet.apply_commands) and wait until it is committed.
+
+        Returns:
+            The recorded transaction (the transfer_out record of a transfer).
+
+        Raises:
+            IngestQueueFullError: If the queue is full.
+            FileNotFoundError: If a user of the command doesn't exist.
+            ValueError: If the amount is invalid or the balance is insufficient.
+            OSError: If the ledger cannot be written.
+        """
+        queue = self._ensure_writer()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            queue.put_nowait((command, future, tracing.current_trace()))
+        except asyncio.QueueFull:
+            raise IngestQueueFullError("Too many ledger writes in progress") from None
+        return await future
+
+    async def deposit(self, user: str, amount: float, source: str = "external") -> dict:
+        """Submit a deposit and wait for its transaction (same errors as submit)."""
+        return await self.submit({"type": "deposit", "user": user, "amount": amount, "source": source})
+
+    async def transfer(self, from_user: str, to_user: str, amount: float) -> dict:
+        """Submit a transfer and wait for its transfer_out transaction (same errors as submit)."""
+        return await self.submit(
+            {"type": "transfer", "from_user": from_user, "to_user": to_user, "amount": amount}
+        )
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        while True:
+            taken = [await queue.get()]
+            while len(taken) < self.max_batch and not queue.empty():
+                taken.append(queue.get_nowait())
+
+            # Commands whose caller went away before they were applied are dropped
+            batch = [entry for entry in taken if not entry[1].cancelled()]
+            try:
+                if batch:
+                    await self._commit(batch)
+            except Exception:
+                logging.exception("Unexpected error in the ledger writer")
+            finally:
+                for _ in taken:
+                    queue.task_done()
+
+    @staticmethod
+    def _apply(commands: list[dict[str, Any]], traces: list[tracing.Trace]) -> list[dict | Exception]:
+        # The spans of the batch are recorded on the trace of every traced command
+        with tracing.shared(traces, "ingest.batch"):
+            return wallet.apply_commands(commands)
+
+    async def _commit(self, batch: list[tuple[dict[str, Any], asyncio.Future, tracing.Trace | None]]) -> None:
+        commands = [command for command, _, _ in batch]
+        traces = [trace for _, _, trace in batch if trace is not None]
+        try:
+            results = await asyncio.to_thread(self._apply, commands, traces)
+        except Exception as e:
+            # Nothing was written: every command of the batch fails
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results, strict=True):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def drain(self) -> None:
+        """Wait until every queued command is committed, then stop the writer."""
+        if self._writer is None or self._loop is not asyncio.get_running_loop():
+            return
+        await self._queue.join()
+        self._writer.cancel()
+        self._writer = None
+
+
+ledger_service = LedgerService(config.INGEST_QUEUE_LIMIT, config.INGEST_MAX_BATCH)
@@ -0,0 +1,951 @@
+"""
+Append-only journal for the transactions ledger (CSV file).
+
+The ledger is never rewritten: every new row is appended at the end of the file,
+so recording a transaction costs the same no matter how big the ledger is.
+Indexes derived from the ledger are kept in memory and updated on every append.
+They are rebuilt from the file when it changed behind our back.
+The balance and rollup indexes are checkpointed every CHECKPOINT_INTERVAL rows,
+so after a restart only the rows written since the latest checkpoint are replayed.
+Concurrent appends are group-committed: one caller writes the rows of all the
+waiting callers with a single fsync.
+
+This module contains the following:
+- CSV_COLUMNS
+- type_code
+- date_key
+- LedgerWriter
+- GroupCommit
+- LedgerIndex
+- BalanceIndex
+- OwnerIndex
+- RollupIndex
+- Ledger
+- get_ledger
+"""
+
+import bisect
+import csv
+import io
+import json
+import logging
+import os
+import threading
+from array import array
+from collections.abc import Callable, Iterable, Iterator
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from backend.modules import config, metrics, tracing
+
+# CSV column names (order used when the ledger file is created)
+CSV_COLUMNS = ["date", "owner", "type", "from_user", "to_user", "amount", "balance", "description"]
+
+# Codes of the transaction types in the owner index (any other type gets the last code)
+TYPE_CODES = {"deposit": 0, "transfer_in": 1, "transfer_out": 2}
+_OTHER_TYPE = len(TYPE_CODES)
+
+
+def type_code(trans_type: str) -> int:
+    """Return the code of a transaction type in the owner index."""
+    return TYPE_CODES.get(trans_type, _OTHER_TYPE)
+
+
+def date_key(date: Any) -> int:
+    """Return a row date (text or datetime) as a sortable integer YYYYMMDDHHMMSS (0 if missing).
+    Fractions of a second are dropped: date filters on the CSV ledger have a one second resolution.
+    """
+    if isinstance(date, datetime):
+        return int(date.strftime("%Y%m%d%H%M%S"))
+    text = str(date or "")
+    digits = text[0:4] + text[5:7] + text[8:10] + text[11:13] + text[14:16] + text[17:19]
+    return int(digits.ljust(14, "0")) if digits.isdigit() else 0
+
+
+def _read_record(file: BinaryIO) -> bytes:
+    """Read the CSV record starting at the current position of a file, as bytes.
+    A record spans several lines when a quoted field (e.g. a description) has line breaks.
+    """
+    record = file.readline()
+    # An odd number of quotes: the quoted field goes on in the next line
+    while record.count(b'"') % 2:
+        line = file.readline()
+        if not line:
+            break
+        record += line
+    return record
+
+
+class LedgerWriter:
+    """
+    Appends rows to a CSV ledger file.
+    The header is written when the file is new, or validated the first time an
+    existing file is opened. Rows always follow the column order of the header.
+    """
+
+    def __init__(self, path: str, columns: list[str] | None = None):
+        self.path = Path(path)
+        self.columns = list(columns or CSV_COLUMNS)
+        # Column order of the file on disk (known after the header is validated)
+        self._fieldnames: list[str] | None = None
+        self._lock = threading.Lock()
+
+    def _read_header(self) -> list[str]:
+        """Read only the first line of the ledger and return its column names."""
+        with open(self.path, encoding="utf-8", newline="") as file:
+            return next(csv.reader([file.readline()]), [])
+
+    def _resolve_fieldnames(self, file_is_empty: bool) -> list[str]:
+        """Return the column order to write with, validating the header once."""
+        if file_is_empty:
+            self._fieldnames = self.columns
+            return self._fieldnames
+
+        if self._fieldnames is None:
+            header = self._read_header()
+            # Older ledgers may have the same columns in a different order: keep theirs
+            if sorted(header) != sorted(self.columns):
+                raise ValueError(
+                    f"Ledger header mismatch in {self.path}: expected {self.columns}, found {header}"
+                )
+            self._fieldnames = header
+
+        return self._fieldnames
+
+    def _serialize(self, rows: list[dict[str, Any]], fieldnames: list[str]) -> list[bytes]:
+        """Convert each row to an encoded CSV line."""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+        lines = []
+
+        for row in rows:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(row)
+            lines.append(buffer.getvalue().encode("utf-8"))
+
+        return lines
+
+    def append(self, rows: list[dict[str, Any]]) -> list[int]:
+        """Append rows at the end of the ledger in a single write.
+
+        Args:
+            rows: List of transaction dictionaries. Keys must be ledger columns.
+
+        Returns:
+            Byte offset where each row starts in the ledger file.
+
+        Raises:
+            ValueError: If the header of the file does not match the ledger columns,
+                        or a row contains unknown columns.
+            OSError: If the file cannot be written.
+        """
+        if not rows:
+            return []
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._lock, open(self.path, "ab") as file:
+            position = file.seek(0, io.SEEK_END)
+            fieldnames = self._resolve_fieldnames(file_is_empty=position == 0)
+            lines = self._serialize(rows, fieldnames)
+
+            # A new ledger starts with its header line
+            header = b""
+            if position == 0:
+                header = (",".join(fieldnames) + "\r\n").encode("utf-8")
+                position = len(header)
+
+            offsets = []
+            for line in lines:
+                offsets.append(position)
+                position += len(line)
+
+            data = header + b"".join(lines)
+            file.write(data)
+
+        metrics.record_write("ledger", len(lines), len(data))
+        return offsets
+
+    def fsync(self) -> None:
+        """Force the rows written so far to disk."""
+        with open(self.path, "rb") as file:
+            os.fsync(file.fileno())
+
+
+class _CommitRequest:
+    """Rows of one caller waiting in the group commit queue."""
+
+    __slots__ = ("rows", "offsets", "error", "done")
+
+    def __init__(self, rows: list[dict[str, Any]]):
+        self.rows = rows
+        self.offsets: list[int] = []
+        self.error: Exception | None = None
+        self.done = False
+
+
+class GroupCommit:
+    """
+    Group commit of ledger appends.
+    Callers are queued; the first one that finds no write in progress becomes the
+    leader: it waits up to `window` seconds for more callers (or until `max_batch`
+    rows are queued), writes the whole batch with one durable write, and wakes up
+    the callers of that batch. Every caller returns only once its rows are on disk.
+    """
+
+    def __init__(
+        self, write_batch: Callable[[list[dict[str, Any]]], list[int]], window: float, max_batch: int
+    ):
+        self._write_batch = write_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: list[_CommitRequest] = []
+        self._queued_rows = 0
+        self._flushing = False
+        self._cond = threading.Condition()
+
+    def _take_batch(self) -> list[_CommitRequest]:
+        """Take the oldest requests, up to max_batch rows (at least one request)."""
+        batch = [self._queue.pop(0)]
+        rows = len(batch[0].rows)
+        while self._queue and rows + len(self._queue[0].rows) <= self.max_batch:
+            rows += len(self._queue[0].rows)
+            batch.append(self._queue.pop(0))
+        self._queued_rows -= rows
+        return batch
+
+    def _commit(self, batch: list[_CommitRequest]) -> None:
+        """Write the rows of a batch and hand each request its offsets (or the error)."""
+        try:
+            offsets = self._write_batch([row for request in batch for row in request.rows])
+        except Exception as e:
+            for request in batch:
+                request.error = e
+            return
+
+        position = 0
+        for request in batch:
+            request.offsets = offsets[position : position + len(request.rows)]
+            position += len(request.rows)
+
+    def submit(self, rows: list[dict[str, Any]]) -> list[int]:
+        """Queue rows and wait until they are durably written.
+
+        Returns:
+            Byte offset where each row starts in the ledger file.
+
+        Raises:
+            Exception: Whatever the write of the batch raised.
+        """
+        request = _CommitRequest(rows)
+
+        with self._cond:
+            self._queue.append(request)
+            self._queued_rows += len(rows)
+            self._cond.notify_all()
+
+            while not request.done:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+
+                # No write in progress: this caller leads the next batch
+                self._flushing = True
+                if self.window > 0:
+                    self._cond.wait_for(lambda: self._queued_rows >= self.max_batch, timeout=self.window)
+                batch = self._take_batch()
+
+                self._cond.release()
+                try:
+                    self._commit(batch)
+                finally:
+                    self._cond.acquire()
+                    for committed in batch:
+                        committed.done = True
+                    self._flushing = False
+                    self._cond.notify_all()
+
+        if request.error is not None:
+            raise request.error
+        return request.offsets
+
+
+class LedgerIndex:
+    """
+    Base class for the structures derived from the ledger rows.
+    Subclasses receive every row (with its byte offset) in ledger order.
+    Indexes persisted in a sidecar file restore themselves in load() and
+    only need the rows after the position they cover.
+    """
+
+    # Bytes of the ledger already applied to the index
+    position = 0
+
+    def reset(self) -> None:
+        """Forget everything, before the ledger is replayed from the start."""
+        raise NotImplementedError
+
+    def apply(self, row: dict[str, Any], offset: int) -> None:
+        """Update the index with one ledger row."""
+        raise NotImplementedError
+
+    def load(self, ledger: "Ledger") -> None:
+        """Restore the persisted state, if any (default: nothing is persisted)."""
+
+    def flush(self) -> None:
+        """Persist the rows applied since the last flush (default: nothing is persisted)."""
+
+
+class BalanceIndex(LedgerIndex):
+    """
+    Materialized net movement of every owner in the ledger.
+    The current balance of a user is the opening balance plus its delta.
+    A checkpoint (ledger position + delta of every owner at that position) is
+    saved to a sidecar file every CHECKPOINT_INTERVAL rows and restored at startup.
+    Deltas are stored instead of balances, so editing an opening balance
+    doesn't invalidate the checkpoint.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.deltas: dict[str, float] = {}
+        # Latest checkpoint: ledger position it covers and the deltas at that position
+        self.checkpoint_position = 0
+        self.checkpoint_deltas: dict[str, float] = {}
+        # (owner, offset) of the last applied row, used to validate the checkpoint
+        self._last: tuple[str, int] | None = None
+        self._since_checkpoint = 0
+
+    def reset(self) -> None:
+        self.deltas = {}
+        self.checkpoint_position = 0
+        self.checkpoint_deltas = {}
+        self._last = None
+        self._since_checkpoint = 0
+        self.path.unlink(missing_ok=True)
+
+    def apply(self, row: dict[str, Any], offset: int) -> None:
+        # Same rules as wallet.calculate_balance
+        trans_type = row.get("type", "")
+        amount = float(row.get("amount", 0))
+
+        if trans_type in ["deposit", "transfer_in"]:
+            self.deltas[row["owner"]] = self.deltas.get(row["owner"], 0.0) + amount
+        elif trans_type == "transfer_out":
+            self.deltas[row["owner"]] = self.deltas.get(row["owner"], 0.0) - amount
+
+        self._last = (row["owner"], offset)
+        self._since_checkpoint += 1
+
+    def load(self, ledger: "Ledger") -> None:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                saved = json.load(file)
+            last_owner, last_offset = saved["last_owner"], saved["last_offset"]
+            position, deltas = saved["position"], saved["deltas"]
+        except FileNotFoundError:
+            return
+        except (ValueError, KeyError, TypeError):
+            # Corrupted checkpoint: the balances will be replayed from the ledger
+            self.reset()
+            return
+
+        # The last row covered by the checkpoint must still be in the ledger, ending at its position
+        found = ledger.read_row_at(last_offset)
+        if found is None or found[0].get("owner") != last_owner or found[1] != position:
+            self.reset()
+            return
+
+        self.deltas = dict(deltas)
+        self.checkpoint_deltas = dict(deltas)
+        self.checkpoint_position = self.position = position
+        self._last = (last_owner, last_offset)
+
+    def flush(self) -> None:
+        if config.CHECKPOINT_INTERVAL and self._since_checkpoint >= config.CHECKPOINT_INTERVAL:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """Save the current deltas as the latest checkpoint (nothing to save on an empty ledger)."""
+        if self._last is None:
+            return
+
+        saved = {
+            "position": self.position,
+            "last_owner": self._last[0],
+            "last_offset": self._last[1],
+            "deltas": self.deltas,
+        }
+        # Write a new file and swap it in, so a crash never leaves half a checkpoint
+        temporary = self.path.with_suffix(".tmp")
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(saved, file)
+        os.replace(temporary, self.path)
+
+        self.checkpoint_position = self.position
+        self.checkpoint_deltas = dict(self.deltas)
+        self._since_checkpoint = 0
+
+    def delta(self, owner: str) -> float:
+        """Return the net amount the ledger adds to the owner's opening balance."""
+        return self.deltas.get(owner, 0.0)
+
+
+class OwnerIndex(LedgerIndex):
+    """
+    Byte offsets of the rows of every owner, in ledger order, with the date and
+    type of each row, so history filters are evaluated on the index and only the
+    matching rows are read from the ledger.
+    It is persisted in an append-only sidecar file (one 'owner,offset,type,date'
+    line per ledger row), so it survives restarts without replaying the ledger.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offsets: dict[str, list[int]] = {}
+        # Per owner, aligned with the offsets: date keys (YYYYMMDDHHMMSS) and type codes
+        self.dates: dict[str, array] = {}
+        self.types: dict[str, bytearray] = {}
+        # Owners whose rows are not in date order (late rows): their dates can't be bisected
+        self.unordered: set[str] = set()
+        self._pending: list[tuple[str, int, int, int]] = []
+
+    def reset(self) -> None:
+        self.offsets = {}
+        self.dates = {}
+        self.types = {}
+        self.unordered = set()
+        self._pending = []
+        self.path.unlink(missing_ok=True)
+
+    def _add(self, owner: str, offset: int, type_code: int, date_key: int) -> None:
+        offsets = self.offsets.get(owner)
+        if offsets is None:
+            offsets = self.offsets[owner] = []
+            self.dates[owner] = array("q")
+            self.types[owner] = bytearray()
+        elif date_key < self.dates[owner][-1]:
+            self.unordered.add(owner)
+
+        offsets.append(offset)
+        self.dates[owner].append(date_key)
+        self.types[owner].append(type_code)
+
+    def apply(self, row: dict[str, Any], offset: int) -> None:
+        entry = (row["owner"], offset, type_code(row.get("type", "")), date_key(row.get("date")))
+        self._add(*entry)
+        self._pending.append(entry)
+
+    def load(self, ledger: "Ledger") -> None:
+        try:
+            with open(self.path, encoding="utf-8", newline="") as file:
+                entries = [
+                    (owner, int(offset), int(code), int(key)) for owner, offset, code, key in csv.reader(file)
+                ]
+        except FileNotFoundError:
+            return
+        except ValueError:
+            # Corrupted (or older format) sidecar: it will be rebuilt from the ledger
+            self.reset()
+            return
+
+        if not entries:
+            return
+
+        # The last entry must still point to a row of that owner in the ledger
+        last_owner, last_offset = entries[-1][:2]
+        found = ledger.read_row_at(last_offset)
+        if found is None or found[0].get("owner") != last_owner:
+            self.reset()
+            return
+
+        for entry in entries:
+            self._add(*entry)
+        self.position = found[1]
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(self._pending)
+        with open(self.path, "a", encoding="utf-8", newline="") as file:
+            file.write(buffer.getvalue())
+        self._pending = []
+
+    def rows_of(self, owner: str) -> list[int]:
+        """Return the offsets of the owner's rows (oldest first)."""
+        return list(self.offsets.get(owner, []))
+
+    def count(self, owner: str) -> int:
+        """Return the number of rows of the owner (O(1), nothing is copied)."""
+        offsets = self.offsets.get(owner)
+        return len(offsets) if offsets is not None else 0
+
+    def select(
+        self,
+        owner: str,
+        start: int | None = None,
+        end: int | None = None,
+        type_codes: set[int] | None = None,
+        last: int | None = None,
+        limit: int | None = None,
+        ascending: bool = True,
+    ) -> list[int]:
+        """Return the offsets of the owner's rows matching the filters, in page order.
+
+        Args:
+            owner: Owner of the rows.
+            start: Only rows with a date key at or after this one (see date_key).
+            end: Only rows with a date key before this one.
+            type_codes: Only rows of these type codes (see type_code).
+            last: Offset of the last row of the previous page (None for the first page).
+            limit: Maximum number of offsets (None for all of them).
+            ascending: Oldest first (True) or newest first (False).
+        """
+        offsets = self.offsets.get(owner)
+        if not offsets:
+            return []
+        dates, types = self.dates[owner], self.types[owner]
+        dated = start is not None or end is not None
+
+        # Window of the rows to look at: the page cursor, then the dates when they are in order
+        low, high = 0, len(offsets)
+        if last is not None:
+            if ascending:
+                low = bisect.bisect_right(offsets, last)
+            else:
+                high = bisect.bisect_left(offsets, last)
+        check_dates = dated and owner in self.unordered
+        if dated and not check_dates:
+            # Rows without a date (key 0) never match a date filter
+            low = max(low, bisect.bisect_left(dates, max(start or 0, 1)))
+            if end is not None:
+                high = min(high, bisect.bisect_left(dates, end))
+
+        selected = []
+        for i in range(low, high) if ascending else range(high - 1, low - 1, -1):
+            if type_codes is not None and types[i] not in type_codes:
+                continue
+            if check_dates:
+                key = dates[i]
+                if not key or (start is not None and key < start) or (end is not None and key >= end):
+                    continue
+            selected.append(offsets[i])
+            if limit is not None and len(selected) >= limit:
+                break
+        return selected
+
+
+class RollupIndex(LedgerIndex):
+    """
+    Monthly totals of every owner: [deposits, transfers in, transfers out, row count]
+    by month ("YYYY-MM"), updated with every row, so a summary costs O(months).
+    Like the balance index, it is saved to a sidecar file (with the ledger position
+    it covers) every CHECKPOINT_INTERVAL rows and restored at startup.
+    """
+
+    # Position of each type in the totals of a month
+    _COLUMNS = {"deposit": 0, "transfer_in": 1, "transfer_out": 2}
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.totals: dict[str, dict[str, list[float]]] = {}
+        # (owner, offset) of the last applied row, used to validate the saved totals
+        self._last: tuple[str, int] | None = None
+        self._since_save = 0
+
+    def reset(self) -> None:
+        self.totals = {}
+        self._last = None
+        self._since_save = 0
+        self.path.unlink(missing_ok=True)
+
+    def apply(self, row: dict[str, Any], offset: int) -> None:
+        months = self.totals.get(row["owner"])
+        if months is None:
+            months = self.totals[row["owner"]] = {}
+        month = str(row.get("date") or "")[:7]
+        totals = months.get(month)
+        if totals is None:
+            totals = months[month] = [0.0, 0.0, 0.0, 0]
+
+        column = self._COLUMNS.get(row.get("type", ""))
+        if column is not None:
+            totals[column] += float(row.get("amount", 0))
+        totals[3] += 1
+
+        self._last = (row["owner"], offset)
+        self._since_save += 1
+
+    def load(self, ledger: "Ledger") -> None:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                saved = json.load(file)
+            last_owner, last_offset = saved["last_owner"], saved["last_offset"]
+            position, totals = saved["position"], saved["totals"]
+        except FileNotFoundError:
+            return
+        except (ValueError, KeyError, TypeError):
+            # Corrupted sidecar: the totals will be replayed from the ledger
+            self.reset()
+            return
+
+        # The last row covered by the totals must still be in the ledger, ending at its position
+        found = ledger.read_row_at(last_offset)
+        if found is None or found[0].get("owner") != last_owner or found[1] != position:
+            self.reset()
+            return
+
+        self.totals = totals
+        self.position = position
+        self._last = (last_owner, last_offset)
+
+    def flush(self) -> None:
+        if config.CHECKPOINT_INTERVAL and self._since_save >= config.CHECKPOINT_INTERVAL:
+            self.save()
+
+    def save(self) -> None:
+        """Save the totals and the ledger position they cover (nothing to save on an empty ledger)."""
+        if self._last is None:
+            return
+
+        saved = {
+            "position": self.position,
+            "last_owner": self._last[0],
+            "last_offset": self._last[1],
+            "totals": self.totals,
+        }
+        # Write a new file and swap it in, so a crash never leaves half the totals
+        temporary = self.path.with_suffix(".rollup.tmp")
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(saved, file)
+        os.replace(temporary, self.path)
+        self._since_save = 0
+
+    def months(self, owner: str) -> dict[str, tuple[float, float, float, int]]:
+        """Return the totals of the owner by month: (deposits, transfers in, transfers out, rows)."""
+        return {month: tuple(totals) for month, totals in self.totals.get(owner, {}).items()}
+
+
+class Ledger:
+    """
+    A ledger file together with the indexes derived from it.
+    The indexes follow the file: rows appended through this object are applied
+    right away, rows appended by someone else are read from the tail, and the
+    indexes are rebuilt from scratch if the file was replaced or truncated.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.writer = LedgerWriter(path)
+        self.commits = GroupCommit(
+            self._write_batch,
+            window=config.LEDGER_FLUSH_WINDOW_MS / 1000,
+            max_batch=config.LEDGER_MAX_BATCH,
+        )
+        self.balances = BalanceIndex(self.path.with_suffix(".ckpt"))
+        self.owners = OwnerIndex(self.path.with_suffix(".idx"))
+        self.rollups = RollupIndex(self.path.with_suffix(".rollup"))
+        self.indexes: list[LedgerIndex] = [self.balances, self.owners, self.rollups]
+        # (size, mtime) of the file when the indexes were last brought up to date
+        self._stat: tuple[int, int] | None = None
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _file_stat(self) -> tuple[int, int] | None:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def _parse_line(line: bytes, fieldnames: list[str]) -> dict[str, str]:
+        values = next(csv.reader([line.decode("utf-8")]))
+        return dict(zip(fieldnames, values, strict=False))
+
+    def _read_rows(self, start: int) -> Iterator[tuple[int, int, dict[str, str]]]:
+        """Yield (offset, end offset, row) for every complete record from a byte offset."""
+        try:
+            file = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+
+        with file:
+            header_line = file.readline()
+            fieldnames = next(csv.reader([header_line.decode("utf-8")]), [])
+            first = position = max(start, len(header_line))
+            file.seek(position)
+
+            rows = 0
+            pending = b""
+            try:
+                for line in file:
+                    if pending:
+                        line = pending + line
+                    # An odd number of quotes: a quoted field with a line break goes on in the next line
+                    if line.count(b'"') % 2:
+                        pending = line
+                        continue
+                    pending = b""
+                    # A last line without line ending is still being written
+                    if not line.endswith(b"\n"):
+                        break
+                    yield position, position + len(line), self._parse_line(line, fieldnames)
+                    position += len(line)
+                    rows += 1
+            finally:
+                metrics.record_read("ledger", rows, position - first)
+
+    def scan(self, start: int = 0) -> Iterator[tuple[int, dict[str, str]]]:
+        """Read the ledger rows from a byte offset onwards.
+
+        Args:
+            start: Byte offset to start from (0 reads the whole ledger).
+
+        Yields:
+            Tuples of (offset, row). Rows are dictionaries with string values,
+            like the ones returned by csv.DictReader.
+        """
+        for offset, _, row in self._read_rows(start):
+            yield offset, row
+
+    def read_rows_at(self, offsets: list[int]) -> list[dict[str, str]]:
+        """Read the rows starting at the given byte offsets, seeking straight to each one."""
+        if not offsets:
+            return []
+
+        with open(self.path, "rb") as file:
+            fieldnames = next(csv.reader([file.readline().decode("utf-8")]), [])
+            rows = []
+            size = 0
+            for offset in offsets:
+                file.seek(offset)
+                line = _read_record(file)
+                size += len(line)
+                rows.append(self._parse_line(line, fieldnames))
+
+        metrics.record_read("ledger", len(rows), size)
+        return rows
+
+    def read_row_at(self, offset: int) -> tuple[dict[str, str], int] | None:
+        """Read the complete row starting at a byte offset, with its end offset."""
+        try:
+            with open(self.path, "rb") as file:
+                fieldnames = next(csv.reader([file.readline().decode("utf-8")]), [])
+                if offset < file.tell():
+                    return None
+                file.seek(offset)
+                line = _read_record(file)
+        except FileNotFoundError:
+            return None
+
+        metrics.record_read("ledger", 1, len(line))
+        if not line.endswith(b"\n") or line.count(b'"') % 2:
+            return None
+        return self._parse_line(line, fieldnames), offset + len(line)
+
+    def _catch_up(self) -> None:
+        """Apply the rows each index has not seen yet (lock must be held)."""
+        start = min(index.position for index in self.indexes)
+        for offset, end, row in self._read_rows(start):
+            for index in self.indexes:
+                if offset >= index.position:
+                    index.apply(row, offset)
+                    index.position = end
+        for index in self.indexes:
+            index.flush()
+        self._stat = self._file_stat()
+
+    def rebuild(self) -> None:
+        """Replay the whole ledger to rebuild the indexes."""
+        with self._lock:
+            for index in self.indexes:
+                index.reset()
+                index.position = 0
+            self._loaded = True
+            self._catch_up()
+
+    def sync(self) -> None:
+        """Bring the indexes up to date with the ledger file, if it changed."""
+        with self._lock:
+            if not self._loaded:
+                # First use: restore the persisted indexes, then read the tail
+                for index in self.indexes:
+                    index.load(self)
+                self._loaded = True
+                self._catch_up()
+                return
+
+            stat = self._file_stat()
+            if stat == self._stat:
+                return
+
+            size = stat[0] if stat else 0
+            position = max(index.position for index in self.indexes)
+            if size < position or (self._stat is not None and size == self._stat[0]):
+                # The file was replaced, truncated or rewritten: start over
+                self.rebuild()
+            else:
+                # Someone else appended rows: apply only the tail
+                self._catch_up()
+
+    def _write_batch(self, rows: list[dict[str, Any]]) -> list[int]:
+        """Append a batch of rows, fsync it (once), then apply it to the indexes.
+        The indexes only ever contain durable rows: if the fsync fails, the rows
+        are cut from the end of the file again and the error is raised.
+        """
+        with tracing.span("ledger.write"), self._lock:
+            self.sync()
+            size = self._stat[0] if self._stat else 0
+            offsets = self.writer.append(rows)
+            # Readers keep using the indexes as they are until the rows are durable
+            self._stat = self._file_stat()
+            end = self._stat[0]
+
+        # The disk flush happens outside the lock, so readers are not blocked by it
+        if config.LEDGER_FSYNC:
+            try:
+                with tracing.span("ledger.fsync"):
+                    self.writer.fsync()
+            except OSError:
+                self._discard(size)
+                raise
+
+        with self._lock:
+            for index in self.indexes:
+                for offset, row in zip(offsets, rows, strict=True):
+                    # Rows appended by someone else meanwhile may have been applied by a reader
+                    if offset >= index.position:
+                        index.apply(row, offset)
+                index.position = max(index.position, end)
+                index.flush()
+        return offsets
+
+    def _discard(self, size: int) -> None:
+        """Cut the rows of a failed write from the end of the ledger (they were never applied)."""
+        with self._lock:
+            try:
+                os.truncate(self.path, size)
+            except OSError as e:
+                logging.error(f"Could not remove the rows of a failed write from {self.path}: {e}")
+            # The next read or write brings the indexes up to date with what is left in the file
+            self._stat = None
+
+    def append(self, rows: list[dict[str, Any]]) -> list[int]:
+        """Append rows to the ledger and apply them to the indexes.
+        Concurrent callers are group-committed; this returns once the rows are durable.
+
+        Args:
+            rows: List of transaction dictionaries. Keys must be ledger columns.
+
+        Returns:
+            Byte offset where each row starts in the ledger file.
+        """
+        if not rows:
+            return []
+        with tracing.span("ledger.append"):
+            return self.commits.submit(rows)
+
+    def balance_delta(self, owner: str) -> float:
+        """Return the net amount the ledger adds to the owner's opening balance (O(1))."""
+        with self._lock:
+            self.sync()
+            return self.balances.delta(owner)
+
+    def owner_offsets(self, owner: str) -> list[int]:
+        """Return the byte offsets of the owner's rows, oldest first."""
+        with self._lock:
+            self.sync()
+            return self.owners.rows_of(owner)
+
+    def owner_count(self, owner: str) -> int:
+        """Return the number of rows of the owner (O(1))."""
+        with self._lock:
+            self.sync()
+            return self.owners.count(owner)
+
+    def owner_page(
+        self,
+        owner: str,
+        last: int | None = None,
+        limit: int | None = 50,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        types: Iterable[str] | None = None,
+        ascending: bool = False,
+    ) -> list[int]:
+        """Return the offsets of up to `limit` rows of the owner matching the filters.
+        The filters are evaluated on the owner index: no row is read from the file.
+
+        Args:
+            owner: Owner of the rows.
+            last: Offset of the last row of the previous page (None starts from the newest,
+                or the oldest row when ascending).
+            limit: Maximum number of offsets to return (None for all of them).
+            start: Only rows dated at or after this date.
+            end: Only rows dated before this date.
+            types: Only rows of these transaction types.
+            ascending: Oldest first instead of newest first.
+        """
+        with self._lock:
+            self.sync()
+            return self.owners.select(
+                owner,
+                date_key(start) if start is not None else None,
+                date_key(end) if end is not None else None,
+                {type_code(trans_type) for trans_type in types} if types is not None else None,
+                last,
+                limit,
+                ascending,
+            )
+
+    def owner_rows(
+        self,
+        owner: str,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        types: Iterable[str] | None = None,
+    ) -> list[dict[str, str]]:
+        """Return the rows of an owner matching the filters, oldest first, reading only those rows."""
+        return self.read_rows_at(self.owner_page(owner, None, None, start, end, types, ascending=True))
+
+    def monthly_totals(self, owner: str) -> dict[str, tuple[float, float, float, int]]:
+        """Return the owner's totals by month: (deposits, transfers in, transfers out, rows) (O(months))."""
+        with self._lock:
+            self.sync()
+            return self.rollups.months(owner)
+
+    def checkpoint(self) -> None:
+        """Save a balance checkpoint (and the monthly totals) at the current end of the ledger."""
+        with self._lock:
+            self.sync()
+            self.balances.checkpoint()
+            self.rollups.save()
+
+    def checkpoint_tail(self, owner: str) -> tuple[float, list[dict[str, str]]]:
+        """Return the owner's delta at the latest checkpoint and the owner's rows written after it."""
+        with self._lock:
+            self.sync()
+            offsets = self.owners.offsets.get(owner, [])
+            start = bisect.bisect_left(offsets, self.balances.checkpoint_position)
+            delta = self.balances.checkpoint_deltas.get(owner, 0.0)
+            tail = offsets[start:]
+        return delta, self.read_rows_at(tail)
+
+
+# One Ledger per path, shared by all the callers in the process
+_ledgers: dict[str, Ledger] = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_ledger(path: str) -> Ledger:
+    """Return the shared Ledger for the given path."""
+    key = str(Path(path))
+    with _ledgers_lock:
+        if key not in _ledgers:
+            _ledgers[key] = Ledger(key)
+        return _ledgers[key]
@@ -0,0 +1,73 @@
+"""
+Per-account locks for the operations that read a balance and then write to the ledger.
+
+Each account has its own lock, so operations on different accounts run in
+parallel while two operations on the same account are serialized. Operations
+that touch several accounts (transfers) take their locks in a fixed order
+(sorted usernames), so two opposite transfers can never wait for each other.
+
+This module contains the following:
+- AccountLockManager
+- account_locks
+"""
+
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+
+class AccountLockManager:
+    """
+    Lock manager keyed by account (username).
+    Locks are created on demand and dropped when nobody holds or waits for
+    them, so memory only grows with the number of accounts in use.
+    """
+
+    def __init__(self):
+        # username -> [lock, number of threads holding or waiting for it]
+        self._locks: dict[str, list] = {}
+        self._guard = threading.Lock()
+
+    def _checkout(self, account: str) -> threading.Lock:
+        with self._guard:
+            entry = self._locks.setdefault(account, [threading.Lock(), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _checkin(self, account: str) -> None:
+        with self._guard:
+            entry = self._locks[account]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[account]
+
+    @contextmanager
+    def hold(self, *accounts: str) -> Iterator[None]:
+        """Hold the locks of the given accounts for the duration of the block.
+
+        Args:
+            accounts: Usernames of the accounts (repeated names are locked once).
+        """
+        # Fixed acquisition order to avoid deadlocks between the parties of a transfer
+        names = sorted(set(accounts))
+        acquired = []
+
+        try:
+            for name in names:
+                lock = self._checkout(name)
+                lock.acquire()
+                acquired.append((name, lock))
+            yield
+        finally:
+            for name, lock in reversed(acquired):
+                lock.release()
+                self._checkin(name)
+
+    def active(self) -> int:
+        """Number of accounts whose lock is currently held or awaited."""
+        with self._guard:
+            return len(self._locks)
+
+
+# Shared by all the wallet operations of the process
+account_locks = AccountLockManager()
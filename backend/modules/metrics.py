@@ -0,0 +1,277 @@
+"""
+In-process metrics of the backend, exposed in the Prometheus text format.
+
+Counters, gauges and histograms keep their values per thread: every thread only
+updates its own shard (a plain dict), so recording a value takes no lock and never
+waits for another thread or for a scrape. render() adds up the shards of every
+thread. A lock is only taken the first time a thread touches a metric (to register
+its shard) and to list the shards when rendering.
+Values are per process: with several worker processes, each one has its own.
+
+This module contains the following:
+- Counter
+- Gauge
+- Histogram
+- Registry
+- REGISTRY
+- record_read
+- record_write
+- MetricsMiddleware
+"""
+
+import bisect
+import math
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Upper bounds (seconds) of the latency buckets, like the Prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds (seconds) of the bcrypt buckets (a check takes tens to hundreds of ms)
+BCRYPT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5)
+# HTTP methods used as label values (any other method is counted as "OTHER")
+HTTP_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+Sample = tuple[str, tuple[tuple[str, str], ...], float]
+
+
+class _Metric:
+    """Values of one metric, by label values, kept in one shard per thread."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: list[dict[tuple[str, ...], Any]] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict[tuple[str, ...], Any]:
+        """Return the shard of the current thread (registered the first time)."""
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append(values)
+            return values
+
+    def _snapshot(self) -> list[dict[tuple[str, ...], Any]]:
+        """Copy the shards of every thread (each copy is atomic under the GIL)."""
+        with self._lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]
+
+    def _labels(self, values: tuple[str, ...], extra: tuple[tuple[str, str], ...] = ()):
+        return tuple(zip(self.labelnames, values, strict=True)) + extra
+
+    def samples(self) -> Iterator[Sample]:
+        """Yield (sample name, labels, value) for every series of the metric."""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Value that only goes up (requests served, bytes read...)."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, labels: tuple[str, ...] = ()) -> None:
+        """Add an amount to the series of the label values."""
+        values = self._shard()
+        values[labels] = values.get(labels, 0) + amount
+
+    def value(self, labels: tuple[str, ...] = ()) -> float:
+        """Return the current value of a series (the sum of every thread)."""
+        return sum(shard.get(labels, 0) for shard in self._snapshot())
+
+    def samples(self) -> Iterator[Sample]:
+        totals: dict[tuple[str, ...], float] = {}
+        for shard in self._snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        for labels, value in sorted(totals.items()):
+            yield self.name, self._labels(labels), value
+
+
+class Gauge(Counter):
+    """Value that goes up and down (requests in flight...)."""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, labels: tuple[str, ...] = ()) -> None:
+        """Subtract an amount from the series of the label values."""
+        self.inc(-amount, labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (latencies) over fixed buckets, with their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: tuple[str, ...] = ()) -> None:
+        """Record one value in the series of the label values."""
+        values = self._shard()
+        counts = values.get(labels)
+        if counts is None:
+            # Observations per bucket (the last one is +Inf), then the sum of the values
+            counts = values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def count(self, labels: tuple[str, ...] = ()) -> int:
+        """Return the number of values observed in a series."""
+        return sum(sum(shard[labels][:-1]) for shard in self._snapshot() if labels in shard)
+
+    def samples(self) -> Iterator[Sample]:
+        totals: dict[tuple[str, ...], list[float]] = {}
+        for shard in self._snapshot():
+            for labels, counts in shard.items():
+                merged = totals.setdefault(labels, [0] * len(counts))
+                for position, count in enumerate(list(counts)):
+                    merged[position] += count
+
+        for labels, counts in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts, strict=False):
+                cumulative += count
+                yield f"{self.name}_bucket", self._labels(labels, (("le", _format_value(bound)),)), cumulative
+            yield f"{self.name}_sum", self._labels(labels), counts[-1]
+            yield f"{self.name}_count", self._labels(labels), cumulative
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(value)
+
+
+class Registry:
+    """Set of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> Any:
+        """Add a metric and return it.
+
+        Raises:
+            ValueError: If a metric with the same name is already registered.
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                text = ",".join(f'{label}="{_escape(str(content))}"' for label, content in labels)
+                lines.append(
+                    f"{name}{{{text}}} {_format_value(value)}" if text else f"{name} {_format_value(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+# Metrics of the backend
+REGISTRY = Registry()
+
+HTTP_REQUESTS: Counter = REGISTRY.register(
+    Counter("proggy_http_requests_total", "HTTP requests served.", ("method", "route", "status"))
+)
+HTTP_REQUEST_DURATION: Histogram = REGISTRY.register(
+    Histogram("proggy_http_request_duration_seconds", "Latency of the HTTP requests.", ("method", "route"))
+)
+HTTP_IN_FLIGHT: Gauge = REGISTRY.register(
+    Gauge("proggy_http_requests_in_flight", "HTTP requests being served.", ("method",))
+)
+STORAGE_READ_BYTES: Counter = REGISTRY.register(
+    Counter("proggy_storage_read_bytes_total", "Bytes read from the CSV files.", ("source",))
+)
+STORAGE_READ_ROWS: Counter = REGISTRY.register(
+    Counter("proggy_storage_read_rows_total", "Rows read from the CSV files.", ("source",))
+)
+STORAGE_WRITTEN_BYTES: Counter = REGISTRY.register(
+    Counter("proggy_storage_written_bytes_total", "Bytes written to the CSV files.", ("source",))
+)
+STORAGE_WRITTEN_ROWS: Counter = REGISTRY.register(
+    Counter("proggy_storage_written_rows_total", "Rows written to the CSV files.", ("source",))
+)
+BCRYPT_VERIFY_SECONDS: Histogram = REGISTRY.register(
+    Histogram("proggy_bcrypt_verify_seconds", "Time of the bcrypt password checks.", buckets=BCRYPT_BUCKETS)
+)
+USER_RELOADS: Counter = REGISTRY.register(
+    Counter("proggy_user_reloads_total", "Loads of the users from the user repository.")
+)
+
+
+def record_read(source: str, rows: int, size: int) -> None:
+    """Count the rows and bytes read from a CSV file (source: function or component that read them)."""
+    STORAGE_READ_ROWS.inc(rows, (source,))
+    STORAGE_READ_BYTES.inc(size, (source,))
+
+
+def record_write(source: str, rows: int, size: int) -> None:
+    """Count the rows and bytes written to a CSV file (source: function or component that wrote them)."""
+    STORAGE_WRITTEN_ROWS.inc(rows, (source,))
+    STORAGE_WRITTEN_BYTES.inc(size, (source,))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency, status and in-flight count of the HTTP requests.
+    Requests are labelled with their route template (e.g. /wallet/status/{username}),
+    so the number of series stays bounded; requests that matched no route are
+    labelled "unmatched".
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in HTTP_METHODS else "OTHER"
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(1, (method,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec(1, (method,))
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_DURATION.observe(elapsed, (method, route))
+            HTTP_REQUESTS.inc(1, (method, route, str(status)))
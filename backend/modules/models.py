@@ -8,6 +8,7 @@ This module contains the following models:
 - TransactionBase
 - TransactionCreate
 - Transaction
+- TransactionBatch (TypeAdapter that validates a list of transactions at once)
 It prevenst data corruption and ensures that the data is consistent and valid.
 """
 
@@ -15,7 +16,7 @@ It prevenst data corruption and ensures that the data is consistent and valid.
 from datetime import datetime
 from typing import Literal
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter
 
 
 class UserBase(BaseModel):
@@ -59,3 +60,7 @@ class Transaction(TransactionCreate):
     model_config = {
         "extra": "forbid"  # Forbidden extra fields
     }
+
+
+# Validates a whole list of transactions in one call (bulk inserts)
+TransactionBatch = TypeAdapter(list[Transaction])
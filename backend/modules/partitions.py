@@ -0,0 +1,363 @@
+"""
+Time-partitioned CSV ledger: one append-only ledger file per period (e.g. per month).
+
+The partitions live in a directory next to the ledger file (transactions.csv ->
+transactions/), listed in order by a manifest.json. Only the newest partition
+(the active one) receives rows. When a row belongs to a later period, a new
+partition is opened and the previous one is sealed: it never changes again, so
+the manifest keeps its date range and the delta and row count of every owner
+for good. Balances and counts of sealed partitions are read from the manifest,
+and history queries skip the sealed partitions without the owner or outside the
+requested dates: a query over the last days only reads the newest partitions.
+
+Rows dated in an older period (late rows) go to the active partition, whose date
+range is only known once it's sealed. An existing single-file ledger is adopted
+as the first partition (it is not copied).
+
+This module contains the following:
+- PERIODS
+- Partition
+- PartitionedLedger
+- get_partitioned_ledger
+"""
+
+import json
+import os
+import threading
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from backend.modules import ledger, utils
+
+# Partition periods, by the length of the date prefix that names a partition
+PERIODS = {"year": 4, "month": 7, "day": 10}
+
+# Positions of a partitioned ledger: partition number * POSITION_SPAN + byte offset in its file
+POSITION_SPAN = 1 << 40
+
+
+class Partition:
+    """One partition of the ledger, as listed in the manifest."""
+
+    def __init__(
+        self,
+        name: str,
+        file: str,
+        sealed: bool = False,
+        start: str | None = None,
+        end: str | None = None,
+        owners: dict[str, list] | None = None,
+    ):
+        # Period of the partition (e.g. "2026-01") and path of its ledger file (relative to the manifest)
+        self.name = name
+        self.file = file
+        self.sealed = sealed
+        # Only known for sealed partitions: first and last row dates, [delta, row count] of every owner
+        self.start = start
+        self.end = end
+        self.owners = owners or {}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Partition":
+        return cls(
+            data["name"],
+            data["file"],
+            data.get("sealed", False),
+            data.get("start"),
+            data.get("end"),
+            data.get("owners"),
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "file": self.file,
+            "sealed": self.sealed,
+            "start": self.start,
+            "end": self.end,
+            "owners": self.owners,
+        }
+
+    def may_contain(
+        self, owner: str | None = None, start: datetime | None = None, end: datetime | None = None
+    ) -> bool:
+        """Tell whether the partition can hold rows of the owner dated in [start, end).
+        Only sealed partitions are pruned: the active one can always match.
+        """
+        if not self.sealed:
+            return True
+        if not self.owners or (owner is not None and owner not in self.owners):
+            return False
+        if start is not None and self.end is not None and datetime.fromisoformat(self.end) < start:
+            return False
+        if end is not None and self.start is not None and datetime.fromisoformat(self.start) >= end:
+            return False
+        return True
+
+
+class PartitionedLedger:
+    """
+    The partitions of a ledger, with the same operations as a single Ledger.
+    Each partition file is a ledger.Ledger (with its own indexes and checkpoints);
+    this class routes the appends and combines the results of the partitions.
+    """
+
+    def __init__(self, path: str, period: str):
+        if period not in PERIODS:
+            raise ValueError(f"Unknown ledger partition period: {period}")
+        # The single-file ledger (adopted as the first partition if it exists)
+        self.path = Path(path)
+        self.directory = self.path.with_suffix("")
+        self.manifest_path = self.directory / "manifest.json"
+        self.period = period
+        self.partitions: list[Partition] = []
+        # (mtime, size) of the manifest when it was last read, to see changes made by other processes
+        self._stat: tuple[int, int] | None = None
+        # Appends in flight on the active partition; sealing waits for them to finish
+        self._writers = 0
+        self._lock = threading.Condition()
+
+    def _period_of(self, date: Any) -> str:
+        return str(date or "")[: PERIODS[self.period]]
+
+    def _manifest_stat(self) -> tuple[int, int] | None:
+        try:
+            stat = self.manifest_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _save_manifest(self) -> None:
+        """Write the manifest (lock must be held); a crash never leaves half a manifest."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        saved = {"period": self.period, "partitions": [partition.as_dict() for partition in self.partitions]}
+        temporary = self.manifest_path.with_suffix(".tmp")
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(saved, file)
+        os.replace(temporary, self.manifest_path)
+        self._stat = self._manifest_stat()
+
+    def _refresh(self) -> None:
+        """Reload the manifest if it changed, or create it on first use (lock must be held)."""
+        stat = self._manifest_stat()
+        if stat is not None:
+            if stat != self._stat:
+                with open(self.manifest_path, encoding="utf-8") as file:
+                    saved = json.load(file)
+                self.partitions = [Partition.from_dict(data) for data in saved["partitions"]]
+                self._stat = stat
+            return
+
+        self.partitions = []
+        if self.path.exists():
+            # Adopt the single-file ledger: it stays the active partition until the period changes
+            last = None
+            for record in utils.scan_csv_file(str(self.path)):
+                last = record.date or last
+            file = os.path.relpath(self.path, self.directory)
+            self.partitions.append(Partition(self._period_of(last), file))
+            self._save_manifest()
+
+    def ledger_of(self, partition: Partition) -> ledger.Ledger:
+        """Return the Ledger of a partition file."""
+        return ledger.get_ledger(os.path.normpath(self.directory / partition.file))
+
+    def _seal(self, partition: Partition) -> None:
+        """Record the final date range and owner totals of a partition and mark it immutable."""
+        book = self.ledger_of(partition)
+        # Save the indexes of the partition once: they never change again
+        book.checkpoint()
+        partition.owners = {
+            owner: [book.balances.delta(owner), len(offsets)]
+            for owner, offsets in book.owners.offsets.items()
+        }
+
+        dates = []
+        try:
+            dates = [record.date for record in utils.scan_csv_file(str(book.path)) if record.date is not None]
+        except FileNotFoundError:
+            pass
+        partition.start = str(min(dates)) if dates else None
+        partition.end = str(max(dates)) if dates else None
+        partition.sealed = True
+
+    def snapshot(self) -> list[Partition]:
+        """Return the current partitions, oldest first (the last one is the active partition)."""
+        with self._lock:
+            self._refresh()
+            return list(self.partitions)
+
+    def append(self, rows: list[dict[str, Any]]) -> None:
+        """Append rows (all to the same partition, in a single write) and apply them to its indexes.
+        If a row belongs to a period after the active partition, a new partition is opened first.
+        """
+        if not rows:
+            return
+
+        latest = max(self._period_of(row.get("date")) for row in rows)
+        with self._lock:
+            self._refresh()
+            while not self.partitions or latest > self.partitions[-1].name:
+                if self._writers:
+                    # Let the appends in flight on the active partition finish before sealing it
+                    self._lock.wait()
+                    self._refresh()
+                    continue
+                if self.partitions:
+                    self._seal(self.partitions[-1])
+                self.partitions.append(Partition(latest, f"{latest}.csv"))
+                self._save_manifest()
+
+            target = self.partitions[-1]
+            self._writers += 1
+
+        try:
+            self.ledger_of(target).append(rows)
+        finally:
+            with self._lock:
+                self._writers -= 1
+                self._lock.notify_all()
+
+    def balance_delta(self, owner: str) -> float:
+        """Return the owner's net amount: sealed partitions from the manifest, plus the active partition."""
+        partitions = self.snapshot()
+        if not partitions:
+            return 0.0
+        sealed = sum(partition.owners.get(owner, (0.0, 0))[0] for partition in partitions[:-1])
+        return sealed + self.ledger_of(partitions[-1]).balance_delta(owner)
+
+    def count(self, owner: str) -> int:
+        """Return the number of rows of an owner in every partition."""
+        partitions = self.snapshot()
+        if not partitions:
+            return 0
+        sealed = sum(partition.owners.get(owner, (0.0, 0))[1] for partition in partitions[:-1])
+        return sealed + self.ledger_of(partitions[-1]).owner_count(owner)
+
+    def owner_rows(
+        self,
+        owner: str,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        types: Iterable[str] | None = None,
+    ) -> list[dict[str, str]]:
+        """Return the rows of an owner dated in [start, end) and of the given types, in ledger order.
+        Only the partitions that may hold such rows are read.
+        """
+        rows = []
+        for partition in self.snapshot():
+            if partition.may_contain(owner, start, end):
+                rows.extend(self.ledger_of(partition).owner_rows(owner, start, end, types))
+        return rows
+
+    def owner_page(
+        self,
+        owner: str,
+        last: int | None,
+        limit: int | None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        types: Iterable[str] | None = None,
+        ascending: bool = False,
+    ) -> list[tuple[int, dict[str, str]]]:
+        """Return up to limit (position, row) pairs of an owner across partitions, newest first
+        (oldest first when ascending), with the same filters as owner_rows.
+        """
+        partitions = self.snapshot()
+        if last is None:
+            number, offset = (0 if ascending else len(partitions) - 1), None
+        else:
+            number, offset = divmod(last, POSITION_SPAN)
+        step = 1 if ascending else -1
+        entries: list[tuple[int, dict[str, str]]] = []
+
+        while 0 <= number < len(partitions) and (limit is None or len(entries) < limit):
+            if partitions[number].may_contain(owner, start, end):
+                book = self.ledger_of(partitions[number])
+                remaining = None if limit is None else limit - len(entries)
+                offsets = book.owner_page(owner, offset, remaining, start, end, types, ascending)
+                positions = [number * POSITION_SPAN + found for found in offsets]
+                entries.extend(zip(positions, book.read_rows_at(offsets), strict=True))
+            # The next partitions are read from their first row (in page order)
+            number, offset = number + step, None
+
+        return entries
+
+    def scan(self) -> Iterator[dict[str, str]]:
+        """Iterate over every row of every partition, in ledger order."""
+        for partition in self.snapshot():
+            for _, row in self.ledger_of(partition).scan():
+                yield row
+
+    def scan_records(
+        self, owners: Iterable[str] | None = None, types: Iterable[str] | None = None
+    ) -> Iterator[utils.LedgerRow]:
+        """Iterate over the typed rows, skipping the sealed partitions without any of the owners."""
+        owner_filter = None if owners is None else set(owners)
+        for partition in self.snapshot():
+            if partition.sealed and owner_filter is not None and owner_filter.isdisjoint(partition.owners):
+                continue
+            try:
+                yield from utils.scan_csv_file(str(self.ledger_of(partition).path), owner_filter, types)
+            except FileNotFoundError:
+                continue
+
+    def monthly_totals(self, owner: str) -> dict[str, tuple[float, float, float, int]]:
+        """Return the owner's monthly totals, merged from the partitions where the owner has rows."""
+        merged: dict[str, list] = {}
+        for partition in self.snapshot():
+            if not partition.may_contain(owner):
+                continue
+            for month, totals in self.ledger_of(partition).monthly_totals(owner).items():
+                entry = merged.setdefault(month, [0.0, 0.0, 0.0, 0])
+                for column, value in enumerate(totals):
+                    entry[column] += value
+        return {month: tuple(totals) for month, totals in merged.items()}
+
+    def checkpoint(self) -> None:
+        """Save a balance checkpoint of the active partition (sealed ones are kept in the manifest)."""
+        partitions = self.snapshot()
+        if partitions:
+            self.ledger_of(partitions[-1]).checkpoint()
+
+    def checkpoint_tail(self, owner: str) -> tuple[float, list[dict[str, str]]]:
+        """Return the owner's delta at the latest checkpoint of the active partition and the rows after it."""
+        partitions = self.snapshot()
+        if not partitions:
+            return 0.0, []
+        sealed = sum(partition.owners.get(owner, (0.0, 0))[0] for partition in partitions[:-1])
+        delta, tail = self.ledger_of(partitions[-1]).checkpoint_tail(owner)
+        return sealed + delta, tail
+
+    def load(self) -> None:
+        """Read the manifest and bring the indexes of the active partition up to date."""
+        partitions = self.snapshot()
+        if partitions:
+            self.ledger_of(partitions[-1]).sync()
+
+    def rebuild(self) -> None:
+        """Rebuild the indexes of every partition and the manifest entries of the sealed ones."""
+        with self._lock:
+            self._refresh()
+            for partition in self.partitions:
+                self.ledger_of(partition).rebuild()
+                if partition.sealed:
+                    self._seal(partition)
+            if self.partitions:
+                self._save_manifest()
+
+
+# One PartitionedLedger per path and period, shared by all the callers in the process
+_partitioned: dict[tuple[str, str], PartitionedLedger] = {}
+_partitioned_lock = threading.Lock()
+
+
+def get_partitioned_ledger(path: str, period: str) -> PartitionedLedger:
+    """Return the shared PartitionedLedger of a ledger path."""
+    key = (os.path.abspath(path), period)
+    with _partitioned_lock:
+        if key not in _partitioned:
+            _partitioned[key] = PartitionedLedger(path, period)
+        return _partitioned[key]
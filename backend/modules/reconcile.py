@@ -0,0 +1,158 @@
+"""
+Reconciliation of the ledger: checks the stored rows against a replay.
+
+The ledger is streamed once, in order, keeping only:
+- the running (replayed) balance of every owner, from the opening balances,
+- the transfer rows still waiting for their other half, within a window of rows.
+So memory depends on the number of users and on the window, not on the ledger size.
+
+Issues reported:
+- balance_mismatch: the stored `balance` of a row disagrees with the replayed balance.
+- unmatched_transfer: a transfer_out without its transfer_in (or the other way around).
+- unknown_owner: rows of an owner that is not a known user (reported once per owner).
+- invalid_row: a row whose amount or balance is not a number.
+
+This module contains the following:
+- ReconciliationReport
+- reconcile
+"""
+
+import math
+import time
+from collections import deque
+from collections.abc import Iterable
+from typing import Any
+
+ISSUE_KINDS = ["balance_mismatch", "unmatched_transfer", "unknown_owner", "invalid_row"]
+
+# The other half of each transfer row
+_COUNTERPART = {"transfer_out": "transfer_in", "transfer_in": "transfer_out"}
+
+
+class ReconciliationReport:
+    """Result of a reconciliation: counts, throughput and the first issues found."""
+
+    def __init__(self, max_issues: int):
+        self.max_issues = max_issues
+        self.rows = 0
+        self.owners = 0
+        self.elapsed = 0.0
+        self.issue_counts = {kind: 0 for kind in ISSUE_KINDS}
+        # Only the first max_issues issues are kept (the counts include all of them)
+        self.issues: list[dict[str, Any]] = []
+
+    def add_issue(self, kind: str, row_number: int, owner: str, detail: str) -> None:
+        self.issue_counts[kind] += 1
+        if len(self.issues) < self.max_issues:
+            self.issues.append({"kind": kind, "row": row_number, "owner": owner, "detail": detail})
+
+    @property
+    def ok(self) -> bool:
+        return not any(self.issue_counts.values())
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "ok": self.ok,
+            "rows": self.rows,
+            "owners": self.owners,
+            "elapsed_seconds": round(self.elapsed, 6),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "issue_counts": dict(self.issue_counts),
+            "issues": list(self.issues),
+        }
+
+
+def reconcile(
+    rows: Iterable[dict[str, Any]],
+    initial_balances: dict[str, float],
+    match_window: int = 10000,
+    max_issues: int = 100,
+) -> ReconciliationReport:
+    """Stream the ledger once and check its stored balances and transfer pairs.
+
+    Args:
+        rows: Ledger rows in ledger order (e.g. LedgerRepository.scan()).
+        initial_balances: Opening balance of every user, by username.
+        match_window: Rows within which the two halves of a transfer must be found
+            (both halves are written together, so they are normally adjacent).
+        max_issues: Maximum number of issues kept in the report.
+
+    Returns:
+        The reconciliation report. Row numbers start at 1 (first row after the header).
+    """
+    report = ReconciliationReport(max_issues)
+    balances: dict[str, float] = {}
+    unknown_owners: set[str] = set()
+    # (date, from_user, to_user, amount) -> rows of the transfers waiting for their other half
+    pending: dict[tuple, deque] = {}
+    # (row number, key) of the pending rows, oldest first, to expire them out of the window
+    expiry: deque = deque()
+    started = time.perf_counter()
+
+    def expire(before: int) -> None:
+        while expiry and expiry[0][0] < before:
+            row_number, key = expiry.popleft()
+            waiting = pending.get(key)
+            # Rows of a key are matched oldest first: if it's still the oldest, it's unmatched
+            if waiting and waiting[0][0] == row_number:
+                _, trans_type, owner = waiting.popleft()
+                if not waiting:
+                    del pending[key]
+                detail = f"{trans_type} without {_COUNTERPART[trans_type]}"
+                report.add_issue("unmatched_transfer", row_number, owner, detail)
+
+    for row_number, row in enumerate(rows, start=1):
+        report.rows = row_number
+        owner = row.get("owner", "")
+        trans_type = row.get("type", "")
+
+        try:
+            amount = float(row.get("amount", 0))
+        except (TypeError, ValueError):
+            report.add_issue("invalid_row", row_number, owner, f"amount={row.get('amount')!r}")
+            continue
+
+        if owner not in initial_balances and owner not in unknown_owners:
+            unknown_owners.add(owner)
+            report.add_issue("unknown_owner", row_number, owner, "owner is not a known user")
+
+        # Running balance (same rules as wallet.calculate_balance)
+        balance = balances.get(owner, initial_balances.get(owner, 0.0))
+        if trans_type in ["deposit", "transfer_in"]:
+            balance += amount
+        elif trans_type == "transfer_out":
+            balance -= amount
+        balances[owner] = balance
+
+        stored = row.get("balance")
+        if stored not in (None, ""):
+            try:
+                if not math.isclose(float(stored), balance, abs_tol=1e-6):
+                    detail = f"stored={stored} replayed={balance}"
+                    report.add_issue("balance_mismatch", row_number, owner, detail)
+            except (TypeError, ValueError):
+                report.add_issue("invalid_row", row_number, owner, f"balance={stored!r}")
+
+        if trans_type in _COUNTERPART:
+            key = (row.get("date"), row.get("from_user"), row.get("to_user"), amount)
+            waiting = pending.get(key)
+            if waiting and waiting[0][1] == _COUNTERPART[trans_type]:
+                waiting.popleft()
+                if not waiting:
+                    del pending[key]
+            else:
+                pending.setdefault(key, deque()).append((row_number, trans_type, owner))
+                expiry.append((row_number, key))
+
+        expire(row_number - match_window + 1)
+
+    # Whatever is still waiting at the end of the ledger has no other half
+    expire(report.rows + 1)
+
+    report.owners = len(balances)
+    report.elapsed = time.perf_counter() - started
+    return report
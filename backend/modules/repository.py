@@ -0,0 +1,761 @@
+"""
+Storage repositories: the only place that knows where users and transactions live.
+
+The services work with two interfaces, and every storage backend implements both:
+- csv: transactions in the append-only CSV ledger (ledger.py), users in the JSON file.
+  With config.LEDGER_PARTITION the ledger is split in time partitions (partitions.py).
+- sqlite: users and transactions in an embedded SQLite database (WAL mode,
+  indexed by owner and by username, parameterized statements).
+The backend is selected with config.STORAGE_BACKEND.
+
+Rows are returned as dictionaries of strings (as read from the CSV file), so
+both backends are interchangeable for the callers.
+
+This module contains the following:
+- LedgerRepository
+- UserRepository
+- CsvLedgerRepository
+- PartitionedCsvLedgerRepository
+- JsonUserRepository
+- SqliteDatabase
+- SqliteLedgerRepository
+- SqliteUserRepository
+- get_database
+- get_ledger_repository
+- get_user_repository
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Hashable, Iterable, Iterator
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from backend.modules import config, ledger, partitions, tracing, utils
+
+STORAGE_BACKENDS = ("csv", "sqlite")
+
+# Columns of a user record (same keys as the entries of the JSON users file)
+USER_COLUMNS = ["id", "username", "email", "full_name", "password", "balance"]
+
+
+class LedgerRepository(ABC):
+    """Append-only store of transaction rows, with per-owner lookups."""
+
+    @abstractmethod
+    def append(self, rows: list[dict[str, Any]]) -> None:
+        """Persist the rows at the end of the ledger, all or none of them."""
+
+    @abstractmethod
+    def balance_delta(self, owner: str) -> float:
+        """Return the net amount the ledger adds to the owner's opening balance."""
+
+    @abstractmethod
+    def count(self, owner: str) -> int:
+        """Return the number of rows of an owner."""
+
+    @abstractmethod
+    def owner_rows(
+        self,
+        owner: str,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        types: Iterable[str] | None = None,
+    ) -> list[dict[str, str]]:
+        """Return the rows of an owner, in ledger order, filtered on the indexes (never after loading).
+
+        Args:
+            owner: Owner of the rows.
+            start: Only rows dated at or after this date (None for no lower bound).
+            end: Only rows dated before this date (None for no upper bound).
+            types: Only rows of these transaction types (None for every type).
+        """
+
+    @abstractmethod
+    def owner_page(
+        self,
+        owner: str,
+        last: int | None,
+        limit: int | None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        types: Iterable[str] | None = None,
+        ascending: bool = False,
+    ) -> list[tuple[int, dict[str, str]]]:
+        """Return up to limit (position, row) pairs of an owner, newest first (or oldest first).
+
+        Args:
+            owner: Owner of the rows.
+            last: Position of the last row of the previous page: only rows older than it
+                (newer when ascending). None for the first page.
+            limit: Maximum number of rows (None for all of them).
+            start, end, types: Same filters as owner_rows.
+            ascending: Oldest first instead of newest first.
+        """
+
+    @abstractmethod
+    def scan(self) -> Iterator[dict[str, str]]:
+        """Iterate over every row of the ledger, in ledger order."""
+
+    @abstractmethod
+    def scan_records(
+        self, owners: Iterable[str] | None = None, types: Iterable[str] | None = None
+    ) -> Iterator[utils.LedgerRow]:
+        """Iterate over the rows as typed records, in ledger order, filtered by owner and type.
+
+        Args:
+            owners: Only the rows of these owners (None for every owner).
+            types: Only the rows of these transaction types (None for every type).
+        """
+
+    @abstractmethod
+    def monthly_totals(self, owner: str) -> dict[str, tuple[float, float, float, int]]:
+        """Return the owner's rollups by month ("YYYY-MM"): (deposits, transfers in, transfers out, rows).
+        They are maintained on every append, so this costs O(months), not O(rows).
+        """
+
+    @abstractmethod
+    def checkpoint(self) -> None:
+        """Save a balance checkpoint (delta of every owner) at the current end of the ledger."""
+
+    @abstractmethod
+    def checkpoint_tail(self, owner: str) -> tuple[float, list[dict[str, str]]]:
+        """Return the owner's delta at the latest checkpoint and the owner's rows written after it."""
+
+    def load(self) -> None:
+        """Prepare the derived indexes (called once at startup)."""
+
+    def rebuild(self) -> None:
+        """Rebuild the derived indexes from the stored rows."""
+
+
+class UserRepository(ABC):
+    """Store of the user records (raw dictionaries, validated by the caller)."""
+
+    @abstractmethod
+    def load_users(self) -> list[dict[str, Any]]:
+        """Return every user record."""
+
+    @abstractmethod
+    def version(self) -> Hashable:
+        """Return a value that changes whenever the users change."""
+
+
+class CsvLedgerRepository(LedgerRepository):
+    """Ledger stored in the append-only CSV journal. Positions are byte offsets."""
+
+    def __init__(self, path: str):
+        self.ledger = ledger.get_ledger(path)
+
+    def append(self, rows: list[dict[str, Any]]) -> None:
+        self.ledger.append(rows)
+
+    def balance_delta(self, owner: str) -> float:
+        return self.ledger.balance_delta(owner)
+
+    def count(self, owner: str) -> int:
+        return self.ledger.owner_count(owner)
+
+    def owner_rows(
+        self,
+        owner: str,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        types: Iterable[str] | None = None,
+    ) -> list[dict[str, str]]:
+        return self.ledger.owner_rows(owner, start, end, types)
+
+    def owner_page(
+        self,
+        owner: str,
+        last: int | None,
+        limit: int | None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        types: Iterable[str] | None = None,
+        ascending: bool = False,
+    ) -> list[tuple[int, dict[str, str]]]:
+        offsets = self.ledger.owner_page(owner, last, limit, start, end, types, ascending)
+        return list(zip(offsets, self.ledger.read_rows_at(offsets), strict=True))
+
+    def scan(self) -> Iterator[dict[str, str]]:
+        try:
+            for _, row in self.ledger.scan():
+                yield row
+        except FileNotFoundError:
+            return
+
+    def scan_records(
+        self, owners: Iterable[str] | None = None, types: Iterable[str] | None = None
+    ) -> Iterator[utils.LedgerRow]:
+        try:
+            yield from utils.scan_csv_file(str(self.ledger.path), owners, types)
+        except FileNotFoundError:
+            return
+
+    def monthly_totals(self, owner: str) -> dict[str, tuple[float, float, float, int]]:
+        return self.ledger.monthly_totals(owner)
+
+    def checkpoint(self) -> None:
+        self.ledger.checkpoint()
+
+    def checkpoint_tail(self, owner: str) -> tuple[float, list[dict[str, str]]]:
+        return self.ledger.checkpoint_tail(owner)
+
+    def load(self) -> None:
+        self.ledger.sync()
+
+    def rebuild(self) -> None:
+        self.ledger.rebuild()
+
+
+class PartitionedCsvLedgerRepository(LedgerRepository):
+    """
+    Ledger stored in time partitions of the CSV journal (one file per period).
+    Positions are the partition number and the byte offset in its file.
+    """
+
+    def __init__(self, path: str, period: str):
+        self.ledger = partitions.get_partitioned_ledger(path, period)
+
+    def append(self, rows: list[dict[str, Any]]) -> None:
+        self.ledger.append(rows)
+
+    def balance_delta(self, owner: str) -> float:
+        return self.ledger.balance_delta(owner)
+
+    def count(self, owner: str) -> int:
+        return self.ledger.count(owner)
+
+    def owner_rows(
+        self,
+        owner: str,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        types: Iterable[str] | None = None,
+    ) -> list[dict[str, str]]:
+        return self.ledger.owner_rows(owner, start, end, types)
+
+    def owner_page(
+        self,
+        owner: str,
+        last: int | None,
+        limit: int | None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        types: Iterable[str] | None = None,
+        ascending: bool = False,
+    ) -> list[tuple[int, dict[str, str]]]:
+        return self.ledger.owner_page(owner, last, limit, start, end, types, ascending)
+
+    def scan(self) -> Iterator[dict[str, str]]:
+        return self.ledger.scan()
+
+    def scan_records(
+        self, owners: Iterable[str] | None = None, types: Iterable[str] | None = None
+    ) -> Iterator[utils.LedgerRow]:
+        return self.ledger.scan_records(owners, types)
+
+    def monthly_totals(self, owner: str) -> dict[str, tuple[float, float, float, int]]:
+        return self.ledger.monthly_totals(owner)
+
+    def checkpoint(self) -> None:
+        self.ledger.checkpoint()
+
+    def checkpoint_tail(self, owner: str) -> tuple[float, list[dict[str, str]]]:
+        return self.ledger.checkpoint_tail(owner)
+
+    def load(self) -> None:
+        self.ledger.load()
+
+    def rebuild(self) -> None:
+        self.ledger.rebuild()
+
+
+class JsonUserRepository(UserRepository):
+    """Users stored in the JSON file ({"users": [...]})."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load_users(self) -> list[dict[str, Any]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f).get("users", [])
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    def version(self) -> tuple[int, int]:
+        # (mtime, size) of the file, or (0, -1) if it doesn't exist
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return (0, -1)
+        return stat.st_mtime_ns, stat.st_size
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL,
+    full_name TEXT,
+    password TEXT NOT NULL,
+    balance REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    type TEXT NOT NULL,
+    from_user TEXT,
+    to_user TEXT,
+    amount REAL NOT NULL,
+    balance REAL,
+    description TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_owner_id ON transactions (owner, id);
+CREATE INDEX IF NOT EXISTS idx_transactions_owner_date ON transactions (owner, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_owner_type ON transactions (owner, type, id);
+CREATE TABLE IF NOT EXISTS balances (
+    owner TEXT PRIMARY KEY,
+    delta REAL NOT NULL,
+    row_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    owner TEXT NOT NULL,
+    month TEXT NOT NULL,
+    deposits REAL NOT NULL,
+    transfers_in REAL NOT NULL,
+    transfers_out REAL NOT NULL,
+    row_count INTEGER NOT NULL,
+    PRIMARY KEY (owner, month)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS checkpoints (owner TEXT PRIMARY KEY, delta REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('users_version', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('checkpoint_position', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('rollups_built', 0);
+CREATE TRIGGER IF NOT EXISTS users_inserted AFTER INSERT ON users
+BEGIN UPDATE meta SET value = value + 1 WHERE key = 'users_version'; END;
+CREATE TRIGGER IF NOT EXISTS users_updated AFTER UPDATE ON users
+BEGIN UPDATE meta SET value = value + 1 WHERE key = 'users_version'; END;
+CREATE TRIGGER IF NOT EXISTS users_deleted AFTER DELETE ON users
+BEGIN UPDATE meta SET value = value + 1 WHERE key = 'users_version'; END;
+"""
+
+# Statements are constant and parameterized, so sqlite3 prepares each one once
+# per connection and reuses it from its statement cache
+_INSERT_TRANSACTION = (
+    "INSERT INTO transactions (date, owner, type, from_user, to_user, amount, balance, description) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_UPSERT_BALANCE = (
+    "INSERT INTO balances (owner, delta, row_count) VALUES (?, ?, ?) "
+    "ON CONFLICT (owner) DO UPDATE SET "
+    "delta = delta + excluded.delta, row_count = row_count + excluded.row_count"
+)
+_UPSERT_ROLLUP = (
+    "INSERT INTO rollups (owner, month, deposits, transfers_in, transfers_out, row_count) "
+    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (owner, month) DO UPDATE SET "
+    "deposits = deposits + excluded.deposits, transfers_in = transfers_in + excluded.transfers_in, "
+    "transfers_out = transfers_out + excluded.transfers_out, row_count = row_count + excluded.row_count"
+)
+# Rollups of the whole transactions table (to rebuild them)
+_ROLLUPS_FROM_TRANSACTIONS = (
+    "INSERT INTO rollups (owner, month, deposits, transfers_in, transfers_out, row_count) "
+    "SELECT owner, substr(date, 1, 7), TOTAL(CASE type WHEN 'deposit' THEN amount END), "
+    "TOTAL(CASE type WHEN 'transfer_in' THEN amount END), "
+    "TOTAL(CASE type WHEN 'transfer_out' THEN amount END), COUNT(*) "
+    "FROM transactions GROUP BY owner, substr(date, 1, 7)"
+)
+# Net amount of a transaction for its owner (same rules as wallet.calculate_balance)
+_DELTA = (
+    "CASE type WHEN 'deposit' THEN amount WHEN 'transfer_in' THEN amount "
+    "WHEN 'transfer_out' THEN -amount ELSE 0 END"
+)
+_SELECT_TRANSACTION = (
+    "SELECT id, date, owner, type, from_user, to_user, amount, balance, description FROM transactions"
+)
+_SELECT_USERS = f"SELECT {', '.join(USER_COLUMNS)} FROM users ORDER BY id"
+_INSERT_USER = (
+    "INSERT OR IGNORE INTO users (username, email, full_name, password, balance) VALUES (?, ?, ?, ?, ?)"
+)
+
+
+class SqliteDatabase:
+    """
+    Embedded SQLite database file shared by the SQLite repositories.
+    Every thread gets its own connection; WAL mode lets readers run while a
+    transaction is being written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection().executescript(SQLITE_SCHEMA)
+        self._build_rollups()
+
+    def _build_rollups(self) -> None:
+        """Fill the rollups table of a database created before it existed (only once)."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT value FROM meta WHERE key = 'rollups_built'").fetchone()[0] == 0:
+                conn.execute("DELETE FROM rollups")
+                conn.execute(_ROLLUPS_FROM_TRANSACTIONS)
+                conn.execute("UPDATE meta SET value = 1 WHERE key = 'rollups_built'")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def connection(self) -> sqlite3.Connection:
+        """Return the connection of the current thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode: transactions are opened explicitly with BEGIN
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30.0, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={'FULL' if config.LEDGER_FSYNC else 'NORMAL'}")
+            self._local.conn = conn
+        return conn
+
+    def write(self, statements: list[tuple[str, list[tuple]]]) -> None:
+        """Run several (sql, parameter rows) statements in a single transaction."""
+        conn = self.connection()
+        # IMMEDIATE takes the write lock up front, so concurrent writers wait instead of failing
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, parameters in statements:
+                conn.executemany(sql, parameters)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def _row_dict(row: tuple) -> dict[str, str]:
+    """Convert a transactions row (without its id) to the CSV representation."""
+    return {column: "" if value is None else str(value) for column, value in zip(ledger.CSV_COLUMNS, row)}
+
+
+def _balance_deltas(rows: list[dict[str, Any]]) -> dict[str, list]:
+    """Net amount and number of rows of every owner in the rows (same rules as the balance index)."""
+    deltas: dict[str, list] = {}
+    for row in rows:
+        entry = deltas.setdefault(row["owner"], [0.0, 0])
+        amount = float(row.get("amount", 0))
+        if row.get("type") in ["deposit", "transfer_in"]:
+            entry[0] += amount
+        elif row.get("type") == "transfer_out":
+            entry[0] -= amount
+        entry[1] += 1
+    return deltas
+
+
+# Position of each type in the monthly totals
+_ROLLUP_COLUMNS = {"deposit": 0, "transfer_in": 1, "transfer_out": 2}
+
+
+def _monthly_totals(rows: list[dict[str, Any]]) -> dict[tuple[str, str], list]:
+    """Deposits, transfers in, transfers out and rows of every (owner, month) in the rows."""
+    totals: dict[tuple[str, str], list] = {}
+    for row in rows:
+        entry = totals.setdefault((row["owner"], str(row.get("date") or "")[:7]), [0.0, 0.0, 0.0, 0])
+        column = _ROLLUP_COLUMNS.get(row.get("type"))
+        if column is not None:
+            entry[column] += float(row.get("amount", 0))
+        entry[3] += 1
+    return totals
+
+
+class SqliteLedgerRepository(LedgerRepository):
+    """
+    Ledger stored in the transactions table. Positions are row ids.
+    The balances table holds the net amount and row count of every owner; it
+    is updated in the same transaction as the rows, so it's never out of date.
+    """
+
+    def __init__(self, database: SqliteDatabase):
+        self.database = database
+
+    def append(self, rows: list[dict[str, Any]]) -> None:
+        if not rows:
+            return
+        with tracing.span("sqlite.append"):
+            self._insert(rows)
+
+        if config.CHECKPOINT_INTERVAL:
+            conn = self.database.connection()
+            end = conn.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+            if end - self._checkpoint_position(conn) >= config.CHECKPOINT_INTERVAL:
+                self.checkpoint()
+
+    def _insert(self, rows: list[dict[str, Any]]) -> None:
+        values = []
+        for row in rows:
+            date = row.get("date")
+            values.append(
+                (
+                    "" if date is None else str(date),
+                    row["owner"],
+                    row["type"],
+                    row.get("from_user"),
+                    row.get("to_user"),
+                    row["amount"],
+                    row.get("balance"),
+                    row.get("description") or "",
+                )
+            )
+        balances = [(owner, delta, count) for owner, (delta, count) in _balance_deltas(rows).items()]
+        rollups = [(*key, *totals) for key, totals in _monthly_totals(rows).items()]
+
+        self.database.write(
+            [(_INSERT_TRANSACTION, values), (_UPSERT_BALANCE, balances), (_UPSERT_ROLLUP, rollups)]
+        )
+
+    def _balance_entry(self, owner: str) -> tuple[float, int]:
+        found = (
+            self.database.connection()
+            .execute("SELECT delta, row_count FROM balances WHERE owner = ?", (owner,))
+            .fetchone()
+        )
+        return found if found is not None else (0.0, 0)
+
+    def balance_delta(self, owner: str) -> float:
+        return self._balance_entry(owner)[0]
+
+    def count(self, owner: str) -> int:
+        return self._balance_entry(owner)[1]
+
+    @staticmethod
+    def _history_filters(
+        owner: str, start: datetime | None, end: datetime | None, types: Iterable[str] | None
+    ) -> tuple[str, list[Any]]:
+        """WHERE clause and parameters of a history query (served by the owner indexes)."""
+        # Dates are stored as ISO text, so the date bounds compare as strings
+        conditions, parameters = ["owner = ?"], [owner]
+        if start is not None:
+            conditions.append("date >= ?")
+            parameters.append(str(start))
+        if end is not None:
+            conditions.append("date < ?")
+            parameters.append(str(end))
+        if types is not None:
+            types = list(types)
+            conditions.append(f"type IN ({', '.join('?' * len(types))})")
+            parameters.extend(types)
+        return " AND ".join(conditions), parameters
+
+    def owner_rows(
+        self,
+        owner: str,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        types: Iterable[str] | None = None,
+    ) -> list[dict[str, str]]:
+        where, parameters = self._history_filters(owner, start, end, types)
+        cursor = self.database.connection().execute(
+            f"{_SELECT_TRANSACTION} WHERE {where} ORDER BY id", parameters
+        )
+        return [_row_dict(row[1:]) for row in cursor]
+
+    def owner_page(
+        self,
+        owner: str,
+        last: int | None,
+        limit: int | None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        types: Iterable[str] | None = None,
+        ascending: bool = False,
+    ) -> list[tuple[int, dict[str, str]]]:
+        where, parameters = self._history_filters(owner, start, end, types)
+        if last is not None:
+            where += " AND id > ?" if ascending else " AND id < ?"
+            parameters.append(last)
+        # LIMIT -1 means no limit
+        parameters.append(-1 if limit is None else limit)
+
+        order = "ASC" if ascending else "DESC"
+        cursor = self.database.connection().execute(
+            f"{_SELECT_TRANSACTION} WHERE {where} ORDER BY id {order} LIMIT ?", parameters
+        )
+        return [(row[0], _row_dict(row[1:])) for row in cursor]
+
+    def scan(self) -> Iterator[dict[str, str]]:
+        for row in self.database.connection().execute(f"{_SELECT_TRANSACTION} ORDER BY id"):
+            yield _row_dict(row[1:])
+
+    def scan_records(
+        self, owners: Iterable[str] | None = None, types: Iterable[str] | None = None
+    ) -> Iterator[utils.LedgerRow]:
+        # The few transaction types are pushed down to SQLite as a parameterized IN list. The owners
+        # may be every user (more than the SQL variable limit): they are checked on the raw rows
+        # with a set, before any value is parsed
+        owner_filter = None if owners is None else set(owners)
+        where, parameters = "", []
+        if types is not None:
+            parameters = list(types)
+            where = f" WHERE type IN ({', '.join('?' * len(parameters))})"
+
+        cursor = self.database.connection().execute(f"{_SELECT_TRANSACTION}{where} ORDER BY id", parameters)
+        for _, date, owner, trans_type, from_user, to_user, amount, balance, description in cursor:
+            if owner_filter is not None and owner not in owner_filter:
+                continue
+            yield utils.LedgerRow(
+                datetime.fromisoformat(date) if date else None,
+                owner,
+                trans_type,
+                from_user or "",
+                to_user or "",
+                float(amount),
+                float(balance) if balance not in (None, "") else None,
+                description or "",
+            )
+
+    def monthly_totals(self, owner: str) -> dict[str, tuple[float, float, float, int]]:
+        cursor = self.database.connection().execute(
+            "SELECT month, deposits, transfers_in, transfers_out, row_count FROM rollups WHERE owner = ?",
+            (owner,),
+        )
+        return {month: tuple(totals) for month, *totals in cursor}
+
+    def rebuild(self) -> None:
+        conn = self.database.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM balances")
+            conn.execute(
+                "INSERT INTO balances (owner, delta, row_count) "
+                f"SELECT owner, TOTAL({_DELTA}), COUNT(*) FROM transactions GROUP BY owner"
+            )
+            conn.execute("DELETE FROM rollups")
+            conn.execute(_ROLLUPS_FROM_TRANSACTIONS)
+            conn.execute("DELETE FROM checkpoints")
+            conn.execute("UPDATE meta SET value = 0 WHERE key = 'checkpoint_position'")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        self.checkpoint()
+
+    @staticmethod
+    def _checkpoint_position(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT value FROM meta WHERE key = 'checkpoint_position'").fetchone()[0]
+
+    def checkpoint(self) -> None:
+        # The new checkpoint is the previous one plus the rows written since then
+        conn = self.database.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            start = self._checkpoint_position(conn)
+            end = conn.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+            conn.execute(
+                f"INSERT INTO checkpoints (owner, delta) SELECT owner, TOTAL({_DELTA}) FROM transactions "
+                "WHERE id > ? AND id <= ? GROUP BY owner "
+                "ON CONFLICT (owner) DO UPDATE SET delta = delta + excluded.delta",
+                (start, end),
+            )
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'checkpoint_position'", (end,))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def checkpoint_tail(self, owner: str) -> tuple[float, list[dict[str, str]]]:
+        conn = self.database.connection()
+        # Read the checkpoint and the tail in one read transaction, so they are consistent
+        conn.execute("BEGIN")
+        try:
+            position = self._checkpoint_position(conn)
+            found = conn.execute("SELECT delta FROM checkpoints WHERE owner = ?", (owner,)).fetchone()
+            cursor = conn.execute(
+                f"{_SELECT_TRANSACTION} WHERE owner = ? AND id > ? ORDER BY id", (owner, position)
+            )
+            tail = [_row_dict(row[1:]) for row in cursor]
+        finally:
+            conn.execute("COMMIT")
+        return (found[0] if found is not None else 0.0), tail
+
+    def is_empty(self) -> bool:
+        return self.database.connection().execute("SELECT 1 FROM transactions LIMIT 1").fetchone() is None
+
+
+class SqliteUserRepository(UserRepository):
+    """Users stored in the users table (username is unique and indexed)."""
+
+    def __init__(self, database: SqliteDatabase):
+        self.database = database
+
+    def load_users(self) -> list[dict[str, Any]]:
+        cursor = self.database.connection().execute(_SELECT_USERS)
+        return [dict(zip(USER_COLUMNS, row, strict=True)) for row in cursor]
+
+    def version(self) -> int:
+        # Bumped by triggers on every insert, update or delete of a user
+        conn = self.database.connection()
+        return conn.execute("SELECT value FROM meta WHERE key = 'users_version'").fetchone()[0]
+
+    def add_users(self, users: list[dict[str, Any]]) -> None:
+        """Insert user records (e.g. imported from the JSON file); existing usernames are kept."""
+        values = [
+            (
+                user.get("username"),
+                user.get("email"),
+                user.get("full_name"),
+                user.get("password"),
+                user.get("balance", 0),
+            )
+            for user in users
+        ]
+        self.database.write([(_INSERT_USER, values)])
+
+
+_databases: dict[str, SqliteDatabase] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path: str) -> SqliteDatabase:
+    """Return the shared SqliteDatabase of a path (schema created on first use)."""
+    key = os.path.abspath(path)
+    with _databases_lock:
+        if key not in _databases:
+            _databases[key] = SqliteDatabase(path)
+        return _databases[key]
+
+
+def _backend() -> str:
+    if config.STORAGE_BACKEND not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {config.STORAGE_BACKEND}")
+    return config.STORAGE_BACKEND
+
+
+def get_ledger_repository(csv_path: str) -> LedgerRepository:
+    """Return the ledger repository of the configured backend.
+
+    Args:
+        csv_path: Path of the CSV ledger (only used by the csv backend).
+    """
+    if _backend() == "sqlite":
+        return SqliteLedgerRepository(get_database(config.SQLITE_PATH))
+    if config.LEDGER_PARTITION != "none":
+        return PartitionedCsvLedgerRepository(csv_path, config.LEDGER_PARTITION)
+    return CsvLedgerRepository(csv_path)
+
+
+def get_user_repository(json_path: str) -> UserRepository:
+    """Return the user repository of the configured backend.
+
+    Args:
+        json_path: Path of the JSON users file (only used by the csv backend).
+    """
+    if _backend() == "sqlite":
+        return SqliteUserRepository(get_database(config.SQLITE_PATH))
+    return JsonUserRepository(json_path)
@@ -8,9 +8,9 @@ depositing funds to the receiver account, and recording the transaction.
 
 from datetime import datetime
 
-from .entities import Account
+from .entities import Account, TransactionRecord
 from .models import TransactionCreate
-from .utils import append_csv_file
+from .repository import get_ledger_repository
 
 
 class TransactionManager:
@@ -85,9 +85,19 @@ class TransactionManager:
 
         # Validation: Use the Pydantic model to ensure that 'amount' is > 0 and the fields exist
         txn_validated = TransactionCreate(**transaction_dict)
+        record = TransactionRecord(
+            date=transaction_dict["date"],
+            owner=txn_validated.owner,
+            type=txn_validated.type,
+            from_user=txn_validated.from_user,
+            to_user=txn_validated.to_user,
+            amount=txn_validated.amount,
+            balance=balance_after,
+            description=txn_validated.description or "",
+        )
 
-        # Persistence: Save in the CSV. We use a list because append_csv_file expects a list of dicts
+        # Persistence: Save through the ledger repository (CSV file or SQLite, see config.STORAGE_BACKEND)
         try:
-            append_csv_file(self.transactions_file, [txn_validated.model_dump()])
+            get_ledger_repository(self.transactions_file).append([record])
         except Exception as e:
             raise Exception(f"Error persisting transaction: {e}")
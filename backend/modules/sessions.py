@@ -0,0 +1,139 @@
+"""
+Session tokens issued at login, so authenticated calls don't repeat the bcrypt check.
+
+A token is '<payload>.<signature>' (both base64url), where the payload holds the
+username, a random session id and the expiry time, and the signature is an
+HMAC-SHA256 of the payload. Checking a token costs one HMAC plus one dict lookup:
+- The signature proves the token was issued by this server.
+- The session store (bounded, with TTL eviction) holds the sessions that are
+  still active, so a session can be revoked (logout) before it expires.
+
+This module contains the following:
+- SessionStore
+- SessionManager
+- session_manager
+"""
+
+import base64
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from backend.modules import config
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class SessionStore:
+    """
+    Active sessions (session id -> username, expiry), bounded in size.
+    Expired sessions are evicted as they are found; when the store is full the
+    oldest session is evicted (that user has to log in again).
+    """
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: float) -> None:
+        """Drop expired sessions from the oldest end (lock must be held)."""
+        # Sessions are inserted in expiry order (same TTL for all of them)
+        while self._sessions:
+            session_id, (_, expires) = next(iter(self._sessions.items()))
+            if expires > now:
+                break
+            del self._sessions[session_id]
+
+    def add(self, session_id: str, username: str, expires: float) -> None:
+        with self._lock:
+            self._evict_expired(time.time())
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+            self._sessions[session_id] = (username, expires)
+
+    def get(self, session_id: str) -> str | None:
+        """Return the username of an active session, or None."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if session[1] <= time.time():
+                del self._sessions[session_id]
+                return None
+            return session[0]
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SessionManager:
+    """Issues, verifies and revokes signed session tokens."""
+
+    def __init__(self, secret: bytes, ttl: int, max_sessions: int):
+        self._secret = secret
+        self.ttl = ttl
+        self.store = SessionStore(max_sessions)
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self._secret, payload, hashlib.sha256).digest()
+
+    def _decode(self, token: str) -> tuple[str, str, float] | None:
+        """Check the signature and return (username, session id, expiry), or None."""
+        try:
+            encoded_payload, encoded_signature = token.split(".")
+            payload = _b64decode(encoded_payload)
+            signature = _b64decode(encoded_signature)
+            if not hmac.compare_digest(signature, self._sign(payload)):
+                return None
+            username, session_id, expires = payload.decode("utf-8").rsplit(":", 2)
+            return username, session_id, float(expires)
+        except (ValueError, UnicodeError):
+            return None
+
+    def issue(self, username: str) -> str:
+        """Create a session for the user and return its token."""
+        session_id = secrets.token_urlsafe(16)
+        expires = time.time() + self.ttl
+        payload = f"{username}:{session_id}:{int(expires)}".encode()
+
+        self.store.add(session_id, username, int(expires))
+        return f"{_b64encode(payload)}.{_b64encode(self._sign(payload))}"
+
+    def verify(self, token: str) -> str | None:
+        """Return the username of a valid token (well signed, not expired nor revoked), or None."""
+        decoded = self._decode(token)
+        if decoded is None:
+            return None
+
+        username, session_id, expires = decoded
+        if expires <= time.time() or self.store.get(session_id) != username:
+            return None
+        return username
+
+    def revoke(self, token: str) -> None:
+        """End the session of a token (logout)."""
+        decoded = self._decode(token)
+        if decoded is not None:
+            self.store.remove(decoded[1])
+
+
+# Without a configured secret, tokens are only valid until the server restarts
+session_manager = SessionManager(
+    secret=config.SESSION_SECRET.encode("utf-8") if config.SESSION_SECRET else secrets.token_bytes(32),
+    ttl=config.SESSION_TTL,
+    max_sessions=config.SESSION_STORE_SIZE,
+)
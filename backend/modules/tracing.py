@@ -0,0 +1,316 @@
+"""
+Opt-in tracing of single requests: timed spans around the hot paths and a sampling profiler.
+
+A fraction of the requests (TRACE_SAMPLE_RATE) is traced, plus the requests sent
+with the X-Proggy-Trace header when TRACE_HEADER is enabled. Outside a traced
+request, span() only looks up a context variable and returns a shared no-op.
+For every traced request, two files named after the trace id (also returned in
+the X-Proggy-Trace-Id response header) are written to TRACE_DIR:
+- <id>.json: the timing breakdown (every span, and the total and self time of each stage)
+- <id>.folded: the sampled stacks, in the collapsed format of flamegraph.pl and speedscope
+
+The profiler samples a thread only while it runs inside a span of the traced
+request. Spans wrap synchronous code, so during a span the thread works for that
+request alone, even when it is the event loop thread.
+
+This module contains the following:
+- HEADER
+- Trace
+- current_trace
+- span
+- shared
+- StackSampler
+- TracingMiddleware
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from types import FrameType
+from typing import Any
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.modules import config
+
+# Request header asking for a trace (honored only when config.TRACE_HEADER is enabled)
+HEADER = b"x-proggy-trace"
+
+# Trace of the current request (None when it is not traced) and names of the open spans
+_trace: ContextVar["Trace | None"] = ContextVar("proggy_trace", default=None)
+_path: ContextVar[tuple[str, ...]] = ContextVar("proggy_span_path", default=())
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Trace:
+    """Spans and sampled stacks of one request."""
+
+    def __init__(self, method: str, path: str):
+        self.id = f"{datetime.now():%Y%m%d-%H%M%S}-{secrets.token_hex(4)}"
+        self.method = method
+        self.path = path
+        self.route: str | None = None
+        self.status: int | None = None
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        # (names of the span and its parents, start and duration in seconds)
+        self.spans: list[tuple[tuple[str, ...], float, float]] = []
+        # Collapsed stacks sampled by the profiler, with their number of samples
+        self.stacks: Counter[str] = Counter()
+        # Threads running inside a span of the trace (thread id -> open spans)
+        self.active_threads: dict[int, int] = {}
+
+    @contextlib.contextmanager
+    def activate(self) -> Iterator["Trace"]:
+        """Make this the trace of the current context (spans opened inside are recorded)."""
+        trace_token, path_token = _trace.set(self), _path.set(())
+        try:
+            yield self
+        finally:
+            _path.reset(path_token)
+            _trace.reset(trace_token)
+
+    def finish(self, status: int | None = None, route: str | None = None) -> None:
+        """Record the end of the request."""
+        self.duration = time.perf_counter() - self.started
+        self.status = status
+        self.route = route
+
+    def breakdown(self) -> dict[str, Any]:
+        """Return the timing breakdown of the request (milliseconds).
+        Each stage is a span path (parents first, separated by ";"), with the number
+        of spans, their total time and their self time (total minus child stages).
+        untraced_ms is the time spent outside any span (routing, request parsing, awaits).
+        """
+        totals: dict[tuple[str, ...], list[float]] = {}
+        for path, _, duration in self.spans:
+            entry = totals.setdefault(path, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += duration
+            entry[2] += duration
+        for path, (_, total, _) in list(totals.items()):
+            if len(path) > 1 and path[:-1] in totals:
+                totals[path[:-1]][2] -= total
+
+        top_level = sum(entry[1] for path, entry in totals.items() if len(path) == 1)
+        stages = [
+            {
+                "stage": ";".join(path),
+                "count": count,
+                "total_ms": round(total * 1000, 3),
+                "self_ms": round(own * 1000, 3),
+            }
+            for path, (count, total, own) in sorted(totals.items(), key=lambda item: -item[1][1])
+        ]
+        spans = [
+            {
+                "stage": ";".join(path),
+                "start_ms": round(start * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+            }
+            for path, start, duration in sorted(self.spans, key=lambda span: span[1])
+        ]
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "duration_ms": round(self.duration * 1000, 3),
+            "untraced_ms": round(max(self.duration - top_level, 0.0) * 1000, 3),
+            "samples": sum(self.stacks.values()),
+            "stages": stages,
+            "spans": spans,
+        }
+
+    def save(self, directory: str) -> Path:
+        """Write the timing breakdown (<id>.json) and the sampled stacks (<id>.folded).
+
+        Returns:
+            Path of the timing breakdown.
+        """
+        folder = Path(directory)
+        folder.mkdir(parents=True, exist_ok=True)
+        path = folder / f"{self.id}.json"
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.breakdown(), file, indent=2)
+        with open(folder / f"{self.id}.folded", "w", encoding="utf-8") as file:
+            file.writelines(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+        return path
+
+
+class _Span:
+    """Open span of a traced request."""
+
+    __slots__ = ("trace", "name", "started", "token")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.token = _path.set((*_path.get(), self.name))
+        thread_id = threading.get_ident()
+        active = self.trace.active_threads
+        active[thread_id] = active.get(thread_id, 0) + 1
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        finished = time.perf_counter()
+        thread_id = threading.get_ident()
+        active = self.trace.active_threads
+        if active[thread_id] > 1:
+            active[thread_id] -= 1
+        else:
+            del active[thread_id]
+        self.trace.spans.append((_path.get(), self.started - self.trace.started, finished - self.started))
+        _path.reset(self.token)
+
+
+def current_trace() -> Trace | None:
+    """Return the trace of the current request (None when it is not traced)."""
+    return _trace.get()
+
+
+def span(name: str) -> contextlib.AbstractContextManager:
+    """Time a synchronous stage of the current request, if it is traced.
+
+    Usage:
+        with tracing.span("ledger.fsync"):
+            ...
+    """
+    trace = _trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name)
+
+
+@contextlib.contextmanager
+def shared(traces: Iterable[Trace], name: str) -> Iterator[None]:
+    """Record a span, and the spans opened inside it, on several traces at once.
+    For work done in one go for several requests (e.g. a batch of ledger writes): the
+    spans are recorded on a trace of their own and copied to every trace at the end,
+    and the samplers of the traces profile the thread meanwhile. Without traces, it
+    does nothing.
+
+    Usage:
+        with tracing.shared(traces, "ingest.batch"):
+            ...
+    """
+    traces = list(dict.fromkeys(traces))
+    if not traces:
+        yield
+        return
+
+    batch = Trace("BATCH", name)
+    thread_id = threading.get_ident()
+    for trace in traces:
+        trace.active_threads[thread_id] = trace.active_threads.get(thread_id, 0) + 1
+    try:
+        with batch.activate(), span(name):
+            yield
+    finally:
+        for trace in traces:
+            active = trace.active_threads
+            if active[thread_id] > 1:
+                active[thread_id] -= 1
+            else:
+                del active[thread_id]
+            offset = batch.started - trace.started
+            trace.spans.extend((path, start + offset, duration) for path, start, duration in batch.spans)
+
+
+def _collapse(frame: FrameType | None) -> str:
+    """Return the stack of a frame as "module:function" names, outermost first, separated by ";"."""
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Background thread sampling the stacks of the threads running inside the spans of a trace."""
+
+    def __init__(self, trace: Trace, interval: float):
+        self.trace = trace
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trace-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self.trace.active_threads):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.trace.stacks[_collapse(frame)] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware tracing the sampled requests (TRACE_SAMPLE_RATE, or the
+    X-Proggy-Trace header when TRACE_HEADER is enabled) and writing their traces.
+    Requests that are not sampled go straight through.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    @staticmethod
+    def _sampled(scope: Scope) -> bool:
+        if config.TRACE_HEADER and any(name == HEADER for name, _ in scope["headers"]):
+            return True
+        return config.TRACE_SAMPLE_RATE > 0 and random.random() < config.TRACE_SAMPLE_RATE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._sampled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope["method"], scope["path"])
+        status = None
+
+        async def send_with_trace_id(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [*message.get("headers", []), (b"x-proggy-trace-id", trace.id.encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        sampler = None
+        if config.TRACE_PROFILE_INTERVAL_MS > 0:
+            sampler = StackSampler(trace, config.TRACE_PROFILE_INTERVAL_MS / 1000)
+            sampler.start()
+        try:
+            with trace.activate():
+                await self.app(scope, receive, send_with_trace_id)
+        finally:
+            if sampler is not None:
+                sampler.stop()
+            trace.finish(status, getattr(scope.get("route"), "path", None))
+            try:
+                await asyncio.to_thread(trace.save, config.TRACE_DIR)
+            except OSError as e:
+                logging.warning(f"Could not write the trace {trace.id}: {e}")
@@ -2,8 +2,12 @@
 
 import csv
 import json
+from collections.abc import Iterable, Iterator
+from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, NamedTuple
+
+from backend.modules import metrics
 
 
 def read_json_file(path: str) -> dict:
@@ -61,8 +65,129 @@ def read_csv_file(path: str) -> list[dict[str, Any]]:
         raise FileNotFoundError(f"File not found: {path}")
 
     with open(file_path, encoding="utf-8", newline="") as file:
-        reader = csv.DictReader(file)
-        return list(reader)
+        rows = list(csv.DictReader(file))
+
+    metrics.record_read("read_csv_file", len(rows), file_path.stat().st_size)
+    return rows
+
+
+class LedgerRow(NamedTuple):
+    """One ledger row with typed values (amounts and dates already parsed)."""
+
+    date: datetime | None
+    owner: str
+    type: str
+    from_user: str
+    to_user: str
+    amount: float
+    balance: float | None
+    description: str
+
+
+def _split_csv_line(line: str) -> list[str]:
+    """Split one CSV line into its fields (quoted fields go through the csv module)."""
+    if '"' not in line:
+        return line.split(",")
+    return next(csv.reader([line]))
+
+
+def scan_csv_file(
+    path: str,
+    owners: Iterable[str] | None = None,
+    types: Iterable[str] | None = None,
+    chunk_size: int = 1 << 20,
+) -> Iterator[LedgerRow]:
+    """Scan a ledger CSV file and yield typed rows, without building one dict per row.
+    The file is read in large chunks, each chunk is decoded at once and split into
+    lines and fields. The owner and type filters are checked on the raw fields,
+    so the rows they reject are never parsed.
+
+    Args:
+        path: Path to the ledger CSV file (header with the ledger columns).
+        owners: Only yield the rows of these owners (None yields every owner).
+        types: Only yield the rows of these transaction types (None yields every type).
+        chunk_size: Number of bytes read from the file at a time.
+
+    Yields:
+        LedgerRow tuples, in file order. Quoted fields may contain line breaks.
+        A last line without line ending is skipped (it is still being written).
+
+    Raises:
+        FileNotFoundError: If the file doesn't exist.
+        ValueError: If the header lacks a ledger column or a row cannot be parsed.
+    """
+    owner_filter = None if owners is None else set(owners)
+    type_filter = None if types is None else set(types)
+    make_row = tuple.__new__
+    parse_date = datetime.fromisoformat
+
+    with open(path, "rb") as file:
+        header = _split_csv_line(file.readline().decode("utf-8").rstrip("\r\n"))
+        missing = [column for column in LedgerRow._fields if column not in header]
+        if missing:
+            raise ValueError(f"Missing ledger columns in {path}: {missing}")
+        date_i, owner_i, type_i, from_i, to_i, amount_i, balance_i, description_i = (
+            header.index(column) for column in LedgerRow._fields
+        )
+
+        # Consecutive rows often share their timestamp: parse it once
+        last_date_text, last_date = None, None
+        remainder = b""
+        # Start of a record whose quoted field has a line break (it goes on in the next line)
+        pending = ""
+        read_rows, read_bytes = 0, file.tell()
+        try:
+            while chunk := file.read(chunk_size):
+                read_bytes += len(chunk)
+                block = remainder + chunk
+                # Decode up to the last complete line (never in the middle of a character)
+                cut = block.rfind(b"\n") + 1
+                remainder = block[cut:]
+                lines = block[:cut].decode("utf-8").split("\n")
+                # The text after the last line ending is in the remainder
+                lines.pop()
+                read_rows += len(lines)
+
+                for line in lines:
+                    if pending:
+                        line = f"{pending}\n{line}"
+                        pending = ""
+                    if '"' in line and line.count('"') % 2:
+                        pending = line
+                        continue
+                    if line.endswith("\r"):
+                        line = line[:-1]
+                    if not line:
+                        continue
+                    fields = _split_csv_line(line)
+                    if len(fields) != len(header):
+                        raise ValueError(f"Malformed ledger line in {path}: {line!r}")
+
+                    # Predicate pushdown: skip the row before parsing any value
+                    if owner_filter is not None and fields[owner_i] not in owner_filter:
+                        continue
+                    if type_filter is not None and fields[type_i] not in type_filter:
+                        continue
+
+                    date_text = fields[date_i]
+                    if date_text != last_date_text:
+                        last_date_text, last_date = date_text, parse_date(date_text) if date_text else None
+                    balance = fields[balance_i]
+                    yield make_row(
+                        LedgerRow,
+                        (
+                            last_date,
+                            fields[owner_i],
+                            fields[type_i],
+                            fields[from_i],
+                            fields[to_i],
+                            float(fields[amount_i]),
+                            float(balance) if balance else None,
+                            fields[description_i],
+                        ),
+                    )
+        finally:
+            metrics.record_read("scan_csv_file", read_rows, read_bytes)
 
 
 def write_csv_file(path: str, data: list[dict[str, Any]]) -> None:
@@ -89,6 +214,9 @@ def write_csv_file(path: str, data: list[dict[str, Any]]) -> None:
         writer = csv.DictWriter(file, fieldnames=fieldnames)
         writer.writeheader()
         writer.writerows(data)
+        written = file.tell()
+
+    metrics.record_write("write_csv_file", len(data), written)
 
 
 def append_csv_file(path: str, data: list[dict[str, Any]]) -> None:
@@ -102,11 +230,15 @@ def append_csv_file(path: str, data: list[dict[str, Any]]) -> None:
 
     # Use "a" for append
     with open(file_path, "a", encoding="utf-8", newline="") as file:
+        start = file.tell()
         writer = csv.DictWriter(file, fieldnames=fieldnames)
         # Write the header only if the file is new
         if not file_exists:
             writer.writeheader()
         writer.writerows(data)
+        written = file.tell() - start
+
+    metrics.record_write("append_csv_file", len(data), written)
 
 
 def validate_amount(amount: float) -> bool:
@@ -5,24 +5,53 @@ It orchestrates the use of the entities to perform the operations (like transact
 
 This modules contains the following functions:
 - calculate_balance
+- calculate_all_balances
+- get_balance
+- load_indexes
+- rebuild_indexes
+- verify_balance_index
+- replay_balance
+- create_balance_checkpoint
+- verify_balance_checkpoints
+- reconcile_ledger
 - get_transaction_history
+- get_transaction_count
+- get_monthly_summary
+- get_transaction_page
+- iter_transaction_history
 - record_transaction
+- record_transactions
 - deposit
 - transfer
+- apply_commands
+- transfer_many
 """
 
+import base64
+import binascii
+import math
+from collections.abc import Iterable, Iterator, Mapping
 from datetime import datetime
 
-from backend.modules import utils
+from backend.modules import columnar, ledger, reconcile, repository, tracing
 from backend.modules.auth import AuthService
-from backend.modules.entities import Account
-from backend.modules.models import Transaction
+from backend.modules.entities import Account, TransactionRecord
+from backend.modules.locks import account_locks
+from backend.modules.models import TransactionBatch
 
 # Path to transactions CSV file
 TRANSACTIONS_FILE = "backend/data/transactions.csv"
 
-# CSV column names
-CSV_COLUMNS = ["date", "owner", "type", "from_user", "to_user", "amount", "balance", "description"]
+# CSV column names (defined by the ledger journal)
+CSV_COLUMNS = ledger.CSV_COLUMNS
+
+# Default number of transactions per history page
+HISTORY_PAGE_SIZE = 50
+
+
+def _ledger() -> repository.LedgerRepository:
+    """Return the ledger repository of the configured storage backend."""
+    return repository.get_ledger_repository(TRANSACTIONS_FILE)
 
 
 def calculate_balance(transactions: list, initial_balance: float, user: str) -> float:
@@ -40,47 +69,318 @@ def calculate_balance(transactions: list, initial_balance: float, user: str) ->
     """
     balance = initial_balance
 
-    for transaction in transactions:
-        # CRITICAL: Only process the record if the 'owner' is the current user
-        if transaction.get("owner") == user:
-            trans_type = transaction.get("type", "")
-            amount = float(transaction.get("amount", 0))
+    with tracing.span("wallet.calculate_balance"):
+        for transaction in transactions:
+            # CRITICAL: Only process the record if the 'owner' is the current user
+            if transaction.get("owner") == user:
+                trans_type = transaction.get("type", "")
+                amount = float(transaction.get("amount", 0))
 
-            # If it's a deposit or incoming transfer, add the amount
-            if trans_type in ["deposit", "transfer_in"]:
-                balance += amount
-            # If it's an outgoing transfer, subtract the amount
-            elif trans_type == "transfer_out":
-                balance -= amount
+                # If it's a deposit or incoming transfer, add the amount
+                if trans_type in ["deposit", "transfer_in"]:
+                    balance += amount
+                # If it's an outgoing transfer, subtract the amount
+                elif trans_type == "transfer_out":
+                    balance -= amount
 
     return balance
 
 
-def get_transaction_history(user: str) -> list:
-    """Get all transactions for a user.
+def calculate_all_balances(initial_balances: dict[str, float]) -> dict[str, float]:
+    """Calculate the balance of every user from the whole ledger, in one pass.
+    The ledger is loaded once into a columnar copy and the balances are computed
+    with a grouped sum, instead of one calculate_balance replay per user.
+
+    Args:
+        initial_balances: Opening balance of every user, by username.
+
+    Returns:
+        Calculated balance of every user, by username.
+    """
+    # Only the rows of the requested users are parsed (owner filter pushed down to the scan)
+    records = _ledger().scan_records(owners=initial_balances)
+    return columnar.ColumnarLedger.from_records(records).balances(initial_balances)
+
+
+def get_balance(user: str, initial_balance: float) -> float:
+    """Get the current balance of a user from the ledger balance index.
+    Equivalent to calculate_balance over the whole history, but O(1): the
+    index is updated on every record_transaction instead of replaying rows.
+
+    Args:
+        user: Username to get the balance for.
+        initial_balance: Opening balance of the user (from the user data).
+
+    Returns:
+        Current balance of the user.
+    """
+    with tracing.span("wallet.get_balance"):
+        return initial_balance + _ledger().balance_delta(user)
+
+
+def load_indexes() -> None:
+    """Load the persisted ledger indexes and apply the rows written since they were saved."""
+    _ledger().load()
+
+
+def rebuild_indexes() -> None:
+    """Rebuild the ledger indexes (e.g. the balance index) from the stored transactions."""
+    _ledger().rebuild()
+
+
+def verify_balance_index(initial_balances: dict[str, float]) -> dict[str, tuple[float, float]]:
+    """Compare the balance index against a full replay of the ledger (calculate_all_balances).
+
+    Args:
+        initial_balances: Opening balance of every user to verify, by username.
+
+    Returns:
+        Dictionary with the users whose balances disagree, mapped to a tuple of
+        (indexed balance, replayed balance). Empty if the index is consistent.
+    """
+    mismatches = {}
+    replayed_balances = calculate_all_balances(initial_balances)
+
+    for user, initial_balance in initial_balances.items():
+        indexed = get_balance(user, initial_balance)
+        replayed = replayed_balances[user]
+        if not math.isclose(indexed, replayed, abs_tol=1e-6):
+            mismatches[user] = (indexed, replayed)
+
+    return mismatches
+
+
+def replay_balance(user: str, initial_balance: float) -> float:
+    """Calculate the balance of a user by replay, starting from the latest balance checkpoint.
+    Only the rows written after the checkpoint are replayed with calculate_balance,
+    so the cost stays flat however long the user's history is.
+
+    Args:
+        user: Username to calculate the balance for.
+        initial_balance: Opening balance of the user (from the user data).
+
+    Returns:
+        Balance of the user after all its transactions.
+    """
+    checkpoint_delta, tail = _ledger().checkpoint_tail(user)
+    return calculate_balance(tail, initial_balance + checkpoint_delta, user)
+
+
+def create_balance_checkpoint() -> None:
+    """Rebuild the ledger indexes from a full replay and save a balance checkpoint from them."""
+    book = _ledger()
+    book.rebuild()
+    book.checkpoint()
+
+
+def verify_balance_checkpoints(users: list[str]) -> dict[str, tuple[float, float]]:
+    """Compare the checkpoint-based replay against a full calculate_balance replay.
+
+    Args:
+        users: Usernames to verify.
+
+    Returns:
+        Dictionary with the users whose net movement disagrees, mapped to a tuple of
+        (from the checkpoint, from the full replay). Empty if the checkpoint is consistent.
+    """
+    mismatches = {}
+
+    for user in users:
+        from_checkpoint = replay_balance(user, 0.0)
+        replayed = calculate_balance(get_transaction_history(user), 0.0, user)
+        if not math.isclose(from_checkpoint, replayed, abs_tol=1e-6):
+            mismatches[user] = (from_checkpoint, replayed)
+
+    return mismatches
+
+
+def reconcile_ledger(initial_balances: dict[str, float], **options) -> reconcile.ReconciliationReport:
+    """Check the stored balances and transfer pairs of the whole ledger, in a single streamed pass.
+
+    Args:
+        initial_balances: Opening balance of every user, by username.
+        options: match_window and max_issues (see reconcile.reconcile).
+
+    Returns:
+        The reconciliation report.
+    """
+    return reconcile.reconcile(_ledger().scan(), initial_balances, **options)
+
+
+def get_transaction_history(
+    user: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    types: Iterable[str] | None = None,
+    order: str = "asc",
+) -> list:
+    """Get all transactions for a user, optionally filtered by date and type.
+    The filters are applied on the owner index of the storage backend, before
+    any row is read, so the cost depends on the number of matching rows.
+    With a partitioned ledger, the partitions outside the dates are not read.
 
     Args:
         user: Username to get transactions for.
+        start: Only transactions dated at or after this date (None for no lower bound).
+        end: Only transactions dated before this date (None for no upper bound).
+        types: Only transactions of these types (None for every type).
+        order: "asc" for oldest first, "desc" for newest first.
 
     Returns:
         List of transaction dictionaries for the user.
         Returns empty list if file doesn't exist or user has no transactions.
     """
     try:
-        all_transactions = utils.read_csv_file(TRANSACTIONS_FILE)
+        with tracing.span("wallet.history"):
+            if order == "desc":
+                return [row for _, row in _ledger().owner_page(user, None, None, start, end, types)]
+            return _ledger().owner_rows(user, start, end, types)
     except FileNotFoundError:
         return []
 
-    # Direct filter: Only bring the rows that belong to the user
-    user_transactions = [
-        transaction for transaction in all_transactions if transaction.get("owner") == user
+
+def get_transaction_count(user: str) -> int:
+    """Get the number of transactions of a user, in O(1) (from the owner index, without reading them).
+    The ledger is append-only and every write adds at least one row of each user it
+    touches, so the count also works as the version of the user's ledger (see the ETags).
+    """
+    return _ledger().count(user)
+
+
+def get_monthly_summary(user: str, months: int | None = None) -> list[dict]:
+    """Get the monthly totals of a user: deposits, transfers in, transfers out and net.
+    The totals are maintained on every recorded transaction (rollups of the storage
+    backend), so the cost depends on the number of months, not of transactions.
+
+    Args:
+        user: Username to get the summary for.
+        months: Only the latest months (None for every month with transactions).
+
+    Returns:
+        List of dictionaries (month "YYYY-MM", deposits, transfers_in, transfers_out,
+        net, count), oldest month first.
+    """
+    summary = []
+    totals = sorted(_ledger().monthly_totals(user).items())
+    for month, (deposits, transfers_in, transfers_out, count) in totals[-months:] if months else totals:
+        summary.append(
+            {
+                "month": month,
+                "deposits": deposits,
+                "transfers_in": transfers_in,
+                "transfers_out": transfers_out,
+                "net": deposits + transfers_in - transfers_out,
+                "count": count,
+            }
+        )
+    return summary
+
+
+def _encode_cursor(position: int) -> str:
+    """Build the opaque cursor that points to a row of the ledger."""
+    return base64.urlsafe_b64encode(str(position).encode("ascii")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> int:
+    """Get the ledger position (offset or row id, depending on the backend) back from an opaque cursor."""
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii"))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError(f"Invalid history cursor: {cursor}") from None
+
+
+def get_transaction_page(
+    user: str,
+    limit: int = HISTORY_PAGE_SIZE,
+    cursor: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    types: Iterable[str] | None = None,
+    order: str = "desc",
+) -> tuple[list, str | None]:
+    """Get one page of the transactions of a user, newest first (or oldest first).
+
+    Args:
+        user: Username to get transactions for.
+        limit: Maximum number of transactions in the page.
+        cursor: Cursor returned with the previous page (None for the first page).
+        start, end, types: Same filters as get_transaction_history (keep them across pages).
+        order: "desc" for newest first, "asc" for oldest first.
+
+    Returns:
+        Tuple with the list of transaction dictionaries and the cursor of the
+        next page (None if there are no more transactions).
+
+    Raises:
+        ValueError: If the limit is not positive or the cursor is invalid.
+    """
+    if limit <= 0:
+        raise ValueError("The page limit must be positive")
+
+    last = _decode_cursor(cursor) if cursor else None
+
+    # Ask for one extra row to know if there is a next page
+    with tracing.span("wallet.history"):
+        entries = _ledger().owner_page(user, last, limit + 1, start, end, types, order == "asc")
+    next_cursor = _encode_cursor(entries[limit - 1][0]) if len(entries) > limit else None
+
+    return [row for _, row in entries[:limit]], next_cursor
+
+
+def iter_transaction_history(
+    user: str,
+    cursor: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    types: Iterable[str] | None = None,
+    order: str = "desc",
+) -> Iterator[dict]:
+    """Iterate over the transactions of a user, newest first (or oldest first).
+    Rows are read one page at a time, so memory stays bounded for any history size.
+
+    Args:
+        user: Username to get transactions for.
+        cursor: Cursor to start from (None starts from the first transaction in the order).
+        start, end, types: Same filters as get_transaction_history.
+        order: "desc" for newest first, "asc" for oldest first.
+
+    Returns:
+        Iterator of transaction dictionaries.
+
+    Raises:
+        ValueError: If the cursor is invalid (raised right away, not when iterating).
+    """
+    last = _decode_cursor(cursor) if cursor else None
+    book = _ledger()
+    ascending = order == "asc"
+
+    def rows() -> Iterator[dict]:
+        entries = book.owner_page(user, last, HISTORY_PAGE_SIZE, start, end, types, ascending)
+        while entries:
+            yield from (row for _, row in entries)
+            entries = book.owner_page(user, entries[-1][0], HISTORY_PAGE_SIZE, start, end, types, ascending)
+
+    return rows()
+
+
+def _validate_transactions(transactions: list[Mapping]) -> list[TransactionRecord]:
+    """Validate a batch of transactions with the Transaction model, in a single call."""
+    # Ensure description exists (it's required in TransactionBase)
+    batch = [
+        data if "description" in data else {**data, "description": f"{data['type']} of {data['amount']}"}
+        for data in transactions
     ]
 
-    return user_transactions
+    # Pydantic validates all fields and types of the whole list at once (TypeAdapter)
+    with tracing.span("wallet.validate"):
+        validated = TransactionBatch.validate_python(batch)
+
+    return [TransactionRecord.from_model(transaction) for transaction in validated]
 
 
 def record_transaction(transaction_data: dict) -> None:
-    """Save transaction to CSV file.
+    """Append transaction to the ledger (through the configured storage repository).
+    The ledger is append-only: the existing rows are never read nor rewritten.
 
     Args:
         transaction_data: Dictionary with transaction details.
@@ -88,30 +388,29 @@ def record_transaction(transaction_data: dict) -> None:
 
     Raises:
         ValidationError: If transaction_data doesn't match the Transaction model.
+        ValueError: If the ledger header doesn't match the ledger columns.
         OSError: If file cannot be written.
+        sqlite3.Error: If the database cannot be written (sqlite backend).
     """
-    # Ensure description exists (it's required in TransactionBase)
-    if "description" not in transaction_data:
-        transaction_data["description"] = f"{transaction_data['type']} of {transaction_data['amount']}"
+    record_transactions([transaction_data])
 
-    # Pydantic automatically validates all fields and types
-    try:
-        transaction = Transaction(**transaction_data)
-    except Exception as e:
-        print(f"DEBUG: Pydantic Validation Error in record_transaction: {e}")
-        raise
 
-    # Read existing transactions or start with empty list
-    try:
-        all_transactions = utils.read_csv_file(TRANSACTIONS_FILE)
-    except FileNotFoundError:
-        all_transactions = []
+def record_transactions(transactions: list[dict]) -> None:
+    """Append several transactions to the ledger in a single write.
+    Every transaction is validated first, with one batch validation of the whole
+    list (TransactionBatch): if one is invalid, none is written. The validated
+    transactions are written as compact TransactionRecord objects.
 
-    # Add new transaction using model_dump to convert Pydantic object to dict
-    all_transactions.append(transaction.model_dump())
+    Args:
+        transactions: List of dictionaries with transaction details.
 
-    # Write back to CSV
-    utils.write_csv_file(TRANSACTIONS_FILE, all_transactions)
+    Raises:
+        ValidationError: If a transaction doesn't match the Transaction model.
+        ValueError: If the ledger header doesn't match the ledger columns.
+        OSError: If file cannot be written.
+        sqlite3.Error: If the database cannot be written (sqlite backend).
+    """
+    _ledger().append(_validate_transactions(transactions))
 
 
 def deposit(user: str, amount: float, source: str = "external") -> dict:
@@ -134,31 +433,66 @@ def deposit(user: str, amount: float, source: str = "external") -> dict:
     if user_entity is None:
         raise FileNotFoundError(f"User not found: {user}")
 
-    # Load current balance from history
-    history = get_transaction_history(user)
-    # Access balance through the account entity (which holds initial balance from model)
-    current_balance = calculate_balance(history, user_entity.account.balance, user)
-
-    # Use Account entity for business logic
-    account = Account(owner_username=user, balance=current_balance)
-    new_balance = account.add_funds(amount)
-
-    # Create transaction record
-    transaction_data = {
-        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "owner": user,
-        "type": "deposit",
-        "from_user": source,
-        "to_user": user,
-        "amount": float(amount),
-        "balance": float(new_balance),
-        "description": f"Deposit of {amount} from {source}",
-    }
-
-    # Record transaction
-    record_transaction(transaction_data)
-
-    return transaction_data
+    # The account is locked from reading its balance until the row is written
+    with account_locks.hold(user):
+        # Load current balance from the balance index
+        # Access balance through the account entity (which holds initial balance from model)
+        current_balance = get_balance(user, user_entity.account.balance)
+
+        # Use Account entity for business logic
+        account = Account(owner_username=user, balance=current_balance)
+        new_balance = account.add_funds(amount)
+
+        # Create transaction record (the values were already validated by the entity)
+        record = TransactionRecord(
+            date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            owner=user,
+            type="deposit",
+            from_user=source,
+            to_user=user,
+            amount=float(amount),
+            balance=float(new_balance),
+            description=f"Deposit of {amount} from {source}",
+        )
+
+        # Record transaction
+        _ledger().append([record])
+
+    return record.as_dict()
+
+
+def _transfer_records(
+    from_user: str,
+    to_user: str,
+    amount: float,
+    sender_balance: float,
+    receiver_balance: float,
+    timestamp: str,
+) -> tuple[TransactionRecord, TransactionRecord]:
+    """Build the transfer_out (sender) and transfer_in (receiver) records of a transfer."""
+    transfer_out = TransactionRecord(
+        date=timestamp,
+        owner=from_user,
+        type="transfer_out",
+        from_user=from_user,
+        to_user=to_user,
+        amount=float(amount),
+        balance=float(sender_balance),
+        description=f"Transfer of {amount} to {to_user}",
+    )
+
+    transfer_in = TransactionRecord(
+        date=timestamp,
+        owner=to_user,
+        type="transfer_in",
+        from_user=from_user,
+        to_user=to_user,
+        amount=float(amount),
+        balance=float(receiver_balance),
+        description=f"Transfer of {amount} from {from_user}",
+    )
+
+    return transfer_out, transfer_in
 
 
 def transfer(from_user: str, to_user: str, amount: float) -> dict:
@@ -186,48 +520,148 @@ def transfer(from_user: str, to_user: str, amount: float) -> dict:
     if receiver_entity is None:
         raise FileNotFoundError(f"Receiver user not found: {to_user}")
 
-    # Load and instantiate sender account
-    sender_history = get_transaction_history(from_user)
-    sender_current = calculate_balance(sender_history, sender_entity.account.balance, from_user)
-    sender_account = Account(owner_username=from_user, balance=sender_current)
+    # Both accounts are locked (in a fixed order) from reading their balances
+    # until the rows are written, so the balance check in remove_funds stays valid
+    with account_locks.hold(from_user, to_user):
+        # Load and instantiate sender account
+        sender_current = get_balance(from_user, sender_entity.account.balance)
+        sender_account = Account(owner_username=from_user, balance=sender_current)
+
+        # Load and instantiate receiver account
+        receiver_current = get_balance(to_user, receiver_entity.account.balance)
+        receiver_account = Account(owner_username=to_user, balance=receiver_current)
+
+        # Execute business logic (validations happen inside entities)
+        new_sender_balance = sender_account.remove_funds(amount)
+        new_receiver_balance = receiver_account.add_funds(amount)
+
+        # Get timestamp for both transactions
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        # Create transfer records
+        transfer_out, transfer_in = _transfer_records(
+            from_user, to_user, amount, new_sender_balance, new_receiver_balance, timestamp
+        )
 
-    # Load and instantiate receiver account
-    receiver_history = get_transaction_history(to_user)
-    receiver_current = calculate_balance(receiver_history, receiver_entity.account.balance, to_user)
-    receiver_account = Account(owner_username=to_user, balance=receiver_current)
+        # Record both transactions in a single write (no half-recorded transfer)
+        _ledger().append([transfer_out, transfer_in])
 
-    # Execute business logic (validations happen inside entities)
-    new_sender_balance = sender_account.remove_funds(amount)
-    new_receiver_balance = receiver_account.add_funds(amount)
+    return transfer_out.as_dict()
 
-    # Get timestamp for both transactions
+
+def apply_commands(commands: list[dict]) -> list[dict | Exception]:
+    """Apply deposits and transfers in order, with a single write to the ledger.
+    Commands are applied against in-memory Account entities, so a command sees the
+    balances left by the previous ones. A failed command (unknown user, invalid
+    amount, insufficient balance) doesn't stop the others.
+
+    Args:
+        commands: List of dictionaries with a "type": "deposit" (with user, amount and
+                  an optional source) or "transfer" (with from_user, to_user and amount).
+
+    Returns:
+        One result per command, in the same order: the recorded transaction (the
+        transfer_out record of a transfer), or the error that made the command fail
+        (FileNotFoundError for an unknown user, ValueError otherwise).
+
+    Raises:
+        OSError: If the ledger cannot be written (no command is recorded).
+    """
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    accounts: dict[str, Account | None] = {}
+    records = []
+    results: list[dict | Exception] = []
+
+    def load_account(user: str) -> Account | None:
+        # Each user is loaded once; later commands see the in-memory balance
+        if user not in accounts:
+            user_entity = AuthService.get_user_entity(user)
+            accounts[user] = (
+                Account(owner_username=user, balance=get_balance(user, user_entity.account.balance))
+                if user_entity
+                else None
+            )
+        return accounts[user]
+
+    def apply(command: dict) -> dict:
+        if command["type"] == "deposit":
+            user, amount, source = command["user"], command["amount"], command.get("source", "external")
+            account = load_account(user)
+            if account is None:
+                raise FileNotFoundError(f"User not found: {user}")
+
+            new_balance = account.add_funds(amount)
+            record = TransactionRecord(
+                date=timestamp,
+                owner=user,
+                type="deposit",
+                from_user=source,
+                to_user=user,
+                amount=float(amount),
+                balance=float(new_balance),
+                description=f"Deposit of {amount} from {source}",
+            )
+            records.append(record)
+            return record.as_dict()
+
+        if command["type"] != "transfer":
+            raise ValueError(f"Unknown command type: {command['type']}")
+
+        from_user, to_user, amount = command["from_user"], command["to_user"], command["amount"]
+        sender_account = load_account(from_user)
+        receiver_account = load_account(to_user)
+        if sender_account is None:
+            raise FileNotFoundError(f"Sender user not found: {from_user}")
+        if receiver_account is None:
+            raise FileNotFoundError(f"Receiver user not found: {to_user}")
+
+        # Execute business logic (validations happen inside entities)
+        new_sender_balance = sender_account.remove_funds(amount)
+        new_receiver_balance = receiver_account.add_funds(amount)
+
+        transfer_out, transfer_in = _transfer_records(
+            from_user, to_user, amount, new_sender_balance, new_receiver_balance, timestamp
+        )
+        records.extend([transfer_out, transfer_in])
+        return transfer_out.as_dict()
+
+    # Every account of the batch stays locked until all the rows are written
+    keys = ("user", "from_user", "to_user")
+    users = [command[key] for command in commands for key in keys if key in command]
+    with account_locks.hold(*users):
+        for command in commands:
+            try:
+                results.append(apply(command))
+            except (FileNotFoundError, ValueError) as e:
+                results.append(e)
+
+        # Persist the rows of every command at once
+        if records:
+            _ledger().append(records)
+
+    return results
+
+
+def transfer_many(transfers: list[dict]) -> list[dict]:
+    """Process many transfers in one pass, with a single write to the ledger.
+    Transfers are applied in order against in-memory Account entities, so a
+    transfer can spend the money received by a previous one. A failed transfer
+    (unknown user, invalid amount, insufficient balance) doesn't stop the others.
 
-    # Create transfer records
-    transfer_out = {
-        "date": timestamp,
-        "owner": from_user,
-        "type": "transfer_out",
-        "from_user": from_user,
-        "to_user": to_user,
-        "amount": float(amount),
-        "balance": float(new_sender_balance),
-        "description": f"Transfer of {amount} to {to_user}",
-    }
-
-    transfer_in = {
-        "date": timestamp,
-        "owner": to_user,
-        "type": "transfer_in",
-        "from_user": from_user,
-        "to_user": to_user,
-        "amount": float(amount),
-        "balance": float(new_receiver_balance),
-        "description": f"Transfer of {amount} from {from_user}",
-    }
-
-    # Record both transactions
-    record_transaction(transfer_out)
-    record_transaction(transfer_in)
-
-    return transfer_out
+    Args:
+        transfers: List of dictionaries with from_user, to_user and amount.
+
+    Returns:
+        One result per transfer, in the same order: a dictionary with the index,
+        the status ("success" or "failed") and the transfer_out record or the error.
+
+    Raises:
+        OSError: If the ledger cannot be written (no transfer is recorded).
+    """
+    results = apply_commands([{"type": "transfer", **item} for item in transfers])
+    return [
+        {"index": index, "status": "failed", "error": str(result)}
+        if isinstance(result, Exception)
+        else {"index": index, "status": "success", "transaction": result}
+        for index, result in enumerate(results)
+    ]
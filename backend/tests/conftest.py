@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from backend.modules import auth, config, repository, wallet
+
+
+@pytest.fixture(params=["csv", "sqlite", "partitioned"])
+def storage_backend(request, tmp_path, monkeypatch):
+    """Run the test against every storage backend, each with its own temporary files
+    ("partitioned" is the csv backend with monthly ledger partitions)"""
+    backend = "csv" if request.param == "partitioned" else request.param
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    monkeypatch.setattr(config, "LEDGER_PARTITION", "month" if request.param == "partitioned" else "none")
+    monkeypatch.setattr(config, "SQLITE_PATH", str(tmp_path / "wallet.db"))
+    monkeypatch.setattr(wallet, "TRANSACTIONS_FILE", str(tmp_path / "transactions.csv"))
+    monkeypatch.setattr(auth, "USERS_FILE", str(tmp_path / "users.json"))
+    return request.param
+
+
+@pytest.fixture
+def users(storage_backend):
+    """Store alice and bob (balance 100) in the users file or the database of the backend under test"""
+    records = [
+        {"username": name, "email": f"{name}@example.com", "password": "hash", "balance": 100}
+        for name in ("alice", "bob")
+    ]
+    if storage_backend == "sqlite":
+        repository.SqliteUserRepository(repository.get_database(config.SQLITE_PATH)).add_users(records)
+    else:
+        with open(auth.USERS_FILE, "w", encoding="utf-8") as file:
+            json.dump({"users": records}, file)
+    return records
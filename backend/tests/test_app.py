@@ -0,0 +1,128 @@
+import time
+from datetime import UTC, datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.app
+from backend.app import app
+from backend.modules import wallet
+from backend.modules.sessions import session_manager
+
+
+class TestConditionalGet:
+    """Test the ETags of the wallet status and history routes"""
+
+    @pytest.fixture
+    def client(self, users):
+        client = TestClient(app)
+        client.headers["Authorization"] = f"Bearer {session_manager.issue('alice')}"
+        return client
+
+    @pytest.mark.parametrize("path", ["/wallet/status/alice", "/wallet/history/alice"])
+    def test_unchanged_wallet_is_not_modified(self, client, path):
+        """Should answer 304 with the same ETag while the wallet doesn't change"""
+        first = client.get(path)
+        etag = first.headers["etag"]
+
+        second = client.get(path, headers={"If-None-Match": etag})
+
+        assert first.status_code == 200
+        assert first.headers["cache-control"] == "private, no-cache"
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["etag"] == etag
+
+    def test_writes_change_the_etag(self, client):
+        """Should give a new ETag after a write that touches the user, and not after other writes"""
+        etag = client.get("/wallet/status/alice").headers["etag"]
+
+        wallet.deposit("bob", 5.0)
+        assert client.get("/wallet/status/alice", headers={"If-None-Match": etag}).status_code == 304
+
+        wallet.transfer("bob", "alice", 1.0)
+        response = client.get("/wallet/status/alice", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()["balance"] == 101.0
+
+    def test_not_modified_history_is_not_read(self, client, monkeypatch):
+        """Should answer 304 without reading the ledger rows"""
+        wallet.deposit("alice", 5.0)
+        etag = client.get("/wallet/history/alice?format=ndjson").headers["etag"]
+
+        def fail(*args, **kwargs):
+            raise AssertionError("the ledger was read")
+
+        monkeypatch.setattr(backend.app, "iter_transaction_history", fail)
+
+        response = client.get("/wallet/history/alice?format=ndjson", headers={"If-None-Match": f"W/{etag}"})
+
+        assert response.status_code == 304
+
+    def test_other_etags_get_the_full_response(self, client):
+        """Should answer 200 when none of the ETags match"""
+        response = client.get("/wallet/status/alice", headers={"If-None-Match": '"0-stale", "1-other"'})
+
+        assert response.status_code == 200
+        assert response.json()["balance"] == 100
+
+
+class TestHistoryFilters:
+    """Test the date filters of the history route"""
+
+    @pytest.fixture
+    def client(self, users, monkeypatch):
+        # A server behind UTC, so local and UTC times differ
+        monkeypatch.setenv("TZ", "America/New_York")
+        time.tzset()
+        # One append per month: the previous months are sealed partitions with the partitioned ledger
+        for date in (
+            "2020-01-31 23:30:00",
+            "2020-02-01 00:30:00",
+            "2020-02-29 23:30:00",
+            "2020-03-01 00:30:00",
+        ):
+            wallet.record_transaction(
+                {
+                    "date": date,
+                    "owner": "alice",
+                    "type": "deposit",
+                    "from_user": "atm",
+                    "to_user": "alice",
+                    "amount": 1.0,
+                    "balance": 101.0,
+                }
+            )
+        client = TestClient(app)
+        client.headers["Authorization"] = f"Bearer {session_manager.issue('alice')}"
+        yield client
+        monkeypatch.undo()
+        time.tzset()
+
+    def test_dates_with_a_utc_offset(self, client):
+        """Should convert from/to with a UTC offset to the local time of the ledger dates"""
+        # Local midnights, sent in UTC the way the frontend sends them
+        start, end = (
+            datetime(2020, month, 1).astimezone(UTC).strftime("%Y-%m-%dT%H:%M:%SZ") for month in (2, 3)
+        )
+
+        response = client.get("/wallet/history/alice", params={"from": start, "to": end})
+
+        assert response.status_code == 200
+        assert [row["date"] for row in response.json()["transactions"]] == [
+            "2020-02-01 00:30:00",
+            "2020-02-29 23:30:00",
+        ]
+
+    def test_local_dates(self, client):
+        """Should compare dates without an offset with the ledger dates as they are"""
+        response = client.get(
+            "/wallet/history/alice", params={"from": "2020-02-01T00:00:00", "order": "desc"}
+        )
+
+        assert [row["date"] for row in response.json()["transactions"]] == [
+            "2020-03-01 00:30:00",
+            "2020-02-29 23:30:00",
+            "2020-02-01 00:30:00",
+        ]
@@ -1,3 +1,7 @@
+import asyncio
+import json
+import threading
+
 import pytest
 
 from backend.modules import auth
@@ -46,3 +50,95 @@ def test_validate_credentials_wrong_user(mock_load_users):
     """Test that the validate_credentials function returns False if the user does not exist"""
     result = auth.validate_credentials("non_existent", "any_password")
     assert result is False
+
+
+class TestUserDirectory:
+    """Test the in-process user directory of AuthService"""
+
+    @pytest.fixture
+    def users_file(self, tmp_path, monkeypatch):
+        """Point AuthService to a temporary users file and return a function to write it"""
+        path = tmp_path / "users.json"
+        monkeypatch.setattr(auth, "USERS_FILE", str(path))
+
+        def write(users):
+            path.write_text(json.dumps({"users": users}), encoding="utf-8")
+
+        return write
+
+    def user(self, username, balance=100):
+        return {
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "hash",
+            "balance": balance,
+        }
+
+    def test_lookup_does_not_reload_unchanged_file(self, users_file, monkeypatch):
+        """Test that the file is parsed once while it doesn't change"""
+        users_file([self.user("test_user"), self.user("other_user")])
+        loads = []
+        original_load = auth.AuthService._load_users_data
+        monkeypatch.setattr(auth.AuthService, "_load_users_data", lambda: loads.append(1) or original_load())
+
+        assert auth.AuthService.get_user_entity("test_user").username == "test_user"
+        assert auth.AuthService.get_user_entity("other_user").username == "other_user"
+        assert auth.AuthService.get_user_entity("non_existent") is None
+        assert len(loads) == 1
+
+    def test_changed_file_is_reloaded(self, users_file):
+        """Test that a change in the users file is picked up"""
+        users_file([self.user("test_user", balance=100)])
+        assert auth.AuthService.get_user_entity("test_user").account.balance == 100
+
+        users_file([self.user("test_user", balance=250), self.user("new_user")])
+
+        assert auth.AuthService.get_user_entity("test_user").account.balance == 250
+        assert auth.AuthService.get_user_entity("new_user") is not None
+
+    def test_explicit_reload(self, users_file, monkeypatch):
+        """Test that reload_users forces the file to be parsed again"""
+        users_file([self.user("test_user")])
+        auth.AuthService.get_user_entity("test_user")
+        loads = []
+        original_load = auth.AuthService._load_users_data
+        monkeypatch.setattr(auth.AuthService, "_load_users_data", lambda: loads.append(1) or original_load())
+
+        auth.AuthService.reload_users()
+        auth.AuthService.get_user_entity("test_user")
+
+        assert len(loads) == 1
+
+    def test_invalid_users_are_skipped(self, users_file):
+        """Test that an invalid entry doesn't prevent loading the other users"""
+        users_file([{"username": "x", "email": "bad"}, self.user("test_user")])
+
+        assert auth.AuthService.get_user_entity("x") is None
+        assert auth.AuthService.get_user_entity("test_user") is not None
+
+
+class TestPasswordPool:
+    """Test the bounded worker pool used for bcrypt"""
+
+    def test_run_returns_result(self):
+        """Test that the function runs in the pool and its result is returned"""
+        pool = auth.PasswordPool(workers=2, queue_limit=0)
+
+        assert asyncio.run(pool.run(lambda a, b: a + b, 2, 3)) == 5
+
+    def test_saturated_pool_is_busy(self):
+        """Test that a check is rejected when every worker is busy and the queue is full"""
+        pool = auth.PasswordPool(workers=1, queue_limit=0)
+        release = threading.Event()
+
+        async def scenario():
+            blocked = asyncio.ensure_future(pool.run(release.wait))
+            await asyncio.sleep(0.05)
+            with pytest.raises(auth.PasswordPoolBusyError):
+                await pool.run(lambda: True)
+            release.set()
+            await blocked
+            # Once the worker is free the pool accepts checks again
+            return await pool.run(lambda: True)
+
+        assert asyncio.run(scenario()) is True
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from backend.benchmarks import generator, load, runner
+from backend.modules import reconcile
+
+
+class TestGenerator:
+    """Test the synthetic dataset generator"""
+
+    def test_parse_size(self):
+        """Should read plain and suffixed row counts"""
+        assert [generator.parse_size(size) for size in ["2500", "10k", "1M", "1.5m"]] == [
+            2500,
+            10_000,
+            1_000_000,
+            1_500_000,
+        ]
+        with pytest.raises(ValueError, match="Invalid size"):
+            generator.parse_size("lots")
+
+    def test_rows_are_deterministic(self):
+        """Should give the same rows for the same seed, and other rows for another seed"""
+        first = [row for chunk in generator.generate_rows(501, 20, seed=7) for row in chunk]
+        again = [row for chunk in generator.generate_rows(501, 20, seed=7) for row in chunk]
+        other = [row for chunk in generator.generate_rows(501, 20, seed=8) for row in chunk]
+
+        assert len(first) == 501
+        assert first == again
+        assert first != other
+
+    def test_rows_reconcile(self):
+        """Should write running balances and transfer pairs that reconcile"""
+        rows = [row for chunk in generator.generate_rows(2000, 30, skew=1.2) for row in chunk]
+        initial_balances = dict.fromkeys(generator.usernames(30), generator.INITIAL_BALANCE)
+
+        report = reconcile.reconcile(rows, initial_balances)
+
+        assert report.ok, report.issues
+
+    def test_skew_concentrates_rows(self):
+        """Should give most rows to the first users with a high skew, and spread them without skew"""
+
+        def rows_of_first_user(skew):
+            rows = [row for chunk in generator.generate_rows(5000, 100, skew=skew) for row in chunk]
+            return sum(row["owner"] == "user000000" for row in rows)
+
+        assert rows_of_first_user(1.5) > 1000
+        assert rows_of_first_user(0) < 200
+
+
+class TestRunner:
+    """Test the benchmark runner and the comparison of results"""
+
+    def test_percentiles(self):
+        """Should summarize the durations with nearest-rank percentiles in ms"""
+        summary = runner.summarize(100, "deposit", [i / 1000 for i in range(1, 101)])
+
+        assert (summary["p50_ms"], summary["p90_ms"], summary["p99_ms"], summary["max_ms"]) == (
+            50,
+            90,
+            99,
+            100,
+        )
+        assert summary["samples"] == 100
+
+    def test_run_reports_every_operation(self, storage_backend, tmp_path):
+        """Should time every operation on a generated dataset"""
+        report = runner.run_benchmarks([300], users=10, ops=5, data_dir=str(tmp_path / "datasets"))
+
+        operations = [result["operation"] for result in report["results"]]
+        assert operations == ["load_indexes", *runner.OPERATIONS]
+        assert all(result["rows"] == 300 and result["ops_per_second"] > 0 for result in report["results"])
+        assert report["meta"]["users"] == 10
+
+    def test_compare_flags_regressions(self):
+        """Should flag the operations whose p50 grew more than the tolerance"""
+        baseline = {
+            "results": [runner.summarize(10, "deposit", [0.001]), runner.summarize(10, "transfer", [0.001])]
+        }
+        current = {
+            "results": [runner.summarize(10, "deposit", [0.0011]), runner.summarize(10, "transfer", [0.002])]
+        }
+
+        comparison = runner.compare_results(baseline, current, tolerance=0.2)
+
+        assert [(entry["operation"], entry["regression"]) for entry in comparison] == [
+            ("deposit", False),
+            ("transfer", True),
+        ]
+
+
+class TestLoad:
+    """Test the HTTP load harness"""
+
+    def test_parse_mix(self):
+        """Should read the weights of the known traffic types only"""
+        assert load.parse_mix("deposit=3, status=1") == {"deposit": 3.0, "status": 1.0}
+        with pytest.raises(ValueError, match="Unknown traffic type"):
+            load.parse_mix("refund=1")
+        with pytest.raises(ValueError, match="positive weight"):
+            load.parse_mix("deposit=0")
+
+    def test_in_process_run(self, storage_backend, tmp_path):
+        """Should send the requested mix to the app and report every route without errors"""
+        report = asyncio.run(
+            load.run_load(concurrency=4, requests=60, rows=200, users=5, data_dir=str(tmp_path / "datasets"))
+        )
+
+        results = {result["operation"]: result for result in report["results"]}
+        assert set(results) == {*load.ROUTES.values(), "all"}
+        # Every client also logs in once before its first request of the mix
+        assert results["all"]["requests"] == 64
+        assert results["all"]["errors"] == 0, [result["errors_by_status"] for result in results.values()]
+        assert report["meta"]["target"] == "in-process"
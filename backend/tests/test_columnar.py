@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+from backend.modules import columnar, wallet
+
+
+def make_rows(count, seed=7):
+    """Random ledger rows of a few owners, with every transaction type"""
+    rng = random.Random(seed)
+    types = ["deposit", "transfer_in", "transfer_out", "fee"]
+    return [
+        {
+            "owner": f"user{rng.randrange(5)}",
+            "type": rng.choice(types),
+            "amount": str(round(rng.uniform(0.01, 500.0), 2)),
+        }
+        for _ in range(count)
+    ]
+
+
+@pytest.fixture(params=["array", "numpy"])
+def engine(request, monkeypatch):
+    """Run the test with the array fallback and, when installed, with NumPy"""
+    if request.param == "array":
+        monkeypatch.setattr(columnar, "np", None)
+    elif columnar.np is None:
+        pytest.skip("NumPy is not installed")
+    return request.param
+
+
+class TestColumnarLedger:
+    """Test the columnar ledger and its grouped sums"""
+
+    def test_balances_match_calculate_balance(self, engine):
+        """Should give every user the same balance as a calculate_balance replay"""
+        rows = make_rows(2000)
+        initial_balances = {f"user{i}": 100.0 * i for i in range(6)}
+
+        balances = columnar.ColumnarLedger.from_rows(rows).balances(initial_balances)
+
+        for user, initial in initial_balances.items():
+            assert balances[user] == pytest.approx(wallet.calculate_balance(rows, initial, user))
+
+    def test_sum_by_owner(self, engine):
+        """Should add up only the rows of the requested types"""
+        columns = columnar.ColumnarLedger()
+        columns.append("alice", "deposit", 10.0)
+        columns.append("alice", "transfer_out", 4.0)
+        columns.append("bob", "deposit", 1.5)
+        columns.append("alice", "deposit", 2.5)
+
+        assert columns.sum_by_owner(["deposit"]) == {"alice": 12.5, "bob": 1.5}
+        assert columns.sum_by_owner(["transfer_out"]) == {"alice": 4.0, "bob": 0.0}
+
+    def test_compact_columns(self, engine):
+        """Should store one code per owner and type, and the amounts as doubles"""
+        columns = columnar.ColumnarLedger.from_rows(make_rows(100))
+
+        assert len(columns) == 100
+        assert len(columns.owners) == 5
+        assert columns.amounts.itemsize == 8
+        assert columns.type_codes.itemsize == 1
+
+    def test_empty_ledger(self, engine):
+        """Should return no deltas and the opening balances"""
+        columns = columnar.ColumnarLedger()
+
+        assert columns.balance_deltas() == {}
+        assert columns.balances({"alice": 5.0}) == {"alice": 5.0}
+
+
+class TestCalculateAllBalances:
+    """Test the full-book balance computation of the wallet"""
+
+    def test_all_users_in_one_pass(self, storage_backend):
+        """Should compute the balance of every user from the stored ledger"""
+        wallet.record_transactions(
+            [
+                {
+                    "owner": "alice",
+                    "type": "deposit",
+                    "amount": 50.0,
+                    "from_user": "atm",
+                    "to_user": "alice",
+                    "balance": 50.0,
+                },
+                {
+                    "owner": "alice",
+                    "type": "transfer_out",
+                    "amount": 20.0,
+                    "from_user": "alice",
+                    "to_user": "bob",
+                    "balance": 30.0,
+                },
+                {
+                    "owner": "bob",
+                    "type": "transfer_in",
+                    "amount": 20.0,
+                    "from_user": "alice",
+                    "to_user": "bob",
+                    "balance": 20.0,
+                },
+            ]
+        )
+
+        balances = wallet.calculate_all_balances({"alice": 0.0, "bob": 0.0, "carol": 7.0})
+
+        assert balances == {"alice": 30.0, "bob": 20.0, "carol": 7.0}
@@ -0,0 +1,63 @@
+import sys
+
+import pytest
+
+from backend.modules import wallet
+from backend.modules.entities import TransactionRecord
+from backend.modules.models import Transaction
+
+
+def make_record(amount=10.0):
+    return TransactionRecord(
+        date="2026-01-01 10:00:00",
+        owner="alice",
+        type="transfer_out",
+        from_user="alice",
+        to_user="bob",
+        amount=amount,
+        balance=90.0,
+        description=f"Transfer of {amount} to bob",
+    )
+
+
+class TestTransactionRecord:
+    """Test the compact transaction record of the write path"""
+
+    def test_reads_like_a_transaction_dictionary(self):
+        """Should expose the ledger columns as keys, in ledger order"""
+        record = make_record()
+
+        assert record["owner"] == "alice"
+        assert record.get("amount") == 10.0
+        assert record.get("unknown", "default") == "default"
+        assert list(record.keys()) == wallet.CSV_COLUMNS
+        assert dict(record) == record.as_dict()
+        assert record[1] == "alice"
+
+        with pytest.raises(KeyError):
+            record["as_dict"]
+
+    def test_is_immutable(self):
+        """Should refuse to change or add attributes"""
+        record = make_record()
+
+        with pytest.raises(AttributeError):
+            record.amount = 0.0
+        with pytest.raises(AttributeError):
+            record.extra = 1
+
+    def test_is_smaller_than_a_dictionary(self):
+        """Should take less memory than the equivalent dictionary (no per-instance dict)"""
+        record = make_record()
+
+        assert not hasattr(record, "__dict__")
+        assert sys.getsizeof(record) < sys.getsizeof(record.as_dict())
+
+    def test_from_model(self):
+        """Should copy the fields of a validated Transaction model"""
+        model = Transaction(**make_record(5.0).as_dict())
+
+        record = TransactionRecord.from_model(model)
+
+        assert record.amount == 5.0
+        assert str(record.date) == "2026-01-01 10:00:00"
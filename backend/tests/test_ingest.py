@@ -0,0 +1,190 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app import app
+from backend.modules import config, ingest, wallet
+from backend.modules.sessions import session_manager
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Commands of every batch applied by the writer"""
+    applied = []
+    apply_commands = wallet.apply_commands
+
+    def tracking(commands):
+        applied.append(commands)
+        return apply_commands(commands)
+
+    monkeypatch.setattr(wallet, "apply_commands", tracking)
+    return applied
+
+
+class TestApplyCommands:
+    """Test the in-order application of deposits and transfers"""
+
+    def test_commands_see_the_previous_balances(self, users):
+        """Should let a transfer spend a deposit of the same batch, and fail only the invalid commands"""
+        results = wallet.apply_commands(
+            [
+                {"type": "deposit", "user": "alice", "amount": 50.0},
+                {"type": "transfer", "from_user": "alice", "to_user": "bob", "amount": 150.0},
+                {"type": "transfer", "from_user": "alice", "to_user": "bob", "amount": 1.0},
+                {"type": "deposit", "user": "ghost", "amount": 5.0},
+            ]
+        )
+
+        assert results[0]["balance"] == 150.0
+        assert results[1]["balance"] == 0.0
+        assert isinstance(results[2], ValueError)
+        assert isinstance(results[3], FileNotFoundError)
+        assert wallet.get_balance("bob", 100) == 250.0
+        assert wallet.get_transaction_count("alice") == 2
+
+
+class TestLedgerService:
+    """Test the single-writer ingestion queue"""
+
+    def test_concurrent_commands_are_batched(self, users, batches):
+        """Should apply the commands waiting together in one batch, in submission order"""
+        service = ingest.LedgerService(queue_limit=100, max_batch=100)
+
+        async def run():
+            return await asyncio.gather(
+                service.deposit("alice", 10.0),
+                service.transfer("alice", "bob", 110.0),
+                service.deposit("bob", 1.0),
+            )
+
+        deposit, transfer, second = asyncio.run(run())
+
+        assert len(batches) == 1
+        assert deposit["balance"] == 110.0
+        assert transfer["type"] == "transfer_out"
+        assert second["balance"] == 211.0
+
+    def test_failed_commands_raise_their_error(self, users):
+        """Should raise the error of a failed command to its caller only"""
+        service = ingest.LedgerService(queue_limit=100, max_batch=100)
+
+        async def run():
+            return await asyncio.gather(
+                service.transfer("alice", "bob", 500.0),
+                service.deposit("ghost", 1.0),
+                service.deposit("bob", 1.0),
+                return_exceptions=True,
+            )
+
+        insufficient, unknown, deposit = asyncio.run(run())
+
+        assert isinstance(insufficient, ValueError)
+        assert isinstance(unknown, FileNotFoundError)
+        assert deposit["balance"] == 101.0
+
+    def test_full_queue_is_rejected(self, users, monkeypatch):
+        """Should refuse new commands right away while the queue is full"""
+        service = ingest.LedgerService(queue_limit=1, max_batch=1)
+        release = threading.Event()
+        apply_commands = wallet.apply_commands
+
+        def blocked(commands):
+            release.wait(5)
+            return apply_commands(commands)
+
+        monkeypatch.setattr(wallet, "apply_commands", blocked)
+
+        async def run():
+            first = asyncio.ensure_future(service.deposit("alice", 1.0))
+            await asyncio.sleep(0.05)
+            # The writer holds the first command: the second one fills the queue
+            second = asyncio.ensure_future(service.deposit("alice", 2.0))
+            await asyncio.sleep(0)
+            with pytest.raises(ingest.IngestQueueFullError):
+                await service.deposit("alice", 3.0)
+            release.set()
+            return await first, await second
+
+        first, second = asyncio.run(run())
+
+        assert (first["balance"], second["balance"]) == (101.0, 103.0)
+
+    def test_drain_commits_the_queued_commands(self, users):
+        """Should wait for the queued commands before stopping the writer"""
+        service = ingest.LedgerService(queue_limit=100, max_batch=1)
+
+        async def run():
+            pending = [asyncio.ensure_future(service.deposit("alice", 1.0)) for _ in range(3)]
+            await asyncio.sleep(0)
+            await service.drain()
+            return pending
+
+        pending = asyncio.run(run())
+
+        assert all(future.done() for future in pending)
+        assert wallet.get_balance("alice", 100) == 103.0
+
+
+class TestIngestRoutes:
+    """Test the deposit and transfer routes through the writer queue"""
+
+    @pytest.fixture
+    def client(self, users, monkeypatch):
+        monkeypatch.setattr(config, "INGEST_QUEUE", True)
+        client = TestClient(app)
+        client.headers["Authorization"] = f"Bearer {session_manager.issue('alice')}"
+        return client
+
+    def test_deposit_and_transfer(self, client, batches):
+        """Should answer with the committed transactions and keep the errors of the routes"""
+        deposit = client.post("/wallet/deposit", json={"username": "alice", "amount": 5.0})
+        transfer = client.post(
+            "/wallet/transfer", json={"from_user": "alice", "to_user": "bob", "amount": 1.0}
+        )
+        broke = client.post(
+            "/wallet/transfer", json={"from_user": "alice", "to_user": "bob", "amount": 1000.0}
+        )
+        unknown = client.post(
+            "/wallet/transfer", json={"from_user": "alice", "to_user": "ghost", "amount": 1.0}
+        )
+
+        assert deposit.json()["transaction"]["balance"] == 105.0
+        assert transfer.json()["transaction"]["balance"] == 104.0
+        assert (broke.status_code, unknown.status_code) == (400, 404)
+        assert len(batches) == 4
+
+    def test_traced_deposit(self, client, tmp_path, monkeypatch):
+        """Should record the spans of the batch that applied the deposit on the trace of the request"""
+        monkeypatch.setattr(config, "TRACE_HEADER", True)
+        monkeypatch.setattr(config, "TRACE_DIR", str(tmp_path / "traces"))
+        monkeypatch.setattr(config, "TRACE_PROFILE_INTERVAL_MS", 0)
+
+        response = client.post(
+            "/wallet/deposit", json={"username": "alice", "amount": 5.0}, headers={"X-Proggy-Trace": "1"}
+        )
+
+        trace_id = response.headers["x-proggy-trace-id"]
+        breakdown = json.loads((tmp_path / "traces" / f"{trace_id}.json").read_text(encoding="utf-8"))
+        stages = {stage["stage"] for stage in breakdown["stages"]}
+        assert response.status_code == 200
+        assert {"ingest.batch", "ingest.batch;wallet.get_balance"} <= stages
+        write = {"ingest.batch;sqlite.append"}
+        if config.STORAGE_BACKEND == "csv":
+            write = {"ingest.batch;ledger.append;ledger.write", "ingest.batch;ledger.append;ledger.fsync"}
+        assert write <= stages
+
+    def test_full_queue_answers_503(self, client, monkeypatch):
+        """Should ask the client to retry when the queue is full"""
+
+        async def full(command):
+            raise ingest.IngestQueueFullError("Too many ledger writes in progress")
+
+        monkeypatch.setattr(ingest.ledger_service, "submit", full)
+
+        response = client.post("/wallet/deposit", json={"username": "alice", "amount": 5.0})
+
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
@@ -0,0 +1,502 @@
+import csv
+import json
+import threading
+from datetime import datetime
+
+import pytest
+from pydantic import ValidationError
+
+from backend import cli
+from backend.modules import auth, config, ledger, wallet
+
+
+def read_rows(path):
+    with open(path, encoding="utf-8", newline="") as file:
+        return list(csv.reader(file))
+
+
+def make_row(owner="user1", amount=100.0):
+    return {
+        "date": "2026-01-01 10:00:00",
+        "owner": owner,
+        "type": "deposit",
+        "from_user": "external",
+        "to_user": owner,
+        "amount": amount,
+        "balance": amount,
+        "description": f"Deposit of {amount}",
+    }
+
+
+class TestLedgerWriter:
+    """Test the append-only ledger writer"""
+
+    def test_new_file_gets_header_in_column_order(self, tmp_path):
+        """Should create the ledger with the CSV_COLUMNS header"""
+        path = tmp_path / "transactions.csv"
+        ledger.LedgerWriter(str(path)).append([make_row()])
+
+        rows = read_rows(path)
+        assert rows[0] == ledger.CSV_COLUMNS
+        assert rows[1][1] == "user1"
+
+    def test_append_keeps_existing_rows(self, tmp_path):
+        """Should add rows at the end without touching the previous ones"""
+        path = tmp_path / "transactions.csv"
+        writer = ledger.LedgerWriter(str(path))
+        writer.append([make_row("user1")])
+        content_before = path.read_bytes()
+
+        writer.append([make_row("user2"), make_row("user3")])
+
+        assert path.read_bytes().startswith(content_before)
+        assert [row[1] for row in read_rows(path)[1:]] == ["user1", "user2", "user3"]
+
+    def test_offsets_point_to_each_row(self, tmp_path):
+        """Should return the byte offset where each appended row starts"""
+        path = tmp_path / "transactions.csv"
+        writer = ledger.LedgerWriter(str(path))
+        offsets = writer.append([make_row("user1"), make_row("user2")])
+        offsets += writer.append([make_row("user3")])
+
+        with open(path, "rb") as file:
+            for offset, owner in zip(offsets, ["user1", "user2", "user3"], strict=True):
+                file.seek(offset)
+                assert file.readline().decode("utf-8").split(",")[1] == owner
+
+    def test_header_mismatch_raises(self, tmp_path):
+        """Should refuse to append to a file with different columns"""
+        path = tmp_path / "transactions.csv"
+        path.write_text("date,owner,amount\r\n", encoding="utf-8")
+
+        with pytest.raises(ValueError, match="header mismatch"):
+            ledger.LedgerWriter(str(path)).append([make_row()])
+
+    def test_existing_column_order_is_kept(self, tmp_path):
+        """Should write rows following the header order of an existing ledger"""
+        path = tmp_path / "transactions.csv"
+        header = list(reversed(ledger.CSV_COLUMNS))
+        path.write_text(",".join(header) + "\r\n", encoding="utf-8")
+
+        ledger.LedgerWriter(str(path)).append([make_row("user9")])
+
+        with open(path, encoding="utf-8", newline="") as file:
+            assert list(csv.DictReader(file))[0]["owner"] == "user9"
+
+
+class TestRecordTransaction:
+    """Test that record_transaction appends to the ledger"""
+
+    def test_record_appends_one_row(self, tmp_path, monkeypatch):
+        """Should append the validated transaction without reading the ledger"""
+        path = tmp_path / "transactions.csv"
+        monkeypatch.setattr(wallet, "TRANSACTIONS_FILE", str(path))
+        monkeypatch.setattr(
+            "backend.modules.utils.read_csv_file", lambda p: pytest.fail("ledger must not be read")
+        )
+
+        wallet.record_transaction(make_row("user1", 50.0))
+        wallet.record_transaction(make_row("user1", 25.0))
+
+        rows = read_rows(path)
+        assert rows[0] == wallet.CSV_COLUMNS
+        assert [float(row[5]) for row in rows[1:]] == [50.0, 25.0]
+
+    def test_batch_is_validated_before_writing(self, tmp_path, monkeypatch):
+        """Should write nothing when one transaction of the batch is invalid"""
+        path = tmp_path / "transactions.csv"
+        monkeypatch.setattr(wallet, "TRANSACTIONS_FILE", str(path))
+
+        with pytest.raises(ValidationError):
+            wallet.record_transactions([make_row("user1", 50.0), make_row("user1", -1.0)])
+
+        assert not path.exists()
+
+    def test_missing_description_is_filled_in(self, tmp_path, monkeypatch):
+        """Should write a default description without changing the caller's dictionary"""
+        path = tmp_path / "transactions.csv"
+        monkeypatch.setattr(wallet, "TRANSACTIONS_FILE", str(path))
+        row = make_row("user1", 5.0)
+        del row["description"]
+
+        wallet.record_transaction(row)
+
+        assert "description" not in row
+        assert read_rows(path)[1][-1] == "deposit of 5.0"
+        assert read_rows(path)[1][0] == "2026-01-01 10:00:00"
+
+
+class TestBalanceIndex:
+    """Test the balance index maintained by the Ledger"""
+
+    def test_append_updates_deltas(self, tmp_path):
+        """Should add deposits/transfers in and subtract transfers out"""
+        book = ledger.Ledger(str(tmp_path / "transactions.csv"))
+        book.append([make_row("user1", 100.0), {**make_row("user1", 30.0), "type": "transfer_out"}])
+
+        assert book.balance_delta("user1") == 70.0
+        assert book.balance_delta("nobody") == 0.0
+
+    def test_rows_appended_by_others_are_applied(self, tmp_path):
+        """Should read only the new tail when another writer appended rows"""
+        path = tmp_path / "transactions.csv"
+        book = ledger.Ledger(str(path))
+        book.append([make_row("user1", 100.0)])
+
+        ledger.LedgerWriter(str(path)).append([make_row("user1", 5.0)])
+
+        assert book.balance_delta("user1") == 105.0
+
+    def test_replaced_file_triggers_rebuild(self, tmp_path):
+        """Should rebuild from scratch when the ledger was truncated"""
+        path = tmp_path / "transactions.csv"
+        book = ledger.Ledger(str(path))
+        book.append([make_row("user1", 100.0), make_row("user1", 100.0)])
+
+        path.unlink()
+        ledger.LedgerWriter(str(path)).append([make_row("user1", 1.0)])
+
+        assert book.balance_delta("user1") == 1.0
+
+
+class TestVerifyBalanceIndex:
+    """Test the verification of the balance index against a full replay"""
+
+    def test_consistent_index(self, tmp_path, monkeypatch):
+        """Should report no mismatches when the index matches the replay"""
+        monkeypatch.setattr(wallet, "TRANSACTIONS_FILE", str(tmp_path / "transactions.csv"))
+        wallet.record_transaction(make_row("user1", 40.0))
+
+        assert wallet.get_balance("user1", 10.0) == 50.0
+        assert wallet.verify_balance_index({"user1": 10.0, "user2": 0.0}) == {}
+
+    def test_stale_index_is_reported(self, tmp_path, monkeypatch):
+        """Should report the users whose indexed balance disagrees with the replay"""
+        path = str(tmp_path / "transactions.csv")
+        monkeypatch.setattr(wallet, "TRANSACTIONS_FILE", path)
+        wallet.record_transaction(make_row("user1", 40.0))
+        ledger.get_ledger(path).balances.deltas["user1"] = 999.0
+
+        assert wallet.verify_balance_index({"user1": 10.0}) == {"user1": (1009.0, 50.0)}
+
+    def test_cli_reports_the_stale_index(self, tmp_path, monkeypatch):
+        """Should check the index in use, and the persisted checkpoint, without rebuilding them"""
+        monkeypatch.setattr(config, "CHECKPOINT_INTERVAL", 1)
+        path = str(tmp_path / "transactions.csv")
+        users_file = tmp_path / "users.json"
+        users_file.write_text(
+            json.dumps({"users": [{"username": "user1", "email": "user1@example.com", "password": "hash"}]}),
+            encoding="utf-8",
+        )
+        monkeypatch.setattr(wallet, "TRANSACTIONS_FILE", path)
+        monkeypatch.setattr(auth, "USERS_FILE", str(users_file))
+        wallet.record_transaction(make_row("user1", 40.0))
+        checkpoint_file = tmp_path / "transactions.ckpt"
+        saved = checkpoint_file.read_text(encoding="utf-8")
+
+        assert cli.main(["verify-balances"]) == 0
+
+        ledger.get_ledger(path).balances.deltas["user1"] = 1040.0
+        assert cli.main(["verify-balances"]) == 1
+        assert checkpoint_file.read_text(encoding="utf-8") == saved
+
+
+class TestBalanceCheckpoint:
+    """Test the balance checkpoints of the balance index"""
+
+    def test_checkpoint_every_interval(self, tmp_path, monkeypatch):
+        """Should save a checkpoint once CHECKPOINT_INTERVAL rows were applied since the last one"""
+        monkeypatch.setattr(config, "CHECKPOINT_INTERVAL", 3)
+        path = tmp_path / "transactions.csv"
+        book = ledger.Ledger(str(path))
+
+        book.append([make_row("user1", 1.0), make_row("user2", 2.0)])
+        assert not (tmp_path / "transactions.ckpt").exists()
+
+        book.append([make_row("user1", 3.0), make_row("user1", 4.0)])
+        saved = json.loads((tmp_path / "transactions.ckpt").read_text(encoding="utf-8"))
+        assert saved["position"] == path.stat().st_size
+        assert saved["deltas"] == {"user1": 8.0, "user2": 2.0}
+
+    def test_restart_replays_only_the_tail(self, tmp_path, monkeypatch):
+        """Should restore the deltas from the checkpoint and apply only the rows written after it"""
+        monkeypatch.setattr(config, "CHECKPOINT_INTERVAL", 2)
+        path = tmp_path / "transactions.csv"
+        ledger.Ledger(str(path)).append([make_row("user1", 1.0), make_row("user1", 2.0)])
+        ledger.LedgerWriter(str(path)).append([make_row("user1", 3.0)])
+
+        book = ledger.Ledger(str(path))
+        applied = []
+        original_apply = book.balances.apply
+        book.balances.apply = lambda row, offset: applied.append(offset) or original_apply(row, offset)
+
+        assert book.balance_delta("user1") == 6.0
+        assert len(applied) == 1
+
+    def test_stale_checkpoint_is_ignored(self, tmp_path, monkeypatch):
+        """Should replay the whole ledger when the checkpoint doesn't match it"""
+        monkeypatch.setattr(config, "CHECKPOINT_INTERVAL", 1)
+        path = tmp_path / "transactions.csv"
+        ledger.Ledger(str(path)).append([make_row("user1", 100.0)])
+        path.unlink()
+        ledger.LedgerWriter(str(path)).append([make_row("user1", 1.0), make_row("user1", 2.0)])
+
+        assert ledger.Ledger(str(path)).balance_delta("user1") == 3.0
+
+    def test_checkpoint_tail(self, tmp_path, monkeypatch):
+        """Should return the delta at the checkpoint and only the owner's rows written after it"""
+        monkeypatch.setattr(config, "CHECKPOINT_INTERVAL", 0)
+        book = ledger.Ledger(str(tmp_path / "transactions.csv"))
+        book.append([make_row("user1", 1.0), make_row("user1", 2.0), make_row("user2", 5.0)])
+        book.checkpoint()
+        book.append([make_row("user1", 4.0), make_row("user2", 8.0)])
+
+        delta, tail = book.checkpoint_tail("user1")
+
+        assert delta == 3.0
+        assert [row["amount"] for row in tail] == ["4.0"]
+
+    def test_cli_create_and_verify(self, tmp_path, monkeypatch):
+        """Should create a checkpoint that verifies, and report a checkpoint that disagrees with the replay"""
+        path = str(tmp_path / "transactions.csv")
+        users_file = tmp_path / "users.json"
+        users_file.write_text(
+            json.dumps({"users": [{"username": "user1", "email": "user1@example.com", "password": "hash"}]}),
+            encoding="utf-8",
+        )
+        monkeypatch.setattr(wallet, "TRANSACTIONS_FILE", path)
+        monkeypatch.setattr(auth, "USERS_FILE", str(users_file))
+        wallet.record_transactions([make_row("user1", 40.0), make_row("user1", 2.0)])
+
+        assert cli.main(["checkpoint", "create"]) == 0
+        wallet.record_transaction(make_row("user1", 1.0))
+        assert cli.main(["checkpoint", "verify"]) == 0
+        assert wallet.replay_balance("user1", 10.0) == 53.0
+
+        ledger.get_ledger(path).balances.checkpoint_deltas["user1"] = 999.0
+        assert cli.main(["checkpoint", "verify"]) == 1
+
+
+class TestOwnerIndex:
+    """Test the per-owner offset index and its sidecar file"""
+
+    def test_owner_rows_in_ledger_order(self, tmp_path):
+        """Should return only the owner's rows, oldest first"""
+        book = ledger.Ledger(str(tmp_path / "transactions.csv"))
+        book.append([make_row("user1", 1.0), make_row("user2", 2.0)])
+        book.append([make_row("user1", 3.0)])
+
+        assert [row["amount"] for row in book.owner_rows("user1")] == ["1.0", "3.0"]
+        assert book.owner_rows("user3") == []
+
+    def test_owner_count(self, tmp_path, monkeypatch):
+        """Should count the owner's rows without copying their offsets"""
+        book = ledger.Ledger(str(tmp_path / "transactions.csv"))
+        book.append([make_row("user1", 1.0), make_row("user2", 2.0), make_row("user1", 3.0)])
+        monkeypatch.setattr(book.owners, "rows_of", None)
+
+        assert book.owner_count("user1") == 2
+        assert book.owner_count("user3") == 0
+
+    def test_descriptions_with_line_breaks(self, tmp_path, monkeypatch):
+        """Should read a quoted description with line breaks as one row, before and after a restart"""
+        monkeypatch.setattr(config, "CHECKPOINT_INTERVAL", 1)
+        path = tmp_path / "transactions.csv"
+        description = 'line1\nline2\r\n"quoted"'
+        ledger.Ledger(str(path)).append(
+            [{**make_row("user1", 1.0), "description": description}, make_row("user1", 2.0)]
+        )
+        ledger.LedgerWriter(str(path)).append([{**make_row("user2", 3.0), "description": "a\nb"}])
+
+        book = ledger.Ledger(str(path))
+        rows = book.owner_rows("user1")
+
+        assert [row["description"] for row in rows] == [description, "Deposit of 2.0"]
+        assert [row["description"] for _, row in book.scan()] == [description, "Deposit of 2.0", "a\nb"]
+        assert book.balance_delta("user1") == 3.0
+        assert book.balance_delta("user2") == 3.0
+
+    def test_sidecar_is_reloaded_after_restart(self, tmp_path):
+        """Should restore the offsets from the sidecar and apply only the new tail"""
+        path = tmp_path / "transactions.csv"
+        ledger.Ledger(str(path)).append([make_row("user1", 1.0), make_row("user2", 2.0)])
+        # Rows written while no Ledger was running
+        ledger.LedgerWriter(str(path)).append([make_row("user1", 3.0)])
+
+        book = ledger.Ledger(str(path))
+        applied = []
+        original_apply = book.owners.apply
+        book.owners.apply = lambda row, offset: applied.append(offset) or original_apply(row, offset)
+
+        assert [row["amount"] for row in book.owner_rows("user1")] == ["1.0", "3.0"]
+        assert len(applied) == 1
+        assert (tmp_path / "transactions.idx").read_text().count("\n") == 3
+
+    def test_filters_are_evaluated_on_the_index(self, tmp_path):
+        """Should select rows by date and type without reading the other rows"""
+        book = ledger.Ledger(str(tmp_path / "transactions.csv"))
+        dates = ["2026-01-05 10:00:00", "2026-02-10 10:00:00", "2026-03-01 10:00:00"]
+        book.append([{**make_row("user1", float(i)), "date": date} for i, date in enumerate(dates, start=1)])
+        # A late row: the owner's dates are no longer in order
+        book.append([{**make_row("user1", 4.0), "date": "2026-01-20 10:00:00", "type": "transfer_out"}])
+
+        january = book.owner_rows("user1", datetime(2026, 1, 1), datetime(2026, 2, 1))
+        assert [row["amount"] for row in january] == ["1.0", "4.0"]
+        assert [row["amount"] for row in book.owner_rows("user1", types=["transfer_out"])] == ["4.0"]
+        newest_deposits = book.owner_page("user1", None, 2, types=["deposit"])
+        assert [row["amount"] for row in book.read_rows_at(newest_deposits)] == ["3.0", "2.0"]
+
+    def test_old_sidecar_format_is_rebuilt(self, tmp_path):
+        """Should rebuild a sidecar written without dates and types"""
+        path = tmp_path / "transactions.csv"
+        ledger.Ledger(str(path)).append([make_row("user1", 1.0)])
+        offset = (tmp_path / "transactions.idx").read_text().split(",")[1]
+        (tmp_path / "transactions.idx").write_text(f"user1,{offset}\r\n", encoding="utf-8")
+
+        book = ledger.Ledger(str(path))
+
+        assert [row["amount"] for row in book.owner_rows("user1", types=["deposit"])] == ["1.0"]
+
+    def test_stale_sidecar_is_rebuilt(self, tmp_path):
+        """Should ignore a sidecar that does not match the ledger"""
+        path = tmp_path / "transactions.csv"
+        ledger.Ledger(str(path)).append([make_row("user1", 1.0)])
+        (tmp_path / "transactions.idx").write_text("ghost,9999\r\n", encoding="utf-8")
+
+        book = ledger.Ledger(str(path))
+
+        assert [row["owner"] for row in book.owner_rows("user1")] == ["user1"]
+        assert book.owner_rows("ghost") == []
+
+
+class TestRollupIndex:
+    """Test the monthly totals of every owner and their sidecar file"""
+
+    def test_totals_by_month_and_type(self, tmp_path):
+        """Should add each row to the totals of its month and type"""
+        book = ledger.Ledger(str(tmp_path / "transactions.csv"))
+        book.append([make_row("user1", 1.0), {**make_row("user1", 2.0), "type": "transfer_out"}])
+        book.append([{**make_row("user1", 4.0), "date": "2026-02-01 10:00:00", "type": "transfer_in"}])
+
+        assert book.monthly_totals("user1") == {"2026-01": (1.0, 0.0, 2.0, 2), "2026-02": (0.0, 4.0, 0.0, 1)}
+
+    def test_restart_replays_only_the_tail(self, tmp_path, monkeypatch):
+        """Should restore the saved totals and apply only the rows written after them"""
+        monkeypatch.setattr(config, "CHECKPOINT_INTERVAL", 2)
+        path = tmp_path / "transactions.csv"
+        ledger.Ledger(str(path)).append([make_row("user1", 1.0), make_row("user1", 2.0)])
+        ledger.LedgerWriter(str(path)).append([make_row("user1", 3.0)])
+
+        book = ledger.Ledger(str(path))
+        applied = []
+        original_apply = book.rollups.apply
+        book.rollups.apply = lambda row, offset: applied.append(offset) or original_apply(row, offset)
+
+        assert book.monthly_totals("user1") == {"2026-01": (6.0, 0.0, 0.0, 3)}
+        assert len(applied) == 1
+
+    def test_stale_sidecar_is_ignored(self, tmp_path, monkeypatch):
+        """Should replay the whole ledger when the saved totals don't match it"""
+        monkeypatch.setattr(config, "CHECKPOINT_INTERVAL", 1)
+        path = tmp_path / "transactions.csv"
+        ledger.Ledger(str(path)).append([make_row("user1", 100.0)])
+        path.unlink()
+        ledger.LedgerWriter(str(path)).append([make_row("user1", 1.0), make_row("user1", 2.0)])
+
+        assert ledger.Ledger(str(path)).monthly_totals("user1") == {"2026-01": (3.0, 0.0, 0.0, 2)}
+
+
+class TestGroupCommit:
+    """Test the group commit of concurrent ledger appends"""
+
+    def run_concurrently(self, commits, callers):
+        results = [None] * callers
+        errors = []
+
+        def caller(index):
+            try:
+                results[index] = commits.submit([{"caller": index}])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=caller, args=(i,)) for i in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_callers_share_a_write(self):
+        """Should write the rows of the callers waiting together in one batch"""
+        batches = []
+
+        def write_batch(rows):
+            batches.append([row["caller"] for row in rows])
+            return [100 + row["caller"] for row in rows]
+
+        commits = ledger.GroupCommit(write_batch, window=0.05, max_batch=8)
+        results, errors = self.run_concurrently(commits, 8)
+
+        assert errors == []
+        # Every caller gets the offset of its own row
+        assert results == [[100 + i] for i in range(8)]
+        assert len(batches) < 8
+        assert sorted(caller for batch in batches for caller in batch) == list(range(8))
+
+    def test_max_batch_is_respected(self):
+        """Should never write more than max_batch rows at once"""
+        batches = []
+        commits = ledger.GroupCommit(
+            lambda rows: batches.append(len(rows)) or [0] * len(rows), window=0.02, max_batch=3
+        )
+
+        self.run_concurrently(commits, 10)
+
+        assert max(batches) <= 3
+        assert sum(batches) == 10
+
+    def test_errors_reach_every_caller_of_the_batch(self):
+        """Should raise the write error in the callers whose rows were not written"""
+
+        def write_batch(rows):
+            raise OSError("disk full")
+
+        commits = ledger.GroupCommit(write_batch, window=0.01, max_batch=10)
+        _, errors = self.run_concurrently(commits, 4)
+
+        assert len(errors) == 4
+        assert all(isinstance(error, OSError) for error in errors)
+
+    def test_one_fsync_per_batch(self, tmp_path, monkeypatch):
+        """Should fsync the ledger once per batch, not once per row"""
+        fsyncs = []
+        monkeypatch.setattr(ledger.os, "fsync", lambda fd: fsyncs.append(fd))
+        book = ledger.Ledger(str(tmp_path / "transactions.csv"))
+
+        book.append([make_row("user1"), make_row("user2"), make_row("user3")])
+
+        assert len(fsyncs) == 1
+        assert book.balance_delta("user2") == 100.0
+
+    def test_failed_fsync_leaves_no_trace(self, tmp_path, monkeypatch):
+        """Should remove the rows of a batch whose fsync failed, and keep them out of the indexes"""
+        path = tmp_path / "transactions.csv"
+        book = ledger.Ledger(str(path))
+        book.append([make_row("user1", 100.0)])
+        size = path.stat().st_size
+
+        def fail(fd):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(ledger.os, "fsync", fail)
+        with pytest.raises(OSError, match="disk full"):
+            book.append([make_row("user1", 51.0)])
+
+        assert path.stat().st_size == size
+        assert book.balance_delta("user1") == 100.0
+        assert len(book.owner_offsets("user1")) == 1
+
+        monkeypatch.undo()
+        book.append([make_row("user1", 1.0)])
+        assert book.balance_delta("user1") == 101.0
+        assert len(read_rows(path)) == 3
@@ -0,0 +1,78 @@
+import threading
+
+from backend.modules.locks import AccountLockManager
+
+
+class TestAccountLockManager:
+    """Test the per-account lock manager"""
+
+    def test_disjoint_accounts_run_in_parallel(self):
+        """Test that two threads can hold the locks of different accounts at the same time"""
+        locks = AccountLockManager()
+        both_inside = threading.Barrier(2, timeout=2)
+        errors = []
+
+        def worker(*accounts):
+            with locks.hold(*accounts):
+                try:
+                    both_inside.wait()
+                except threading.BrokenBarrierError as e:
+                    errors.append(e)
+
+        threads = [
+            threading.Thread(target=worker, args=("alice", "bob")),
+            threading.Thread(target=worker, args=("carol", "dave")),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+
+    def test_same_account_is_serialized(self):
+        """Test that a second holder waits until the first one releases the account"""
+        locks = AccountLockManager()
+        events = []
+        first_inside = threading.Event()
+
+        def first():
+            with locks.hold("alice"):
+                first_inside.set()
+                threading.Event().wait(0.05)
+                events.append("first done")
+
+        def second():
+            first_inside.wait()
+            with locks.hold("bob", "alice"):
+                events.append("second inside")
+
+        threads = [threading.Thread(target=first), threading.Thread(target=second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert events == ["first done", "second inside"]
+
+    def test_opposite_transfers_do_not_deadlock(self):
+        """Test that locking (a, b) and (b, a) concurrently always finishes"""
+        locks = AccountLockManager()
+
+        def worker(first, second):
+            for _ in range(500):
+                with locks.hold(first, second):
+                    pass
+
+        threads = [
+            threading.Thread(target=worker, args=("alice", "bob")),
+            threading.Thread(target=worker, args=("bob", "alice")),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        assert not any(thread.is_alive() for thread in threads)
+        # Locks are dropped once nobody uses them
+        assert locks.active() == 0
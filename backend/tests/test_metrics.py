@@ -0,0 +1,173 @@
+import threading
+
+import bcrypt
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app import app
+from backend.modules import auth, ledger, metrics, utils
+from backend.modules.entities import User as UserEntity
+from backend.modules.models import UserInDB
+
+
+class TestMetricTypes:
+    """Test the counters, gauges and histograms and their text format"""
+
+    def test_counter_adds_the_shards_of_every_thread(self):
+        """Should sum the increments made by several threads"""
+        counter = metrics.Counter("test_total", "Test counter.", ("name",))
+
+        def work():
+            for _ in range(1000):
+                counter.inc(1, ("a",))
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc(2, ("b",))
+
+        assert counter.value(("a",)) == 4000
+        assert list(counter.samples()) == [
+            ("test_total", (("name", "a"),), 4000),
+            ("test_total", (("name", "b"),), 2),
+        ]
+
+    def test_gauge_goes_down(self):
+        """Should subtract with dec()"""
+        gauge = metrics.Gauge("test_in_flight", "Test gauge.")
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        assert gauge.value() == 1
+
+    def test_histogram_render(self):
+        """Should render cumulative buckets, the sum and the count"""
+        registry = metrics.Registry()
+        histogram = registry.register(
+            metrics.Histogram("test_seconds", "Test histogram.", buckets=(0.1, 1.0))
+        )
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+
+        assert registry.render().splitlines() == [
+            "# HELP test_seconds Test histogram.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{le="0.1"} 2',
+            'test_seconds_bucket{le="1.0"} 3',
+            'test_seconds_bucket{le="+Inf"} 4',
+            "test_seconds_sum 3.65",
+            "test_seconds_count 4",
+        ]
+        assert histogram.count() == 4
+
+    def test_label_values_are_escaped(self):
+        """Should escape quotes, backslashes and line breaks in label values"""
+        registry = metrics.Registry()
+        counter = registry.register(metrics.Counter("test_total", "Test counter.", ("route",)))
+        counter.inc(1, ('a"b\\c\n',))
+
+        assert 'test_total{route="a\\"b\\\\c\\n"} 1' in registry.render()
+
+    def test_names_are_unique(self):
+        """Should refuse two metrics with the same name"""
+        registry = metrics.Registry()
+        registry.register(metrics.Counter("test_total", "Test counter."))
+
+        with pytest.raises(ValueError, match="already registered"):
+            registry.register(metrics.Counter("test_total", "Test counter."))
+
+
+class TestStorageMetrics:
+    """Test the rows and bytes counted by the storage hooks"""
+
+    def test_csv_files(self, tmp_path):
+        """Should count the rows and bytes written and read by the CSV helpers"""
+        path = tmp_path / "data.csv"
+        written = metrics.STORAGE_WRITTEN_BYTES.value(("write_csv_file",))
+        appended = metrics.STORAGE_WRITTEN_ROWS.value(("append_csv_file",))
+        read = metrics.STORAGE_READ_ROWS.value(("read_csv_file",))
+
+        utils.write_csv_file(str(path), [{"a": 1, "b": 2}, {"a": 3, "b": 4}])
+        size = path.stat().st_size
+        utils.append_csv_file(str(path), [{"a": 5, "b": 6}])
+        utils.read_csv_file(str(path))
+
+        assert metrics.STORAGE_WRITTEN_BYTES.value(("write_csv_file",)) - written == size
+        assert metrics.STORAGE_WRITTEN_ROWS.value(("append_csv_file",)) - appended == 1
+        assert metrics.STORAGE_READ_ROWS.value(("read_csv_file",)) - read == 3
+
+    def test_ledger(self, tmp_path):
+        """Should count the rows appended to the ledger and the rows read back"""
+        path = tmp_path / "transactions.csv"
+        rows = [{"owner": "alice", "type": "deposit", "amount": 1.0}, {"owner": "bob", "type": "deposit"}]
+        written = metrics.STORAGE_WRITTEN_BYTES.value(("ledger",))
+        read = metrics.STORAGE_READ_ROWS.value(("ledger",))
+
+        offsets = ledger.LedgerWriter(str(path)).append(rows)
+        ledger.Ledger(str(path)).read_rows_at(offsets)
+
+        assert metrics.STORAGE_WRITTEN_BYTES.value(("ledger",)) - written == path.stat().st_size
+        assert metrics.STORAGE_READ_ROWS.value(("ledger",)) - read == 2
+
+
+class TestAuthMetrics:
+    """Test the bcrypt and user directory metrics"""
+
+    def test_bcrypt_checks_are_timed(self):
+        """Should observe the time of every password check, right or wrong"""
+        hashed = bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds=4)).decode("utf-8")
+        user = UserEntity(UserInDB(id=1, username="alice", email="alice@example.com", password=hashed))
+        checks = metrics.BCRYPT_VERIFY_SECONDS.count()
+
+        assert user.check_password("secret") is True
+        assert user.check_password("wrong") is False
+        assert metrics.BCRYPT_VERIFY_SECONDS.count() - checks == 2
+
+    def test_user_reloads_are_counted(self, storage_backend):
+        """Should count the loads of the users, not the lookups served from memory"""
+        directory = auth.AuthService.directory()
+        reloads = metrics.USER_RELOADS.value()
+
+        directory.get("alice")
+        directory.get("bob")
+        directory.reload()
+        directory.get("alice")
+
+        assert metrics.USER_RELOADS.value() - reloads == 2
+
+
+class TestMetricsEndpoint:
+    """Test the HTTP middleware and the /metrics route"""
+
+    @pytest.fixture
+    def client(self, storage_backend):
+        return TestClient(app)
+
+    def test_requests_are_labelled_by_route(self, client):
+        """Should label the requests with the route template and the status"""
+        client.get("/health")
+        client.get("/wallet/status/alice")
+        client.get("/not/a/route")
+
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        text = response.text
+        assert 'proggy_http_requests_total{method="GET",route="/health",status="200"}' in text
+        assert (
+            'proggy_http_requests_total{method="GET",route="/wallet/status/{username}",status="401"}' in text
+        )
+        assert 'proggy_http_requests_total{method="GET",route="unmatched",status="404"}' in text
+        assert 'proggy_http_request_duration_seconds_bucket{method="GET",route="/health",le="+Inf"}' in text
+        assert "/wallet/status/alice" not in text
+
+    def test_in_flight_requests(self, client):
+        """Should count the scrape itself as the only request in flight"""
+        response = client.get("/metrics")
+
+        assert 'proggy_http_requests_in_flight{method="GET"} 1' in response.text
+        assert metrics.HTTP_IN_FLIGHT.value(("GET",)) == 0
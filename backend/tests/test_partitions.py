@@ -0,0 +1,132 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from backend.modules import ledger, partitions, repository
+
+
+def make_row(owner, trans_type, amount, date):
+    return {
+        "date": date,
+        "owner": owner,
+        "type": trans_type,
+        "from_user": owner,
+        "to_user": owner,
+        "amount": amount,
+        "balance": 0.0,
+        "description": f"{trans_type} of {amount}",
+    }
+
+
+@pytest.fixture
+def book(tmp_path):
+    """Repository of a monthly partitioned ledger, with rows in January, February and March"""
+    book = repository.PartitionedCsvLedgerRepository(str(tmp_path / "transactions.csv"), "month")
+    book.append([make_row("alice", "deposit", 100.0, "2026-01-05 10:00:00")])
+    book.append([make_row("bob", "deposit", 7.0, "2026-01-20 10:00:00")])
+    book.append([make_row("alice", "transfer_out", 30.0, "2026-02-10 10:00:00")])
+    book.append([make_row("alice", "deposit", 1.0, "2026-03-01 10:00:00")])
+    return book
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """Names of the ledger files opened through ledger.get_ledger"""
+    names = []
+    get_ledger = ledger.get_ledger
+
+    def tracking(path):
+        names.append(path.rsplit("/", 1)[-1])
+        return get_ledger(path)
+
+    monkeypatch.setattr(ledger, "get_ledger", tracking)
+    return names
+
+
+class TestPartitionedLedger:
+    """Test the time partitions of the CSV ledger"""
+
+    def test_rows_go_to_monthly_files(self, book, tmp_path):
+        """Should write one file per month and keep the sealed ones in the manifest"""
+        manifest = json.loads((tmp_path / "transactions" / "manifest.json").read_text(encoding="utf-8"))
+
+        files = [entry["file"] for entry in manifest["partitions"]]
+        assert files == ["2026-01.csv", "2026-02.csv", "2026-03.csv"]
+        january = manifest["partitions"][0]
+        assert january["sealed"] is True
+        assert (january["start"], january["end"]) == ("2026-01-05 10:00:00", "2026-01-20 10:00:00")
+        assert january["owners"] == {"alice": [100.0, 1], "bob": [7.0, 1]}
+        assert manifest["partitions"][-1]["sealed"] is False
+
+    def test_balances_of_sealed_partitions_come_from_the_manifest(self, book, opened):
+        """Should only open the active partition to get balances and counts"""
+        assert book.balance_delta("alice") == 71.0
+        assert book.count("alice") == 3
+        assert book.balance_delta("bob") == 7.0
+        assert set(opened) == {"2026-03.csv"}
+
+    def test_recent_history_skips_old_partitions(self, book, opened):
+        """Should read only the partitions that can hold rows in the requested dates"""
+        rows = book.owner_rows("alice", start=datetime(2026, 2, 15))
+
+        assert [row["date"] for row in rows] == ["2026-03-01 10:00:00"]
+        assert set(opened) == {"2026-03.csv"}
+
+    def test_history_skips_partitions_without_the_owner(self, book, opened):
+        """Should not open the sealed partitions where the owner has no rows"""
+        assert [row["amount"] for row in book.owner_rows("bob")] == ["7.0"]
+        assert "2026-02.csv" not in opened
+
+    def test_pages_cross_partitions(self, book):
+        """Should page through every partition, newest first"""
+        first = book.owner_page("alice", None, 2)
+        second = book.owner_page("alice", first[-1][0], 2)
+
+        assert [row["type"] for _, row in first] == ["deposit", "transfer_out"]
+        assert [row["date"] for _, row in second] == ["2026-01-05 10:00:00"]
+
+    def test_filtered_pages_skip_old_partitions(self, book, opened):
+        """Should page oldest first through the partitions in the dates, with the type filter"""
+        page = book.owner_page(
+            "alice", None, 5, start=datetime(2026, 2, 1), types=["deposit"], ascending=True
+        )
+
+        assert [row["date"] for _, row in page] == ["2026-03-01 10:00:00"]
+        assert "2026-01.csv" not in opened
+
+    def test_late_rows_go_to_the_active_partition(self, book):
+        """Should append a row of a past month to the active partition, and still find it"""
+        book.append([make_row("alice", "deposit", 5.0, "2026-01-31 10:00:00")])
+
+        assert len(book.ledger.snapshot()) == 3
+        assert book.balance_delta("alice") == 76.0
+        rows = book.owner_rows("alice", start=datetime(2026, 1, 31), end=datetime(2026, 2, 1))
+        assert [row["amount"] for row in rows] == ["5.0"]
+
+    def test_changes_of_other_processes_are_seen(self, book, tmp_path):
+        """Should reload the manifest when another writer opened a new partition"""
+        other = partitions.PartitionedLedger(str(tmp_path / "transactions.csv"), "month")
+        other.append([make_row("alice", "deposit", 2.0, "2026-04-01 10:00:00")])
+
+        assert [partition.name for partition in book.ledger.snapshot()][-1] == "2026-04"
+        assert book.balance_delta("alice") == 73.0
+
+    def test_existing_ledger_is_adopted(self, tmp_path):
+        """Should keep the single-file ledger as the first partition"""
+        path = str(tmp_path / "transactions.csv")
+        single = repository.CsvLedgerRepository(path)
+        single.append([make_row("alice", "deposit", 10.0, "2026-01-05 10:00:00")])
+
+        book = repository.PartitionedCsvLedgerRepository(path, "month")
+        book.append([make_row("alice", "deposit", 1.0, "2026-02-01 10:00:00")])
+
+        files = [partition.file for partition in book.ledger.snapshot()]
+        assert files == ["../transactions.csv", "2026-02.csv"]
+        assert book.balance_delta("alice") == 11.0
+        assert [row["amount"] for row in book.owner_rows("alice")] == ["10.0", "1.0"]
+
+    def test_unknown_period(self, tmp_path):
+        """Should refuse a partition period that is not in PERIODS"""
+        with pytest.raises(ValueError, match="Unknown ledger partition period"):
+            partitions.PartitionedLedger(str(tmp_path / "transactions.csv"), "week")
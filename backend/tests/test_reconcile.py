@@ -0,0 +1,107 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app import app
+from backend.modules import config, reconcile, wallet
+from backend.modules.sessions import session_manager
+
+
+def transfer_rows(from_user, to_user, amount, sender_balance, receiver_balance, date="2026-01-01 10:00:00"):
+    return list(wallet._transfer_records(from_user, to_user, amount, sender_balance, receiver_balance, date))
+
+
+def deposit_row(user, amount, balance, date="2026-01-01 09:00:00"):
+    return {
+        "date": date,
+        "owner": user,
+        "type": "deposit",
+        "from_user": "atm",
+        "to_user": user,
+        "amount": amount,
+        "balance": balance,
+    }
+
+
+class TestReconcile:
+    """Test the ledger reconciliation scanner"""
+
+    def test_consistent_ledger(self):
+        """Should report no issues when balances and transfer pairs are consistent"""
+        rows = [deposit_row("alice", 50.0, 60.0), *transfer_rows("alice", "bob", 20.0, 40.0, 20.0)]
+
+        report = reconcile.reconcile(rows, {"alice": 10.0, "bob": 0.0})
+
+        assert report.ok
+        assert report.rows == 3
+        assert report.owners == 2
+        assert report.as_dict()["rows_per_second"] > 0
+
+    def test_stored_balance_mismatch(self):
+        """Should flag the rows whose stored balance disagrees with the replay"""
+        rows = [
+            deposit_row("alice", 50.0, 50.0),
+            deposit_row("alice", 5.0, 99.0),
+            deposit_row("alice", 1.0, 56.0),
+        ]
+
+        report = reconcile.reconcile(rows, {"alice": 0.0})
+
+        assert report.issue_counts["balance_mismatch"] == 1
+        assert report.issues[0]["row"] == 2
+        assert "replayed=55.0" in report.issues[0]["detail"]
+
+    def test_unmatched_transfers(self):
+        """Should flag a transfer_out without transfer_in, also when it falls out of the window"""
+        transfer_out, _ = transfer_rows("alice", "bob", 20.0, 30.0, 20.0)
+        _, late_transfer_in = transfer_rows("alice", "bob", 20.0, 10.0, 20.0, date="2026-01-02 10:00:00")
+        rows = [transfer_out, deposit_row("bob", 1.0, 1.0), deposit_row("bob", 1.0, 2.0), late_transfer_in]
+
+        report = reconcile.reconcile(rows, {"alice": 50.0, "bob": 0.0}, match_window=2)
+
+        unmatched = [issue for issue in report.issues if issue["kind"] == "unmatched_transfer"]
+        assert [(issue["row"], issue["owner"]) for issue in unmatched] == [(1, "alice"), (4, "bob")]
+
+    def test_unknown_owner_reported_once(self):
+        """Should report the rows of an unknown owner only once"""
+        rows = [deposit_row("ghost", 1.0, 1.0), deposit_row("ghost", 1.0, 2.0)]
+
+        report = reconcile.reconcile(rows, {})
+
+        assert report.issue_counts["unknown_owner"] == 1
+
+    def test_issue_list_is_bounded(self):
+        """Should keep only max_issues issues, but count all of them"""
+        rows = [deposit_row("alice", 1.0, 0.0) for _ in range(20)]
+
+        report = reconcile.reconcile(rows, {"alice": 0.0}, max_issues=5)
+
+        assert report.issue_counts["balance_mismatch"] == 20
+        assert len(report.issues) == 5
+
+
+class TestReconcileEndpoint:
+    """Test the admin reconciliation route"""
+
+    @pytest.fixture
+    def client(self, storage_backend, monkeypatch):
+        monkeypatch.setattr(config, "ADMIN_USERS", frozenset({"admin"}))
+        return TestClient(app)
+
+    def test_admin_gets_the_report(self, client):
+        """Should reconcile the stored ledger for an admin"""
+        wallet.record_transactions(transfer_rows("alice", "bob", 20.0, 80.0, 20.0))
+        token = session_manager.issue("admin")
+
+        response = client.get("/admin/reconcile", headers={"Authorization": f"Bearer {token}"})
+
+        assert response.status_code == 200
+        assert response.json()["report"]["rows"] == 2
+        assert response.json()["report"]["issue_counts"]["unmatched_transfer"] == 0
+
+    def test_other_users_are_rejected(self, client):
+        """Should refuse the route to users that are not admins"""
+        token = session_manager.issue("alice")
+
+        response = client.get("/admin/reconcile", headers={"Authorization": f"Bearer {token}"})
+
+        assert response.status_code == 403
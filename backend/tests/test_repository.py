@@ -0,0 +1,280 @@
+import json
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from backend import cli
+from backend.modules import auth, config, repository, wallet
+
+
+def make_row(owner, trans_type, amount, date="2026-01-01 10:00:00"):
+    return {
+        "date": date,
+        "owner": owner,
+        "type": trans_type,
+        "from_user": owner,
+        "to_user": owner,
+        "amount": amount,
+        "balance": 0.0,
+        "description": f"{trans_type} of {amount}",
+    }
+
+
+def make_user(username, balance=100):
+    return {"username": username, "email": f"{username}@example.com", "password": "hash", "balance": balance}
+
+
+@pytest.fixture
+def book(storage_backend):
+    """Ledger repository of the backend under test"""
+    return repository.get_ledger_repository(wallet.TRANSACTIONS_FILE)
+
+
+class TestLedgerRepository:
+    """Test the ledger repository contract (run against every backend)"""
+
+    def test_balance_delta_and_count(self, book):
+        """Test that the balance delta and row count of every owner follow the appends"""
+        book.append([make_row("alice", "deposit", 100.0), make_row("bob", "deposit", 5.0)])
+        book.append([make_row("alice", "transfer_out", 30.0), make_row("alice", "transfer_in", 10.0)])
+
+        assert book.balance_delta("alice") == 80.0
+        assert book.balance_delta("bob") == 5.0
+        assert book.balance_delta("ghost") == 0.0
+        assert book.count("alice") == 3
+        assert book.count("ghost") == 0
+
+    def test_rows_keep_ledger_order_and_representation(self, book):
+        """Test that rows come back in ledger order, as strings"""
+        book.append([make_row("alice", "deposit", 1.5), make_row("bob", "deposit", 2.0)])
+        book.append([make_row("alice", "transfer_out", 0.5)])
+
+        rows = book.owner_rows("alice")
+
+        assert [row["type"] for row in rows] == ["deposit", "transfer_out"]
+        assert rows[0]["amount"] == "1.5"
+        assert rows[0]["date"] == "2026-01-01 10:00:00"
+        assert [row["owner"] for row in book.scan()] == ["alice", "bob", "alice"]
+
+    def test_scan_records(self, book):
+        """Test that typed records come back in ledger order, filtered by owner and type"""
+        book.append([make_row("alice", "deposit", 1.5), make_row("bob", "deposit", 2.0)])
+        book.append([make_row("alice", "transfer_out", 0.5)])
+
+        records = list(book.scan_records(owners=["alice"]))
+
+        assert [(record.type, record.amount) for record in records] == [
+            ("deposit", 1.5),
+            ("transfer_out", 0.5),
+        ]
+        assert records[0].date.year == 2026
+        assert records[0].balance == 0.0
+        assert [record.owner for record in book.scan_records(types=["deposit"])] == ["alice", "bob"]
+
+    def test_scan_more_owners_than_sql_variables(self, book, storage_backend):
+        """Test that all balances are computed for more users than SQLite's variable limit"""
+        book.append([make_row("alice", "deposit", 5.0), make_row("bob", "transfer_out", 2.0)])
+        if storage_backend == "sqlite":
+            book.database.connection().setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 10)
+        initial_balances = {"alice": 1.0, "bob": 10.0, **{f"user{i}": 0.0 for i in range(50)}}
+
+        balances = wallet.calculate_all_balances(initial_balances)
+
+        assert balances == {**initial_balances, "alice": 6.0, "bob": 8.0}
+        assert [record.owner for record in book.scan_records(owners=initial_balances)] == ["alice", "bob"]
+
+    def test_descriptions_with_line_breaks(self, book):
+        """Test that a description with line breaks is read back whole by every reader"""
+        description = "line1\nline2"
+        book.append([{**make_row("alice", "deposit", 1.5), "description": description}])
+        book.append([make_row("alice", "deposit", 2.0, date="2026-02-01 10:00:00")])
+
+        assert book.owner_rows("alice")[0]["description"] == description
+        assert [row["description"] for row in book.scan()][0] == description
+        assert [record.description for record in book.scan_records()][0] == description
+        assert wallet.calculate_all_balances({"alice": 0.0}) == {"alice": 3.5}
+
+    def test_owner_page_positions(self, book):
+        """Test that the position of the last row of a page gives the next page"""
+        book.append([make_row("alice", "deposit", float(i)) for i in range(1, 6)])
+
+        first = book.owner_page("alice", None, 3)
+        second = book.owner_page("alice", first[-1][0], 3)
+
+        assert [float(row["amount"]) for _, row in first] == [5, 4, 3]
+        assert [float(row["amount"]) for _, row in second] == [2, 1]
+
+    def test_history_filters(self, book):
+        """Test the date range, type and order filters of the history"""
+        book.append(
+            [
+                make_row("alice", "deposit", 1.0, "2026-01-05 10:00:00"),
+                make_row("alice", "transfer_out", 2.0, "2026-02-10 10:00:00"),
+                make_row("bob", "deposit", 9.0, "2026-02-11 10:00:00"),
+                make_row("alice", "transfer_in", 3.0, "2026-03-01 10:00:00"),
+                make_row("alice", "deposit", 4.0, "2026-03-20 10:00:00"),
+            ]
+        )
+
+        def amounts(rows):
+            return [float(row["amount"]) for row in rows]
+
+        assert amounts(book.owner_rows("alice", types=["deposit", "transfer_in"])) == [1, 3, 4]
+        assert amounts(book.owner_rows("alice", datetime(2026, 2, 1), datetime(2026, 3, 20))) == [2, 3]
+        recent_income = book.owner_page("alice", None, 10, start=datetime(2026, 2, 1), types=["deposit"])
+        assert amounts(row for _, row in recent_income) == [4]
+
+    def test_ascending_pages(self, book):
+        """Test that ascending pages start from the oldest row and follow the cursor"""
+        book.append([make_row("alice", "deposit", float(i)) for i in range(1, 6)])
+
+        first = book.owner_page("alice", None, 3, ascending=True)
+        second = book.owner_page("alice", first[-1][0], 3, ascending=True)
+
+        assert [float(row["amount"]) for _, row in first] == [1, 2, 3]
+        assert [float(row["amount"]) for _, row in second] == [4, 5]
+
+    def test_replay_from_checkpoint(self, book, monkeypatch):
+        """Test that only the rows written after the checkpoint are replayed"""
+        monkeypatch.setattr(config, "CHECKPOINT_INTERVAL", 0)
+        book.append([make_row("alice", "deposit", 100.0), make_row("bob", "deposit", 5.0)])
+        book.checkpoint()
+        book.append([make_row("alice", "transfer_out", 30.0)])
+
+        delta, tail = book.checkpoint_tail("alice")
+
+        assert delta == 100.0
+        assert [row["type"] for row in tail] == ["transfer_out"]
+        assert wallet.replay_balance("alice", 10.0) == wallet.get_balance("alice", 10.0) == 80.0
+        assert wallet.verify_balance_checkpoints(["alice", "bob", "ghost"]) == {}
+
+    def test_automatic_checkpoint(self, book, monkeypatch):
+        """Test that a checkpoint is saved after CHECKPOINT_INTERVAL rows"""
+        monkeypatch.setattr(config, "CHECKPOINT_INTERVAL", 2)
+        book.append([make_row("alice", "deposit", 1.0)])
+        assert book.checkpoint_tail("alice") == (0.0, book.owner_rows("alice"))
+
+        book.append([make_row("alice", "deposit", 2.0)])
+
+        assert book.checkpoint_tail("alice") == (3.0, [])
+
+    def test_monthly_totals(self, book):
+        """Test that the monthly rollups follow every append and survive a rebuild"""
+        book.append(
+            [
+                make_row("alice", "deposit", 100.0, "2026-01-05 10:00:00"),
+                make_row("alice", "transfer_out", 40.0, "2026-01-20 10:00:00"),
+                make_row("bob", "deposit", 9.0, "2026-01-21 10:00:00"),
+            ]
+        )
+        book.append([make_row("alice", "transfer_in", 5.0, "2026-02-01 10:00:00")])
+        expected = {"2026-01": (100.0, 0.0, 40.0, 2), "2026-02": (0.0, 5.0, 0.0, 1)}
+
+        assert book.monthly_totals("alice") == expected
+        book.rebuild()
+        assert book.monthly_totals("alice") == expected
+        assert book.monthly_totals("carol") == {}
+
+    def test_rebuild_keeps_balances(self, book):
+        """Test that rebuilding the derived indexes gives the same balances"""
+        book.append([make_row("alice", "deposit", 100.0), make_row("alice", "transfer_out", 40.0)])
+
+        book.rebuild()
+
+        assert book.balance_delta("alice") == 60.0
+        assert book.count("alice") == 2
+
+
+class TestSqliteRepository:
+    """Test the SQLite specific guarantees"""
+
+    @pytest.fixture
+    def database(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "STORAGE_BACKEND", "sqlite")
+        monkeypatch.setattr(config, "SQLITE_PATH", str(tmp_path / "wallet.db"))
+        return repository.get_database(config.SQLITE_PATH)
+
+    def test_wal_mode(self, database):
+        """Test that the database runs in WAL mode"""
+        assert database.connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_history_uses_the_owner_index(self, database):
+        """Test that the history query is served by an index instead of a table scan"""
+        plan = database.connection().execute(
+            f"EXPLAIN QUERY PLAN {repository._SELECT_TRANSACTION} WHERE owner = ? ORDER BY id DESC LIMIT ?",
+            ("alice", 10),
+        )
+
+        assert any("USING INDEX idx_transactions_owner" in step[-1] for step in plan)
+
+    def test_type_filter_uses_an_owner_index(self, database):
+        """Test that a history filtered by type is served by an index instead of a table scan"""
+        plan = database.connection().execute(
+            f"EXPLAIN QUERY PLAN {repository._SELECT_TRANSACTION} WHERE owner = ? AND type IN (?, ?) "
+            "ORDER BY id DESC LIMIT ?",
+            ("alice", "deposit", "transfer_in", 10),
+        )
+
+        assert any("USING INDEX idx_transactions_owner" in step[-1] for step in plan)
+
+    def test_existing_database_gets_rollups(self, database):
+        """Test that a database created before the rollups table has them built when it's opened"""
+        book = repository.SqliteLedgerRepository(database)
+        book.append([make_row("alice", "deposit", 10.0), make_row("alice", "deposit", 5.0)])
+        database.connection().execute("DELETE FROM rollups")
+        database.connection().execute("UPDATE meta SET value = 0 WHERE key = 'rollups_built'")
+
+        reopened = repository.SqliteDatabase(config.SQLITE_PATH)
+
+        assert repository.SqliteLedgerRepository(reopened).monthly_totals("alice") == {
+            "2026-01": (15.0, 0.0, 0.0, 2)
+        }
+
+    def test_append_is_all_or_nothing(self, database):
+        """Test that a failing row rolls back the whole batch and its balance update"""
+        book = repository.SqliteLedgerRepository(database)
+        # The second row breaks the NOT NULL constraint of the owner, after the first one was inserted
+        invalid = make_row(None, "deposit", 5.0)
+
+        with pytest.raises(sqlite3.IntegrityError):
+            book.append([make_row("alice", "deposit", 10.0), invalid])
+
+        assert book.owner_rows("alice") == []
+        assert book.balance_delta("alice") == 0.0
+
+    def test_user_directory_follows_database_changes(self, database):
+        """Test that users added to the database are picked up by the directory"""
+        users = repository.SqliteUserRepository(database)
+        users.add_users([make_user("test_user")])
+        assert auth.AuthService.get_user_entity("test_user").account.balance == 100
+        assert auth.AuthService.get_user_entity("new_user") is None
+
+        users.add_users([make_user("new_user", balance=5)])
+
+        assert auth.AuthService.get_user_entity("new_user").account.balance == 5
+
+
+class TestMigrateSqlite:
+    """Test the migrate-sqlite command of the maintenance CLI"""
+
+    def test_copies_users_and_ledger(self, tmp_path, monkeypatch):
+        """Test that users and transactions are copied and give the same balances"""
+        users_file = tmp_path / "users.json"
+        users_file.write_text(json.dumps({"users": [make_user("alice"), make_user("bob")]}), encoding="utf-8")
+        monkeypatch.setattr(auth, "USERS_FILE", str(users_file))
+        monkeypatch.setattr(wallet, "TRANSACTIONS_FILE", str(tmp_path / "transactions.csv"))
+        repository.CsvLedgerRepository(wallet.TRANSACTIONS_FILE).append(
+            [make_row("alice", "deposit", 20.0), make_row("bob", "transfer_in", 1.0)]
+        )
+        database_path = str(tmp_path / "wallet.db")
+
+        assert cli.main(["migrate-sqlite", "--database", database_path]) == 0
+        # A second run would duplicate the ledger: it is refused
+        assert cli.main(["migrate-sqlite", "--database", database_path]) == 1
+
+        monkeypatch.setattr(config, "STORAGE_BACKEND", "sqlite")
+        monkeypatch.setattr(config, "SQLITE_PATH", database_path)
+        assert set(auth.AuthService.directory().all()) == {"alice", "bob"}
+        assert wallet.get_balance("alice", 100.0) == 120.0
+        assert wallet.get_transaction_count("bob") == 1
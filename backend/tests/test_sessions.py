@@ -0,0 +1,74 @@
+import time
+
+from backend.modules.sessions import SessionManager, SessionStore
+
+
+def make_manager(ttl=60, max_sessions=10):
+    return SessionManager(secret=b"test-secret", ttl=ttl, max_sessions=max_sessions)
+
+
+class TestSessionManager:
+    """Test the signed session tokens"""
+
+    def test_issued_token_is_valid(self):
+        """Test that a fresh token returns the username of the session"""
+        manager = make_manager()
+        token = manager.issue("user1")
+
+        assert manager.verify(token) == "user1"
+
+    def test_tampered_token_is_rejected(self):
+        """Test that a token with a changed payload or signature is rejected"""
+        manager = make_manager()
+        payload, signature = manager.issue("user1").split(".")
+        other_payload, _ = manager.issue("user2").split(".")
+
+        assert manager.verify(f"{other_payload}.{signature}") is None
+        assert manager.verify(f"{payload}.{signature[:-2]}AA") is None
+        assert manager.verify("not-a-token") is None
+
+    def test_token_from_another_secret_is_rejected(self):
+        """Test that tokens signed with another secret are not accepted"""
+        token = SessionManager(secret=b"other", ttl=60, max_sessions=10).issue("user1")
+
+        assert make_manager().verify(token) is None
+
+    def test_revoked_token_is_rejected(self):
+        """Test that a token is no longer valid after logout"""
+        manager = make_manager()
+        token = manager.issue("user1")
+
+        manager.revoke(token)
+
+        assert manager.verify(token) is None
+
+    def test_expired_token_is_rejected(self):
+        """Test that a token is no longer valid after its TTL"""
+        manager = make_manager(ttl=-1)
+
+        assert manager.verify(manager.issue("user1")) is None
+
+
+class TestSessionStore:
+    """Test the bounded session store"""
+
+    def test_store_is_bounded(self):
+        """Test that the oldest session is evicted when the store is full"""
+        store = SessionStore(max_sessions=2)
+        expires = time.time() + 60
+        store.add("a", "user1", expires)
+        store.add("b", "user2", expires)
+        store.add("c", "user3", expires)
+
+        assert len(store) == 2
+        assert store.get("a") is None
+        assert store.get("c") == "user3"
+
+    def test_expired_sessions_are_evicted(self):
+        """Test that expired sessions are dropped when new ones are added"""
+        store = SessionStore(max_sessions=10)
+        store.add("old", "user1", time.time() - 1)
+        store.add("new", "user2", time.time() + 60)
+
+        assert len(store) == 1
+        assert store.get("new") == "user2"
@@ -0,0 +1,154 @@
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app import app
+from backend.modules import config, tracing, wallet
+from backend.modules.sessions import session_manager
+
+
+def busy(seconds):
+    finish = time.perf_counter() + seconds
+    while time.perf_counter() < finish:
+        pass
+
+
+class TestSpans:
+    """Test the spans and the timing breakdown of a trace"""
+
+    def test_spans_are_no_ops_without_a_trace(self):
+        """Should not record anything outside a traced request"""
+        trace = tracing.Trace("GET", "/")
+
+        with tracing.span("wallet.get_balance"):
+            pass
+
+        assert trace.spans == []
+
+    def test_breakdown_of_nested_spans(self):
+        """Should give the total and self time of every stage, children after their parent"""
+        trace = tracing.Trace("POST", "/wallet/deposit")
+        with trace.activate():
+            with tracing.span("ledger.append"):
+                with tracing.span("ledger.write"):
+                    busy(0.01)
+                with tracing.span("ledger.fsync"):
+                    busy(0.01)
+            with tracing.span("ledger.append"):
+                pass
+        trace.finish(200, "/wallet/deposit")
+
+        breakdown = trace.breakdown()
+        stages = {stage["stage"]: stage for stage in breakdown["stages"]}
+
+        assert list(stages)[0] == "ledger.append"
+        assert set(stages) == {"ledger.append", "ledger.append;ledger.write", "ledger.append;ledger.fsync"}
+        assert stages["ledger.append"]["count"] == 2
+        assert stages["ledger.append"]["total_ms"] >= 20
+        assert stages["ledger.append"]["self_ms"] < stages["ledger.append;ledger.write"]["total_ms"]
+        assert breakdown["route"] == "/wallet/deposit"
+        assert (
+            breakdown["duration_ms"] >= breakdown["untraced_ms"] + stages["ledger.append"]["total_ms"] - 0.01
+        )
+        assert trace.active_threads == {}
+
+    def test_shared_spans_are_recorded_on_every_trace(self):
+        """Should copy the spans of shared work to each trace, at their time in that trace"""
+        first, second = tracing.Trace("POST", "/a"), tracing.Trace("POST", "/b")
+
+        with tracing.shared([first, second, first], "ingest.batch"):
+            assert set(first.active_threads) == set(second.active_threads) != set()
+            with tracing.span("ledger.write"):
+                busy(0.01)
+
+        assert [path for path, _, _ in first.spans] == [("ingest.batch", "ledger.write"), ("ingest.batch",)]
+        assert [path for path, _, _ in second.spans] == [path for path, _, _ in first.spans]
+        assert first.spans[0][1] > second.spans[0][1]
+        assert first.active_threads == second.active_threads == {}
+
+    def test_sampler_records_the_stacks_inside_spans(self):
+        """Should sample the stacks of the thread while it runs inside a span, and only then"""
+        trace = tracing.Trace("GET", "/")
+        sampler = tracing.StackSampler(trace, 0.001)
+        sampler.start()
+        with trace.activate():
+            busy(0.02)
+            with tracing.span("work"):
+                busy(0.05)
+        sampler.stop()
+
+        assert trace.stacks
+        assert all("test_tracing:busy" in stack for stack in trace.stacks)
+        assert all("test_sampler_records_the_stacks_inside_spans" in stack for stack in trace.stacks)
+
+    def test_save(self, tmp_path):
+        """Should write the breakdown as JSON and the stacks in the collapsed format"""
+        trace = tracing.Trace("GET", "/")
+        trace.stacks["a:main;b:work"] += 3
+        trace.finish(200)
+
+        path = trace.save(str(tmp_path))
+
+        assert json.loads(path.read_text(encoding="utf-8"))["samples"] == 3
+        assert (tmp_path / f"{trace.id}.folded").read_text(encoding="utf-8") == "a:main;b:work 3\n"
+
+
+class TestTracingMiddleware:
+    """Test the tracing of sampled requests"""
+
+    @pytest.fixture
+    def client(self, storage_backend, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "TRACE_DIR", str(tmp_path / "traces"))
+        monkeypatch.setattr(config, "TRACE_PROFILE_INTERVAL_MS", 1)
+        wallet.record_transactions(
+            [
+                {
+                    "date": "2026-01-01 10:00:00",
+                    "owner": "alice",
+                    "type": "deposit",
+                    "from_user": "atm",
+                    "to_user": "alice",
+                    "amount": 5.0,
+                    "balance": 5.0,
+                }
+            ]
+        )
+        return TestClient(app)
+
+    def get_history(self, client, headers=None):
+        token = session_manager.issue("alice")
+        return client.get(
+            "/wallet/history/alice", headers={"Authorization": f"Bearer {token}", **(headers or {})}
+        )
+
+    def test_header_traces_the_request(self, client, tmp_path, monkeypatch):
+        """Should write the trace of a request sent with the header, named after its trace id"""
+        monkeypatch.setattr(config, "TRACE_HEADER", True)
+
+        response = self.get_history(client, {"X-Proggy-Trace": "1"})
+
+        assert response.status_code == 200
+        trace_id = response.headers["x-proggy-trace-id"]
+        breakdown = json.loads((tmp_path / "traces" / f"{trace_id}.json").read_text(encoding="utf-8"))
+        assert breakdown["route"] == "/wallet/history/{username}"
+        assert breakdown["status"] == 200
+        assert [stage["stage"] for stage in breakdown["stages"]] == ["wallet.history"]
+        assert (tmp_path / "traces" / f"{trace_id}.folded").exists()
+
+    def test_header_is_ignored_unless_enabled(self, client, tmp_path):
+        """Should not let clients ask for traces when TRACE_HEADER is disabled"""
+        response = self.get_history(client, {"X-Proggy-Trace": "1"})
+
+        assert "x-proggy-trace-id" not in response.headers
+        assert not (tmp_path / "traces").exists()
+
+    def test_sample_rate(self, client, tmp_path, monkeypatch):
+        """Should trace every request with a sample rate of 1"""
+        monkeypatch.setattr(config, "TRACE_SAMPLE_RATE", 1.0)
+
+        self.get_history(client)
+        self.get_history(client)
+
+        assert len(list((tmp_path / "traces").glob("*.json"))) == 2
@@ -1,4 +1,8 @@
-from backend.modules.utils import validate_amount
+from datetime import datetime
+
+import pytest
+
+from backend.modules.utils import read_csv_file, scan_csv_file, validate_amount
 
 
 def test_validate_amount_positive():
@@ -11,3 +15,74 @@ def test_validate_amount_zero():
 
 def test_validate_amount_negative():
     assert validate_amount(-10) is False
+
+
+class TestScanCsvFile:
+    """Test the typed ledger CSV scanner"""
+
+    HEADER = "date,owner,type,from_user,to_user,amount,balance,description\n"
+
+    @pytest.fixture
+    def ledger_file(self, tmp_path):
+        path = tmp_path / "transactions.csv"
+        path.write_text(
+            self.HEADER
+            + "2026-01-01 10:00:00,alice,deposit,atm,alice,50.5,50.5,salary\n"
+            + '2026-01-01 10:00:00,alice,transfer_out,alice,bob,20.0,30.5,"rent, january"\n'
+            + "2026-01-01 10:00:00,bob,transfer_in,alice,bob,20.0,,\n",
+            encoding="utf-8",
+        )
+        return path
+
+    def test_typed_values(self, ledger_file):
+        """Should yield rows with the amounts, balances and dates already parsed"""
+        rows = list(scan_csv_file(str(ledger_file)))
+
+        assert [row.owner for row in rows] == ["alice", "alice", "bob"]
+        assert rows[0].date == datetime(2026, 1, 1, 10, 0, 0)
+        assert rows[0].amount == 50.5
+        assert rows[1].description == "rent, january"
+        assert rows[2].balance is None
+
+    def test_matches_read_csv_file(self, ledger_file):
+        """Should give the same values as the dict reader, in the same order"""
+        rows = scan_csv_file(str(ledger_file), chunk_size=16)
+
+        for row, expected in zip(rows, read_csv_file(str(ledger_file)), strict=True):
+            assert (row.owner, row.type) == (expected["owner"], expected["type"])
+            assert row.amount == float(expected["amount"])
+
+    def test_predicate_pushdown(self, ledger_file):
+        """Should yield only the rows of the requested owners and types"""
+        alice_rows = scan_csv_file(str(ledger_file), owners=["alice"])
+
+        assert [row.type for row in alice_rows] == ["deposit", "transfer_out"]
+        assert [row.owner for row in scan_csv_file(str(ledger_file), types={"transfer_in"})] == ["bob"]
+        assert list(scan_csv_file(str(ledger_file), owners=["alice"], types=["transfer_in"])) == []
+
+    def test_incomplete_last_line_is_skipped(self, ledger_file):
+        """Should skip a last line without line ending (a write in progress)"""
+        with open(ledger_file, "a", encoding="utf-8") as file:
+            file.write("2026-01-01 10:00:00,carol,dep")
+
+        assert [row.owner for row in scan_csv_file(str(ledger_file))] == ["alice", "alice", "bob"]
+
+    @pytest.mark.parametrize("chunk_size", [8, 1 << 20])
+    def test_descriptions_with_line_breaks(self, ledger_file, chunk_size):
+        """Should read a quoted description with line breaks as one row, even across chunks"""
+        with open(ledger_file, "a", encoding="utf-8", newline="") as file:
+            file.write('2026-01-02 10:00:00,carol,deposit,atm,carol,1.0,1.0,"line1\nline2\r\n""quoted"""\r\n')
+            file.write('2026-01-02 10:00:00,dave,deposit,atm,dave,2.0,2.0,"unfinished\n')
+
+        rows = list(scan_csv_file(str(ledger_file), chunk_size=chunk_size))
+
+        assert [row.owner for row in rows] == ["alice", "alice", "bob", "carol"]
+        assert rows[3].description == 'line1\nline2\r\n"quoted"'
+
+    def test_missing_column(self, tmp_path):
+        """Should raise ValueError when the header lacks a ledger column"""
+        path = tmp_path / "transactions.csv"
+        path.write_text("date,owner,type\n2026-01-01 10:00:00,alice,deposit\n", encoding="utf-8")
+
+        with pytest.raises(ValueError, match="amount"):
+            list(scan_csv_file(str(path)))
@@ -1,6 +1,17 @@
+import threading
+import time
+
 import pytest
 
-from backend.modules import wallet
+from backend.modules import repository, wallet
+from backend.modules.entities import User as UserEntity
+from backend.modules.models import UserInDB
+
+
+def make_user_entity(username, balance):
+    """Build the business entity of a user with the given opening balance"""
+    email = f"{username}@example.com"
+    return UserEntity(UserInDB(username=username, email=email, password="hash", balance=balance))
 
 
 class TestCalculateBalance:
@@ -124,18 +135,134 @@ class TestDeposit:
             wallet.deposit("ghost_user", 100.0)
 
 
+class TestTransferMany:
+    """Test the batch transfer function"""
+
+    @pytest.fixture
+    def mock_env(self, storage_backend, monkeypatch):
+        """Three users with known opening balances and a temporary ledger"""
+        balances = {"alice": 100.0, "bob": 0.0, "carol": 50.0}
+
+        def mock_get_user_entity(username):
+            if username not in balances:
+                return None
+            return make_user_entity(username, balances[username])
+
+        monkeypatch.setattr(wallet.AuthService, "get_user_entity", mock_get_user_entity)
+
+    def test_transfers_applied_in_order(self, mock_env):
+        """Test that a transfer can spend the money received earlier in the same batch"""
+        results = wallet.transfer_many(
+            [
+                {"from_user": "alice", "to_user": "bob", "amount": 80.0},
+                {"from_user": "bob", "to_user": "carol", "amount": 30.0},
+            ]
+        )
+
+        assert [result["status"] for result in results] == ["success", "success"]
+        assert wallet.get_balance("alice", 100.0) == 20.0
+        assert wallet.get_balance("bob", 0.0) == 50.0
+        assert wallet.get_balance("carol", 50.0) == 80.0
+
+    def test_failed_transfers_are_reported(self, mock_env):
+        """Test that insufficient funds or unknown users only fail their own transfer"""
+        results = wallet.transfer_many(
+            [
+                {"from_user": "bob", "to_user": "alice", "amount": 10.0},
+                {"from_user": "alice", "to_user": "ghost", "amount": 10.0},
+                {"from_user": "alice", "to_user": "carol", "amount": 10.0},
+            ]
+        )
+
+        assert results[0]["status"] == "failed"
+        assert "Insufficient funds" in results[0]["error"]
+        assert results[1]["status"] == "failed"
+        assert "not found" in results[1]["error"]
+        assert results[2]["status"] == "success"
+        assert results[2]["transaction"]["balance"] == 90.0
+        assert len(wallet.get_transaction_history("alice")) == 1
+
+    def test_single_ledger_write(self, mock_env, monkeypatch):
+        """Test that all the rows of the batch are persisted in one append"""
+        writes = []
+        repository_class = type(repository.get_ledger_repository(wallet.TRANSACTIONS_FILE))
+        original_append = repository_class.append
+
+        def counting_append(self, rows):
+            writes.append(len(rows))
+            return original_append(self, rows)
+
+        monkeypatch.setattr(repository_class, "append", counting_append)
+
+        wallet.transfer_many([{"from_user": "alice", "to_user": "bob", "amount": 1.0}] * 5)
+
+        assert writes == [10]
+
+
+class TestConcurrentWrites:
+    """Test that concurrent deposits and transfers don't lose rows nor money"""
+
+    def test_concurrent_transfers_keep_balances(self, storage_backend, monkeypatch):
+        """Test that many threads moving money between two users keep the total and all the rows"""
+        balances = {"alice": 1000.0, "bob": 1000.0}
+        monkeypatch.setattr(
+            wallet.AuthService,
+            "get_user_entity",
+            lambda username: make_user_entity(username, balances[username]),
+        )
+        # Widen the window between reading a balance and writing the new row
+        original_get_balance = wallet.get_balance
+
+        def slow_get_balance(user, initial_balance):
+            balance = original_get_balance(user, initial_balance)
+            time.sleep(0.001)
+            return balance
+
+        monkeypatch.setattr(wallet, "get_balance", slow_get_balance)
+
+        def worker(from_user, to_user):
+            for _ in range(10):
+                wallet.transfer(from_user, to_user, 1.0)
+                wallet.deposit(from_user, 1.0)
+
+        pairs = [("alice", "bob"), ("bob", "alice")] * 4
+        threads = [threading.Thread(target=worker, args=pair) for pair in pairs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert original_get_balance("alice", 1000.0) == 1040.0
+        assert original_get_balance("bob", 1000.0) == 1040.0
+        # No row was lost and the balance stored in the last row is the final balance
+        for user in balances:
+            history = wallet.get_transaction_history(user)
+            assert len(history) == 4 * 10 * 2 + 4 * 10
+            assert float(history[-1]["balance"]) == 1040.0
+
+
 class TestTransactionHistory:
     """Test the transaction history function"""
 
-    def test_get_history_filters_by_owner(self, monkeypatch):
+    @pytest.fixture
+    def ledger_file(self, storage_backend):
+        """Point the wallet to a temporary ledger and return a function to fill it"""
+
+        def write(rows):
+            rows = [{column: row.get(column, "") for column in wallet.CSV_COLUMNS} for row in rows]
+            repository.get_ledger_repository(wallet.TRANSACTIONS_FILE).append(rows)
+
+        return write
+
+    def test_get_history_filters_by_owner(self, ledger_file):
         """Test that it only returns the transactions of the requested user"""
-        mock_data = [
-            {"owner": "user1", "type": "deposit", "amount": "100"},
-            {"owner": "user2", "type": "deposit", "amount": "200"},
-            {"owner": "user1", "type": "transfer_out", "amount": "50"},
-        ]
-        # Mock the reading of the CSV file
-        monkeypatch.setattr("backend.modules.utils.read_csv_file", lambda path: mock_data)
+        ledger_file(
+            [
+                {"owner": "user1", "type": "deposit", "amount": "100"},
+                {"owner": "user2", "type": "deposit", "amount": "200"},
+                {"owner": "user1", "type": "transfer_out", "amount": "50"},
+            ]
+        )
 
         history = wallet.get_transaction_history("user1")
 
@@ -143,38 +270,98 @@ class TestTransactionHistory:
         for tx in history:
             assert tx["owner"] == "user1"
 
-    def test_get_history_file_not_found(self, monkeypatch):
-        """Test that it returns an empty list if the CSV file does not exist yet"""
-
-        def mock_read_error(path):
-            raise FileNotFoundError()
-
-        monkeypatch.setattr("backend.modules.utils.read_csv_file", mock_read_error)
-
+    def test_get_history_file_not_found(self, ledger_file):
+        """Test that it returns an empty list if nothing was recorded yet (no CSV file)"""
         history = wallet.get_transaction_history("any_user")
         assert history == []
 
-    def test_get_history_empty_list_if_no_matches(self, monkeypatch):
+    def test_get_history_empty_list_if_no_matches(self, ledger_file):
         """Test that it returns an empty list if the user has no transactions in the file"""
-        mock_data = [
-            {"owner": "user2", "type": "deposit", "amount": "100"},
-            {"owner": "user3", "type": "transfer_in", "amount": "50"},
-        ]
-        monkeypatch.setattr("backend.modules.utils.read_csv_file", lambda path: mock_data)
+        ledger_file(
+            [
+                {"owner": "user2", "type": "deposit", "amount": "100"},
+                {"owner": "user3", "type": "transfer_in", "amount": "50"},
+            ]
+        )
 
-        # Search for user1, which is not in the mocked data
+        # Search for user1, which is not in the ledger
         history = wallet.get_transaction_history("user1")
 
         assert history == []
         assert len(history) == 0
 
-    def test_get_history_integrity(self, monkeypatch):
+    def test_get_history_integrity(self, ledger_file):
         """Test that the returned data maintains its original structure"""
-        mock_tx = {"owner": "user1", "type": "deposit", "amount": "100.0", "date": "2026-01-01"}
-        monkeypatch.setattr("backend.modules.utils.read_csv_file", lambda path: [mock_tx])
+        ledger_file([{"owner": "user1", "type": "deposit", "amount": "100.0", "date": "2026-01-01"}])
 
         history = wallet.get_transaction_history("user1")
 
         assert history[0]["amount"] == "100.0"
         assert history[0]["type"] == "deposit"
         assert "date" in history[0]
+
+    @pytest.mark.parametrize("storage_backend", ["csv"], indirect=True)
+    def test_get_history_does_not_parse_the_whole_ledger(self, ledger_file, monkeypatch):
+        """Test that the history is read through the owner index, not a full scan"""
+        ledger_file([{"owner": f"user{i}", "type": "deposit", "amount": "1"} for i in range(50)])
+        wallet.get_transaction_count("user7")  # Load the indexes
+        monkeypatch.setattr("backend.modules.utils.read_csv_file", lambda path: pytest.fail("full read"))
+        monkeypatch.setattr(repository.ledger.Ledger, "_read_rows", lambda self, start: iter(()))
+
+        history = wallet.get_transaction_history("user7")
+
+        assert [tx["owner"] for tx in history] == ["user7"]
+
+    def test_get_page_newest_first_with_cursor(self, ledger_file):
+        """Test that pages go from the newest to the oldest transaction following the cursor"""
+        ledger_file([{"owner": "user1", "type": "deposit", "amount": str(i)} for i in range(5)])
+
+        page, cursor = wallet.get_transaction_page("user1", limit=2)
+        assert [float(tx["amount"]) for tx in page] == [4, 3]
+
+        page, cursor = wallet.get_transaction_page("user1", limit=2, cursor=cursor)
+        assert [float(tx["amount"]) for tx in page] == [2, 1]
+
+        page, cursor = wallet.get_transaction_page("user1", limit=2, cursor=cursor)
+        assert [float(tx["amount"]) for tx in page] == [0]
+        assert cursor is None
+
+    def test_get_page_invalid_cursor(self, ledger_file):
+        """Test that an invalid cursor is rejected"""
+        with pytest.raises(ValueError, match="Invalid history cursor"):
+            wallet.get_transaction_page("user1", cursor="not a cursor")
+
+    def test_iter_history_newest_first(self, ledger_file, monkeypatch):
+        """Test that the stream returns every transaction of the user, newest first"""
+        monkeypatch.setattr(wallet, "HISTORY_PAGE_SIZE", 2)
+        ledger_file([{"owner": f"user{i % 2}", "type": "deposit", "amount": str(i)} for i in range(7)])
+
+        amounts = [float(tx["amount"]) for tx in wallet.iter_transaction_history("user0")]
+
+        assert amounts == [6, 4, 2, 0]
+
+
+class TestMonthlySummary:
+    """Test the monthly summary of a user"""
+
+    def test_summary_oldest_month_first(self, storage_backend):
+        """Test that every month has its totals and net amount, and that months keeps the latest ones"""
+        rows = [
+            {"owner": "user1", "type": "deposit", "amount": 100.0, "date": "2026-01-05 10:00:00"},
+            {"owner": "user1", "type": "transfer_out", "amount": 30.0, "date": "2026-01-07 10:00:00"},
+            {"owner": "user1", "type": "transfer_in", "amount": 5.0, "date": "2026-03-01 10:00:00"},
+        ]
+        wallet.record_transactions([{**row, "from_user": "a", "to_user": "b", "balance": 0} for row in rows])
+
+        summary = wallet.get_monthly_summary("user1")
+
+        assert [month["month"] for month in summary] == ["2026-01", "2026-03"]
+        assert summary[0] == {
+            "month": "2026-01",
+            "deposits": 100.0,
+            "transfers_in": 0.0,
+            "transfers_out": 30.0,
+            "net": 70.0,
+            "count": 2,
+        }
+        assert [month["month"] for month in wallet.get_monthly_summary("user1", months=1)] == ["2026-03"]
@@ -1,8 +1,9 @@
 $(document).ready(async function() {
     // 1. Try to get the user from the local storage
     const username = localStorage.getItem('currentUser');
+    const token = localStorage.getItem('sessionToken');
 
-    if (!username) {
+    if (!username || !token) {
         window.location.href = 'login.html';
         return;
     }
@@ -13,7 +14,9 @@ $(document).ready(async function() {
 
     async function refreshBalance() {
         try {
-            const response = await fetch(`http://localhost:8000/wallet/status/${username}`);
+            const response = await fetch(`http://localhost:8000/wallet/status/${username}`, {
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
             const data = await response.json();
             if (response.ok) {
                 $('#currentBalanceDisplay').text(`$${data.balance.toFixed(2)}`);
@@ -40,7 +43,10 @@ $(document).ready(async function() {
             // Call to the backend
             const response = await fetch('http://localhost:8000/wallet/deposit', {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${token}`
+                },
                 body: JSON.stringify({ username, amount })
             });
 
@@ -29,8 +29,9 @@ $(document).ready(function() {
             const result = await response.json();
 
             if (response.ok) {
-                // SUCCESS: We only save the username in localStorage to identify the session
+                // SUCCESS: Save the username and the session token sent with every wallet request
                 localStorage.setItem('currentUser', result.user.username);
+                localStorage.setItem('sessionToken', result.token);
                 
                 $errorDiv.addClass('d-none');
                 alert('Welcome ' + result.user.username + '! Redirecting...');
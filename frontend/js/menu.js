@@ -1,16 +1,19 @@
 $(document).ready(async function() {
     // Try to get the user from the local storage
     const username = localStorage.getItem('currentUser');
+    const token = localStorage.getItem('sessionToken');
 
-    // Security: If there is no user, send him back to the login
-    if (!username) {
+    // Security: If there is no user or session, send him back to the login
+    if (!username || !token) {
         window.location.href = 'login.html';
         return;
     }
 
     try {
         // Request the real wallet status to the backend
-        const response = await fetch(`http://localhost:8000/wallet/status/${username}`);
+        const response = await fetch(`http://localhost:8000/wallet/status/${username}`, {
+            headers: { 'Authorization': `Bearer ${token}` }
+        });
         const data = await response.json();
 
         if (response.ok) {
@@ -21,8 +24,9 @@ $(document).ready(async function() {
             // Optional: show how many transactions the user has
             console.log(`User has ${data.history_count} transactions.`);
         } else {
-            // If the user does not exist in the backend but was in localStorage, remove the user from the localStorage
+            // If the user does not exist in the backend or the session expired, remove the user from the localStorage
             localStorage.removeItem('currentUser');
+            localStorage.removeItem('sessionToken');
             window.location.href = 'login.html';
         }
     } catch (error) {
@@ -31,8 +35,14 @@ $(document).ready(async function() {
     }
 
     // Logout button logic
-    $('#btnLogout').click(function() {
+    $('#btnLogout').click(async function() {
+        // End the session in the backend (errors are ignored: the local session is removed anyway)
+        await fetch('http://localhost:8000/auth/logout', {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${token}` }
+        }).catch(() => {});
         localStorage.removeItem('currentUser');
+        localStorage.removeItem('sessionToken');
         window.location.href = 'login.html';
     });
 });
\ No newline at end of file
@@ -1,23 +1,48 @@
 $(document).ready(async function() {
     // 1. Get the username from the local storage
     const username = localStorage.getItem('currentUser');
-    if (!username) {
+    const token = localStorage.getItem('sessionToken');
+
+    if (!username || !token) {
         window.location.href = 'login.html';
         return;
     }
 
     let transactions = [];
     let currentFilter = 'all';
+    let periodDays = ''; // Only the last N days ('' for all time)
     let sortOrder = 'desc'; // Descending by date by default
+    let nextCursor = null; // Cursor of the next page, null when there are no more pages
+    const PAGE_SIZE = 50;
+
+    // Transaction types requested for each filter (the backend filters them on its indexes)
+    const FILTER_TYPES = {
+        all: [],
+        income: ['deposit', 'transfer_in'],
+        expenses: ['transfer_out']
+    };
 
-    // 2. Function to load data from the backend
+    // 2. Function to load one page of data from the backend, with the current filters and order
     async function loadTransactions() {
         try {
-            const response = await fetch(`http://localhost:8000/wallet/history/${username}`);
+            let url = `http://localhost:8000/wallet/history/${username}?limit=${PAGE_SIZE}&order=${sortOrder}`;
+            FILTER_TYPES[currentFilter].forEach(type => { url += `&type=${type}`; });
+            if (periodDays) {
+                const from = new Date(Date.now() - periodDays * 24 * 60 * 60 * 1000);
+                // With its UTC offset ("Z"): the backend converts it to its local time
+                url += `&from=${encodeURIComponent(from.toISOString())}`;
+            }
+            if (nextCursor) url += `&cursor=${encodeURIComponent(nextCursor)}`;
+
+            const response = await fetch(url, {
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
             const data = await response.json();
-            
+
             if (response.ok) {
-                transactions = data.transactions;
+                transactions = transactions.concat(data.transactions);
+                nextCursor = data.next_cursor;
+                $('#loadMore').toggleClass('d-none', !nextCursor);
                 renderTable(); // Render the table after receiving the data
             }
         } catch (error) {
@@ -26,31 +51,24 @@ $(document).ready(async function() {
         }
     }
 
-    // 3. Function to render the table
+    // Start again from the first page (after a change of filter or order)
+    async function reloadTransactions() {
+        transactions = [];
+        nextCursor = null;
+        await loadTransactions();
+    }
+
+    // 3. Function to render the table (rows arrive filtered and sorted by the backend)
     function renderTable() {
         const $body = $('#transactionsBody');
         const $noData = $('#noTransactions');
         $body.empty();
 
-        // Apply filters
-        let filtered = transactions.filter(t => {
-            if (currentFilter === 'income') return t.type === 'deposit' || t.type === 'transfer_in';
-            if (currentFilter === 'expenses') return t.type === 'transfer_out';
-            return true;
-        });
-
-        // Apply sorting
-        filtered.sort((a, b) => {
-            const dateA = new Date(a.date);
-            const dateB = new Date(b.date);
-            return sortOrder === 'desc' ? dateB - dateA : dateA - dateB;
-        });
-
-        if (filtered.length === 0) {
+        if (transactions.length === 0) {
             $noData.removeClass('d-none');
         } else {
             $noData.addClass('d-none');
-            filtered.forEach(t => {
+            transactions.forEach(t => {
                 const dateFormatted = new Date(t.date).toLocaleString();
                 const typeClass = (t.type === 'transfer_out') ? 'text-danger' : 'text-success';
                 const typeIcon = (t.type === 'transfer_out') ? 'bi-arrow-up-right' : 'bi-arrow-down-left';
@@ -73,32 +91,42 @@ $(document).ready(async function() {
         }
     }
 
-    // 4. Event handlers (changes currentFilter or sortOrder and calls renderTable function)
-    $('#filterAll').click(function() {
+    // 4. Event handlers (change currentFilter, periodDays or sortOrder and reload from the first page)
+    $('#filterAll').click(async function() {
         $('.btn-group .btn').removeClass('active');
         $(this).addClass('active');
         currentFilter = 'all';
-        renderTable();
+        await reloadTransactions();
     });
 
-    $('#filterIncome').click(function() {
+    $('#filterIncome').click(async function() {
         $('.btn-group .btn').removeClass('active');
         $(this).addClass('active');
         currentFilter = 'income';
-        renderTable();
+        await reloadTransactions();
     });
 
-    $('#filterExpenses').click(function() {
+    $('#filterExpenses').click(async function() {
         $('.btn-group .btn').removeClass('active');
         $(this).addClass('active');
         currentFilter = 'expenses';
-        renderTable();
+        await reloadTransactions();
+    });
+
+    $('#filterPeriod').change(async function() {
+        periodDays = $(this).val();
+        await reloadTransactions();
+    });
+
+    // Load the next page of movements
+    $('#loadMore').click(async function() {
+        await loadTransactions();
     });
 
     // Sort by date when clicking on the header
-    $('#sortDate').click(function() {
+    $('#sortDate').click(async function() {
         sortOrder = (sortOrder === 'desc') ? 'asc' : 'desc';
-        renderTable();
+        await reloadTransactions();
     });
 
     // Initial load